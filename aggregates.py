@@ -0,0 +1,295 @@
+"""
+Winter Supplement Aggregates
+Author: Liliya
+----------------------------
+This module keeps running totals of the calculated supplements, so payout reports do
+not need to export and re-read every stored result. Each result is added once, when it
+is stored, to a fixed set of groups:
+
+- the overall total;
+- each family composition;
+- each children bucket (0, 1, ... and "<max>+" for larger families);
+- each family composition and children bucket;
+- each rule version.
+
+Every group holds the number of results, how many were eligible, and the sums of the
+base, children and supplement amounts. `add` updates one group of each kind and
+`snapshot` copies a number of groups that does not grow with the number of results,
+so both are O(1). Results are keyed by topic ID, so a result stored again for the same
+ID (a redelivered message, a resubmission) replaces its earlier contribution instead of
+being counted twice; IDs are remembered within the entry bound and time-to-live of the
+result store. The same aggregation runs over a bulk input file in a single pass and in
+constant memory.
+
+Usage:
+    python aggregates.py requests.jsonl
+    python aggregates.py families.csv --rules rules/2025.json --output stats.json
+
+Main Classes and Functions:
+- SupplementAggregator: Thread-safe running totals of results.
+- aggregate_file: Aggregates the results of a JSONL or CSV input file in one pass.
+- main: Command-line entry point.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from records import decode_family
+from supplement_calculator import RULE_TABLE_MAX_CHILDREN, calculate, current_rules
+from rule_sets import load_rule_set
+from config import STATS_MAX_CHILDREN_BUCKET, RESULT_STORE_MAX_ENTRIES, RESULT_STORE_TTL_SECONDS
+
+
+class SupplementAggregator:
+    """
+    Running counts and sums of supplement results, grouped by composition, children
+    bucket and rule version.
+
+    Results are keyed by topic ID: adding a result for a topic ID that was already
+    added replaces its previous contribution, so redelivered messages and overwritten
+    results are counted once. Topic IDs are remembered with the bounds of the result
+    store (entries and time-to-live): once the store would have evicted or expired a
+    result, its ID is forgotten (its contribution stays in the totals), so memory does
+    not grow with the number of results.
+    """
+
+    def __init__(self, max_children_bucket=STATS_MAX_CHILDREN_BUCKET, max_entries=RESULT_STORE_MAX_ENTRIES,
+                 ttl_seconds=RESULT_STORE_TTL_SECONDS, clock=time.monotonic):
+        """
+        :param max_children_bucket: int
+            Families with at least this many children share the "<max>+" bucket.
+        :param max_entries: int
+            Maximum number of topic IDs remembered; the least recently added are forgotten.
+        :param ttl_seconds: float or None
+            Seconds a topic ID is remembered after its result was added; None disables expiry.
+        :param clock: callable
+            Returns the current time in seconds (overridable for tests).
+        """
+        if max_children_bucket < 1:
+            raise ValueError("max_children_bucket must be at least 1")
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_children_bucket = max_children_bucket
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._groups = {}  # (kind, *key) -> [count, eligible, base, children, supplement]
+        # topic ID -> (added at, group keys, (eligible, base, children, supplement)), oldest first
+        self._contributions = OrderedDict()
+
+    def children_bucket(self, number_of_children):
+        """
+        Name the children bucket of a family.
+
+        :param number_of_children: int
+        :return: str
+        """
+        if number_of_children >= self.max_children_bucket:
+            return f"{self.max_children_bucket}+"
+        return str(number_of_children)
+
+    def add(self, topic_id, family_composition, number_of_children, result):
+        """
+        Add the stored result of a topic ID, replacing the result previously added for it.
+
+        :param topic_id: str or None
+            None adds the result without remembering it (e.g. the records of a file).
+        :param family_composition: str
+        :param number_of_children: int
+        :param result: dict
+            A result in the `SupplementResult.to_dict` format.
+        :return: None
+        """
+        bucket = self.children_bucket(number_of_children)
+        keys = (("total",), ("composition", family_composition), ("children", bucket),
+                ("cell", family_composition, bucket), ("ruleVersion", result.get("ruleVersion")))
+        amounts = (1 if result["isEligible"] else 0, result["baseAmount"], result["childrenAmount"],
+                   result["supplementAmount"])
+        with self._lock:
+            self._apply(keys, amounts, 1)
+            if topic_id is None:
+                return
+            previous = self._contributions.pop(topic_id, None)
+            if previous is not None:
+                self._apply(previous[1], previous[2], -1)
+            now = self._clock()
+            self._contributions[topic_id] = (now, keys, amounts)
+            self._forget_old(now)
+
+    def discard(self, topic_id):
+        """
+        Remove the result added for a topic ID (e.g. it was overwritten by an error result).
+
+        :param topic_id: str
+        :return: None
+        """
+        with self._lock:
+            previous = self._contributions.pop(topic_id, None)
+            if previous is not None:
+                self._apply(previous[1], previous[2], -1)
+
+    def _forget_old(self, now):
+        # Forget the IDs the result store no longer holds; called with the lock held
+        contributions = self._contributions
+        while len(contributions) > self.max_entries:
+            contributions.popitem(last=False)
+        if self.ttl_seconds is not None:
+            while contributions and now - next(iter(contributions.values()))[0] >= self.ttl_seconds:
+                contributions.popitem(last=False)
+
+    def _apply(self, keys, amounts, sign):
+        # Add (sign=1) or subtract (sign=-1) one result; called with the lock held
+        eligible, base, children, supplement = amounts
+        for key in keys:
+            totals = self._groups.get(key)
+            if totals is None:
+                totals = self._groups[key] = [0, 0, 0.0, 0.0, 0.0]
+            totals[0] += sign
+            if totals[0] == 0:
+                del self._groups[key]  # Also drops the rounding left by subtracting amounts
+                continue
+            totals[1] += sign * eligible
+            totals[2] += sign * base
+            totals[3] += sign * children
+            totals[4] += sign * supplement
+
+    def snapshot(self):
+        """
+        Report the totals of every group.
+
+        :return: dict
+            "total", "byComposition", "byChildren", "byCompositionAndChildren" and
+            "byRuleVersion", each group with count, eligible, eligibilityRate,
+            baseAmountTotal, childrenAmountTotal, supplementAmountTotal and
+            averageSupplementAmount (over eligible results).
+        """
+        with self._lock:
+            groups = {key: list(totals) for key, totals in self._groups.items()}
+        report = {
+            "total": _summary(groups.get(("total",), [0, 0, 0.0, 0.0, 0.0])),
+            "byComposition": {},
+            "byChildren": {},
+            "byCompositionAndChildren": {},
+            "byRuleVersion": {},
+        }
+        for key, totals in sorted(groups.items(), key=lambda item: _sort_key(item[0])):
+            kind = key[0]
+            if kind == "composition":
+                report["byComposition"][key[1]] = _summary(totals)
+            elif kind == "children":
+                report["byChildren"][key[1]] = _summary(totals)
+            elif kind == "cell":
+                report["byCompositionAndChildren"].setdefault(key[1], {})[key[2]] = _summary(totals)
+            elif kind == "ruleVersion":
+                report["byRuleVersion"][str(key[1])] = _summary(totals)
+        return report
+
+    def reset(self):
+        """
+        Forget every result added so far.
+
+        :return: None
+        """
+        with self._lock:
+            self._groups.clear()
+            self._contributions.clear()
+
+
+def _sort_key(key):
+    # Children buckets sort numerically ("2" < "10" < "20+"); other keys as text
+    return tuple((0, int(part.rstrip("+")), part) if isinstance(part, str) and part.rstrip("+").isdigit()
+                 else (1, 0, str(part)) for part in key)
+
+
+def _summary(totals):
+    count, eligible, base, children, supplement = totals
+    return {
+        "count": count,
+        "eligible": eligible,
+        "eligibilityRate": eligible / count if count else 0.0,
+        "baseAmountTotal": base,
+        "childrenAmountTotal": children,
+        "supplementAmountTotal": supplement,
+        "averageSupplementAmount": supplement / eligible if eligible else 0.0,
+    }
+
+
+def aggregate_file(input_path, input_format=None, rules=None, max_children_bucket=STATS_MAX_CHILDREN_BUCKET):
+    """
+    Calculate and aggregate every record of a JSONL or CSV file (the `bulk_calculator`
+    input formats) in a single pass, without storing the results.
+
+    :param input_path: str
+        Input file ("-" for stdin).
+    :param input_format: str or None
+        Overrides format detection.
+    :param rules: RuleSet or None
+        The rules to calculate with; defaults to the active rules.
+    :param max_children_bucket: int
+        Passed to `SupplementAggregator`.
+    :return: dict
+        The aggregator snapshot, plus "rejected": the number of invalid records skipped.
+        Every valid record is counted, with no per-record state, so memory use does not
+        depend on the size of the file.
+    """
+    from bulk_calculator import detect_format, open_stream, parse_record, read_records
+
+    input_format = detect_format(input_path, input_format)
+    rules = rules or current_rules()
+    aggregator = SupplementAggregator(max_children_bucket)
+    rejected = 0
+    source = open_stream(input_path, "r")
+    try:
+        for raw in read_records(source, input_format):
+            try:
+                family = decode_family(parse_record(raw, input_format))
+            except ValueError:
+                rejected += 1
+                continue
+            aggregator.add(None, family.family_composition, family.number_of_children,
+                           calculate(family, rules).to_dict())
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    report = aggregator.snapshot()
+    report["rejected"] = rejected
+    return report
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        Process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Aggregate the winter supplements of a JSONL or CSV file.")
+    parser.add_argument("input", help="Input file (.jsonl or .csv), or - for stdin")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], help="Override input format detection")
+    parser.add_argument("--rules", help="Rule-set file to calculate with (default: the configured rules)")
+    parser.add_argument("--output", default="-", help="JSON file receiving the aggregates, or - for stdout")
+    args = parser.parse_args(argv)
+
+    from bulk_calculator import open_stream
+
+    rules = load_rule_set(args.rules, RULE_TABLE_MAX_CHILDREN) if args.rules else None
+    report = aggregate_file(args.input, args.input_format, rules)
+    sink = open_stream(args.output, "w")
+    try:
+        json.dump(report, sink, indent=2)
+        sink.write("\n")
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
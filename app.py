@@ -5,31 +5,549 @@ Author: Liliya
 This module calculates winter supplement amounts and processes user data 
 through a Flask API and MQTT messaging system.
 
+Submissions pass through the idempotency layer in `dedup.py`: repeated and identical
+requests are answered from the result store or the memo cache, or coalesced onto the
+calculation already in flight, instead of being published again.
+
+Submissions are admitted by a per-client token bucket (`rate_limiter.py`) and a cap
+on the submissions awaiting a result; rejected requests get HTTP 429 with Retry-After.
+
+Request, MQTT, calculation, store and error metrics are kept in `metrics.REGISTRY`
+and served on `/metrics` in the Prometheus text format.
+
+Requests and MQTT messages can be profiled (`profiling.py`): a sampled share, or requests
+carrying PROFILE_HEADER, run under cProfile, and slow ones are logged with the time spent
+in each phase (parse, validate, dedup, publish, calc, store).
+
+Every result stored for a calculated or memoized input is added to running totals
+(`aggregates.py`) by family composition, children bucket and rule version, served on `/stats`.
+
+Importing this module performs no I/O: the MQTT connection is opened by `start_mqtt`
+(called by `create_app(start_mqtt_client=True)` or when run as a script), asynchronously
+and with reconnect backoff, so startup never waits for the broker.
+
 Main Functions:
-- on_message: Handles incoming MQTT messages and processes the data.
+- create_app: Builds the Flask application and optionally starts the MQTT client.
+- start_mqtt / stop_mqtt: Start and stop the MQTT client and its worker pool.
+- publish: Publishes with the configured QoS, queueing on disk while disconnected.
+- publish_input: Publishes records to an input topic, reporting failures.
+- on_message: Queues incoming MQTT messages for the worker pool.
+- process_message: Processes the data of one MQTT message on a worker thread.
+- store_result: Stores a result and shares it with coalesced requests.
+- admission_response: Applies rate limiting and the pending cap to a submission.
 - submit: Validates and processes input data via the `/submit` endpoint.
+- submit_batch: Validates and processes many records via the `/submit/batch` endpoint.
 - get_result: Retrieves calculation results via the `/result/<topic_id>` endpoint.
+- get_metrics: Serves the metrics via the `/metrics` endpoint.
+- reload_rule_set: Swaps in the configured rule set (also on SIGHUP and `POST /rules/reload`).
+- get_rules: Serves the active rule set via the `/rules` endpoint.
+- get_stats: Serves the aggregate payout statistics via the `/stats` endpoint.
+- debug_profile: Serves the aggregated profile via the `/debug/profile` endpoint.
 """
 
 
-import json
-from flask import Flask, request, jsonify
+import math
+import signal
+import threading
+import time
+from flask import Blueprint, Flask, Response, g, request
 import paho.mqtt.client as mqtt
-from supplement_calculator import calculate_supplement
+import codec
+from records import ValidationError, decode_family, is_topic_id
+from supplement_calculator import calculate, current_rules, reload_rules
+from rule_sets import RuleSetError
+from result_store import create_result_store, EXPIRED, MISSING
+from dispatcher import MessageDispatcher
+from dedup import RequestDeduplicator, SUBMIT, MEMO
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, FAST_BUCKETS
+from output_batcher import OutputBatcher
+from offline_queue import OfflineQueue
+from rate_limiter import TokenBucketLimiter
+from profiling import RequestProfiler, SORT_KEYS as PROFILE_SORT_KEYS
+from aggregates import SupplementAggregator
 from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, BROKER, PORT
+from config import RESULT_STORE_MAX_ENTRIES, RESULT_STORE_TTL_SECONDS, RESULT_MAX_WAIT_SECONDS
+from config import MQTT_INPUT_BATCH_TOPIC, MQTT_BATCH_MAX_ITEMS
+from config import MQTT_WORKERS, MQTT_QUEUE_SIZE, MQTT_QUEUE_POLICY
+from config import MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY
+from config import DEDUP_MAX_ENTRIES, DEDUP_INFLIGHT_TIMEOUT_SECONDS
+from config import MQTT_CONSUME_INPUT
+from config import RESULT_STORE_BACKEND, RESULT_STORE_PATH, RESULT_STORE_REDIS_URL
+from config import MQTT_OUTPUT_BATCHING, MQTT_OUTPUT_BATCH_TOPIC, MQTT_OUTPUT_FANOUT
+from config import MQTT_OUTPUT_BATCH_MAX_ITEMS, MQTT_OUTPUT_BATCH_MAX_DELAY_MS
+from config import MQTT_QOS, MQTT_CLIENT_ID, MQTT_CLEAN_SESSION, MQTT_MAX_INFLIGHT
+from config import MQTT_OFFLINE_QUEUE_PATH, MQTT_OFFLINE_QUEUE_MAX_MESSAGES
+from config import RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS, RATE_LIMIT_CLIENT_HEADER
+from config import MAX_PENDING_RESULTS, PENDING_TIMEOUT_SECONDS, ADMISSION_RETRY_AFTER_SECONDS
+from config import PROFILE_SAMPLE_RATIO, PROFILE_HEADER, SLOW_REQUEST_SECONDS, SLOW_REQUEST_MAX_ENTRIES
+from config import PROFILE_DEBUG_ENDPOINT
+
+# HTTP routes, registered on the application by `create_app`
+api = Blueprint("api", __name__)
 
-# Flask App
-app = Flask(__name__)
+# Bounded storage for results (shared between processes with the "sqlite" or "redis" backend)
+results = create_result_store(
+    RESULT_STORE_BACKEND,
+    max_entries=RESULT_STORE_MAX_ENTRIES,
+    ttl_seconds=RESULT_STORE_TTL_SECONDS,
+    path=RESULT_STORE_PATH,
+    redis_url=RESULT_STORE_REDIS_URL,
+    pending_timeout=PENDING_TIMEOUT_SECONDS,
+)
 
-# In-memory storage for results
-results = {}
+# Idempotency layer and memo cache in front of the MQTT pipeline
+deduplicator = RequestDeduplicator(
+    results, max_entries=DEDUP_MAX_ENTRIES, inflight_timeout=DEDUP_INFLIGHT_TIMEOUT_SECONDS
+)
+
+# Per-client rate limiting of submissions
+rate_limiter = TokenBucketLimiter(
+    RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, max_clients=RATE_LIMIT_MAX_CLIENTS
+) if RATE_LIMIT_PER_SECOND else None
+
+# Running totals of the stored results, served on /stats
+aggregator = SupplementAggregator()
+
+# Opt-in request profiling and slow-request log
+profiler = RequestProfiler(PROFILE_SAMPLE_RATIO, SLOW_REQUEST_SECONDS, max_slow=SLOW_REQUEST_MAX_ENTRIES)
 
 # MQTT Client setup
-client = mqtt.Client()
+client = mqtt.Client(client_id=MQTT_CLIENT_ID, clean_session=MQTT_CLEAN_SESSION)
+
+# Messages published while disconnected, replayed on reconnect (opened on first use)
+offline_queue = OfflineQueue(
+    MQTT_OFFLINE_QUEUE_PATH, max_messages=MQTT_OFFLINE_QUEUE_MAX_MESSAGES
+) if MQTT_OFFLINE_QUEUE_PATH else None
+
+# Metrics served on /metrics
+HTTP_REQUESTS = REGISTRY.counter(
+    "supplement_http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "supplement_http_request_duration_seconds", "HTTP request latency by route.", ("route",)
+)
+MQTT_PUBLISHED = REGISTRY.counter(
+    "supplement_mqtt_published_total", "MQTT messages published by topic kind.", ("topic",)
+)
+MQTT_RECEIVED = REGISTRY.counter(
+    "supplement_mqtt_received_total", "MQTT messages received by topic kind.", ("topic",)
+)
+MQTT_DROPPED = REGISTRY.counter(
+    "supplement_mqtt_dropped_total", "MQTT messages dropped because the worker queue was full."
+)
+MESSAGE_LATENCY = REGISTRY.histogram(
+    "supplement_mqtt_message_duration_seconds", "Time to process one MQTT message on a worker.", ("topic",)
+)
+CALCULATION_LATENCY = REGISTRY.histogram(
+    "supplement_calculation_duration_seconds", "Time to calculate one supplement.", buckets=FAST_BUCKETS
+)
+ERRORS = REGISTRY.counter("supplement_errors_total", "Errors by stage and type.", ("stage", "type"))
+MQTT_QUEUED_OFFLINE = REGISTRY.counter(
+    "supplement_mqtt_offline_queued_total", "MQTT messages queued on disk while disconnected or behind a replay."
+)
+OUTPUT_BATCH_SIZE = REGISTRY.histogram(
+    "supplement_output_batch_size", "Results per published output batch.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+OUTPUT_BATCH_WAIT = REGISTRY.histogram(
+    "supplement_output_batch_wait_seconds", "Time the oldest result of an output batch was buffered."
+)
+OUTPUT_BATCH_FLUSHES = REGISTRY.counter(
+    "supplement_output_batch_flushes_total", "Output batches published by flush reason.", ("reason",)
+)
+RULE_RELOADS = REGISTRY.counter("supplement_rule_reloads_total", "Rule sets loaded after startup.")
+HTTP_REJECTED = REGISTRY.counter(
+    "supplement_http_rejected_total", "Submissions rejected by admission control, by reason.", ("reason",)
+)
+
+# Each component's stats() is read once per scrape (a store may have to count its entries)
+REGISTRY.callbacks(lambda: results.stats(), (
+    ("supplement_result_store_entries", "gauge", "size", "Entries in the result store."),
+    ("supplement_result_store_hits_total", "counter", "hits", "Result store lookups that found a value."),
+    ("supplement_result_store_misses_total", "counter", "misses", "Result store lookups that found nothing."),
+    ("supplement_result_store_evictions_total", "counter", "evictions", "Results evicted from the store."),
+    ("supplement_result_store_waiters", "gauge", "waiters", "Requests waiting for a result."),
+    ("supplement_result_store_pending", "gauge", "pending", "Submissions awaiting a result."),
+))
+REGISTRY.callbacks(lambda: dispatcher.stats(), (
+    ("supplement_mqtt_queue_depth", "gauge", "queueDepth", "MQTT messages waiting for a worker."),
+    ("supplement_mqtt_processed_total", "counter", "processed", "MQTT messages processed by the workers."),
+    ("supplement_mqtt_failed_total", "counter", "failed", "MQTT messages whose processing raised an error."),
+))
+REGISTRY.callbacks(lambda: deduplicator.stats(), (
+    ("supplement_dedup_submitted_total", "counter", "submitted", "Submissions published for calculation."),
+    ("supplement_dedup_duplicates_total", "counter", "duplicates", "Re-submissions answered from the store."),
+    ("supplement_dedup_coalesced_total", "counter", "coalesced", "Submissions coalesced onto one in flight."),
+    ("supplement_dedup_memo_hits_total", "counter", "memoHits", "Submissions answered from the memo cache."),
+    ("supplement_dedup_memo_misses_total", "counter", "memoMisses", "Memo cache misses."),
+    ("supplement_dedup_memo_hit_ratio", "gauge", "memoHitRate", "Memo cache hit ratio."),
+))
+REGISTRY.callback("supplement_rule_set_info", "The active rule set version.",
+                  lambda: {current_rules().version: 1}, labelnames=("version",))
+REGISTRY.callback("supplement_mqtt_connected", "1 while the MQTT client is connected.",
+                  lambda: int(client.is_connected()))
+if offline_queue is not None:
+    REGISTRY.callbacks(lambda: offline_queue.stats(), (
+        ("supplement_mqtt_offline_queue_depth", "gauge", "size", "MQTT messages waiting in the offline queue."),
+        ("supplement_mqtt_offline_replayed_total", "counter", "replayed", "Offline messages replayed."),
+        ("supplement_mqtt_offline_dropped_total", "counter", "dropped", "Offline messages dropped when full."),
+    ))
+
+def topic_kind(topic):
+    """
+    Classify a topic for metric labels.
+
+    :param topic: str
+    :return: str
+        "batch", "input", "batch_output", "output" or "other".
+    """
+    if topic.startswith(MQTT_INPUT_BATCH_TOPIC):
+        return "batch"
+    if topic.startswith(MQTT_INPUT_TOPIC_BASE):
+        return "input"
+    if topic.startswith(MQTT_OUTPUT_BATCH_TOPIC):
+        return "batch_output"
+    if topic.startswith(MQTT_OUTPUT_TOPIC_BASE):
+        return "output"
+    return "other"
+
+def publish(client, topic, payload):
+    """
+    Publish a message with MQTT_QOS and count it.
+
+    Once the MQTT client is started, messages published while it is disconnected are
+    queued on disk and replayed on reconnect. Until the replay has drained the queue,
+    new messages are queued behind it so they keep their order. (QoS>0 messages whose
+    connection drops during the publish are kept and resent by paho itself.)
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param topic: str
+    :param payload: bytes
+    :return: bool
+        False if the message was neither sent nor kept for sending (e.g. the client is
+        disconnected at QoS 0 with no offline queue).
+    :raises ValueError:
+        If paho rejects the topic or payload.
+    """
+    MQTT_PUBLISHED.labels(topic_kind(topic)).inc()
+    queue_offline = offline_queue is not None and _mqtt_started
+    if queue_offline:
+        if not client.is_connected():
+            offline_queue.put(topic, payload, MQTT_QOS)
+            MQTT_QUEUED_OFFLINE.inc()
+            return True
+        if offline_queue.defer(topic, payload, MQTT_QOS):
+            MQTT_QUEUED_OFFLINE.inc()
+            if not offline_queue.replaying:
+                start_offline_replay(client)  # A replay stopped early: resume it now that we are connected
+            return True
+    with profiler.phase("publish"):
+        info = client.publish(topic, payload, qos=MQTT_QOS)
+    rc = getattr(info, "rc", mqtt.MQTT_ERR_SUCCESS)
+    if rc == mqtt.MQTT_ERR_NO_CONN and queue_offline and MQTT_QOS == 0:
+        offline_queue.put(topic, payload, MQTT_QOS)
+        MQTT_QUEUED_OFFLINE.inc()
+    elif rc != mqtt.MQTT_ERR_SUCCESS:
+        ERRORS.labels("publish", "NoConnection" if rc == mqtt.MQTT_ERR_NO_CONN else "PublishFailed").inc()
+        return rc == mqtt.MQTT_ERR_NO_CONN and MQTT_QOS > 0  # Kept by paho and sent on reconnect
+    return True
+
+def publish_input(client, topic, payload):
+    """
+    Publish records to an input topic, reporting whether they were sent.
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param topic: str
+    :param payload: bytes
+    :return: bool
+        False if `publish` failed or paho rejected the message.
+    """
+    try:
+        return publish(client, topic, payload)
+    except ValueError:
+        ERRORS.labels("publish", "ValueError").inc()
+        return False
+
+def replay_offline_queue(client):
+    """
+    Publish the messages queued while disconnected, stopping if the connection drops again.
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :return: int
+        Number of messages replayed.
+    """
+    def send(topic, payload, qos):
+        if not client.is_connected():
+            return False
+        rc = client.publish(topic, payload, qos=qos).rc
+        return rc == mqtt.MQTT_ERR_SUCCESS or (rc == mqtt.MQTT_ERR_NO_CONN and qos > 0)
+
+    return offline_queue.replay(send)
+
+def start_offline_replay(client):
+    """
+    Replay the offline queue on a background thread.
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :return: None
+    """
+    threading.Thread(target=replay_offline_queue, args=(client,), name="mqtt-offline-replay", daemon=True).start()
+
+def client_key():
+    """
+    Identify the client of the current request for rate limiting.
+
+    :return: str
+        The RATE_LIMIT_CLIENT_HEADER value if configured and present, else the remote address.
+    """
+    if RATE_LIMIT_CLIENT_HEADER:
+        key = request.headers.get(RATE_LIMIT_CLIENT_HEADER)
+        if key:
+            return key
+    return request.remote_addr or ""
+
+def admission_response(cost=1):
+    """
+    Apply admission control to a submission: the global cap on submissions awaiting a
+    result, then the client's rate limit.
+
+    :param cost: int
+        Records in the submission.
+    :return: Response object or None
+        HTTP 429 with a Retry-After header if the submission is rejected, otherwise None.
+    """
+    if MAX_PENDING_RESULTS is not None and results.pending_count() >= MAX_PENDING_RESULTS:
+        HTTP_REJECTED.labels("overloaded").inc()
+        return too_many_requests("Too many submissions in progress", ADMISSION_RETRY_AFTER_SECONDS)
+    if rate_limiter is not None:
+        retry_after = rate_limiter.acquire(client_key(), cost)
+        if retry_after > 0:
+            HTTP_REJECTED.labels("rate_limited").inc()
+            return too_many_requests("Rate limit exceeded", retry_after)
+    return None
+
+def too_many_requests(message, retry_after):
+    """
+    Build an HTTP 429 response.
+
+    :param message: str
+    :param retry_after: float
+        Seconds before the client should retry, rounded up in the Retry-After header.
+    :return: Response object
+    """
+    response = json_response({"error": message}, 429)
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def json_response(obj, status=200):
+    """
+    Build a JSON response with the fast codec.
+
+    :param obj: dict
+        The response body.
+    :param status: int
+        The HTTP status code.
+    :return: Response object
+    """
+    return Response(codec.dumps(obj), status=status, mimetype="application/json")
+
+def read_json():
+    """
+    Decode the JSON body of the current request with the fast codec.
+
+    :return: object or None
+        The decoded body, or None if it is not JSON.
+    """
+    if not request.is_json:
+        return None
+    try:
+        return codec.loads(request.get_data())
+    except ValueError:
+        return None
+
+def observe_output_batch(size, waited, reason):
+    OUTPUT_BATCH_SIZE.observe(size)
+    OUTPUT_BATCH_WAIT.observe(waited)
+    OUTPUT_BATCH_FLUSHES.labels(reason).inc()
+
+# Micro-batching of published results (None when MQTT_OUTPUT_BATCHING is off)
+output_batcher = OutputBatcher(
+    lambda topic, payload: publish(client, topic, payload),
+    MQTT_OUTPUT_BATCH_TOPIC,
+    max_items=MQTT_OUTPUT_BATCH_MAX_ITEMS,
+    max_delay=MQTT_OUTPUT_BATCH_MAX_DELAY_MS / 1000,
+    observe=observe_output_batch,
+) if MQTT_OUTPUT_BATCHING else None
+
+def publish_result(client, topic_id, result, fmt=codec.JSON):
+    """
+    Publish a result to the output topic of a topic ID, and add it to the output
+    batch when batching is enabled (per-topic messages are then optional).
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param topic_id: str
+        The unique identifier for the calculation.
+    :param result: dict
+        The calculation result.
+    :param fmt: str
+        Payload format of the published result.
+    :return: None
+    """
+    if output_batcher is not None:
+        output_batcher.add(topic_id, result, fmt)
+        if not MQTT_OUTPUT_FANOUT:
+            return
+    output_topic = codec.with_format(f"{MQTT_OUTPUT_TOPIC_BASE}/{topic_id}", fmt)
+    publish(client, output_topic, codec.encode(result, fmt))
+
+def store_result(client, topic_id, result, fmt=codec.JSON, family=None):
+    """
+    Store a result, then store and publish it for the requests coalesced onto it.
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param topic_id: str
+        The unique identifier for the calculation.
+    :param result: dict
+        The calculation result.
+    :param fmt: str
+        Payload format of the results published for coalesced requests.
+    :param family: FamilyInput or None
+        The input the result was calculated for; defaults to the input the topic ID was
+        submitted with (see `RequestDeduplicator.complete`). The result then replaces the
+        entry of the topic ID in `aggregator`; an error result removes it. A result whose
+        input is unknown (a redelivered or echoed output) leaves the aggregates unchanged.
+        Coalesced requests are aggregated with their own inputs.
+    :return: None
+    """
+    with profiler.phase("store"):
+        results[topic_id] = result
+    submitted, followers = deduplicator.complete(topic_id, result)
+    family = family or submitted
+    if result.get("status") == "error":
+        aggregator.discard(topic_id)
+    elif family is not None:
+        aggregator.add(topic_id, family.family_composition, family.number_of_children, result)
+    for follower, follower_family in followers:
+        results[follower] = result
+        aggregator.add(follower, follower_family.family_composition, follower_family.number_of_children, result)
+        publish_result(client, follower, result, fmt)
+
+def process_record(client, topic_id, data, fmt=codec.JSON):
+    """
+    Calculate the supplement for one record, store it and publish it to the output topic.
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param topic_id: str
+        The unique identifier for the calculation.
+    :param data: dict
+        The family record. Records failing validation are stored as
+        {"status": "error", "error": message} and not published.
+    :param fmt: str
+        Payload format of the published result (the format of the input message).
+    :return: None
+    """
+    try:
+        with profiler.phase("validate"):
+            family = decode_family(data, require_id=False)
+    except ValidationError as e:
+        ERRORS.labels("record", "ValidationError").inc()
+        results[topic_id] = {"status": "error", "error": str(e)}
+        aggregator.discard(topic_id)
+        raise
+    with profiler.phase("calc"):
+        started = time.perf_counter()
+        result = calculate(family).to_dict()
+        CALCULATION_LATENCY.observe(time.perf_counter() - started)
+    store_result(client, topic_id, result, fmt, family)
+    # Publish the result back to the output topic
+    publish_result(client, topic_id, result, fmt)
+
+def process_message(client, msg):
+    """
+    Process an incoming MQTT message on a worker thread.
+
+    Messages on `MQTT_INPUT_BATCH_TOPIC` carry an array of records, each with its
+    own `id`; input messages carry a single record for the topic ID in its topic.
+    Output messages carry a result calculated elsewhere, which is only stored;
+    messages on `MQTT_OUTPUT_BATCH_TOPIC` carry an array of results with their `id`.
+    Payloads are JSON unless the topic suffix or content type selects another format
+    (see `codec.message_format`).
+
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param msg: mqtt.MQTTMessage
+        The MQTT message containing a topic and payload.
+    :return: None
+    :raises ValueError:
+        If the payload cannot be decoded or the record cannot be calculated.
+    """
+    topic, fmt = codec.message_format(msg)
+    with profiler.phase("parse"):
+        data = codec.decode(msg.payload, fmt)
+    if topic == MQTT_INPUT_BATCH_TOPIC:
+        for record in data:
+            topic_id = record.get("id") if isinstance(record, dict) else None
+            if not is_topic_id(topic_id):
+                ERRORS.labels("batch_record", "ValidationError").inc()  # No topic ID to report it under
+                continue
+            try:
+                process_record(client, topic_id, record, fmt)
+            except ValidationError:
+                pass  # Stored as an error result and counted by process_record
+            except Exception as e:
+                ERRORS.labels("batch_record", type(e).__name__).inc()
+    elif topic == MQTT_OUTPUT_BATCH_TOPIC:
+        for record in data:
+            result = dict(record)
+            store_result(client, result.pop("id"), result, fmt)
+    elif topic.startswith(f"{MQTT_OUTPUT_TOPIC_BASE}/"):
+        store_result(client, topic.split("/")[-1], data, fmt)
+    else:
+        process_record(client, topic.split("/")[-1], data, fmt)
+
+def handle_message(item):
+    """
+    Process one queued MQTT message, timing it and counting its errors by type.
+
+    :param item: tuple
+        (client, msg) as queued by `on_message`.
+    :return: None
+    """
+    client, msg = item
+    kind = topic_kind(msg.topic)
+    capture = profiler.begin(f"mqtt {kind}")
+    started = time.perf_counter()
+    try:
+        process_message(client, msg)
+    except Exception as e:
+        if not isinstance(e, ValidationError):
+            ERRORS.labels("message", type(e).__name__).inc()
+        raise
+    finally:
+        MESSAGE_LATENCY.labels(kind).observe(time.perf_counter() - started)
+        profiler.end(capture)
+
+# Worker pool processing MQTT messages off the paho network thread
+dispatcher = MessageDispatcher(
+    handle_message,
+    workers=MQTT_WORKERS,
+    max_queue=MQTT_QUEUE_SIZE,
+    policy=MQTT_QUEUE_POLICY,
+)
 
 def on_message(client, userdata, msg):
     """
-    Handle incoming MQTT messages.
+    Handle incoming MQTT messages by queueing them for the worker pool.
+
+    Runs on the paho network thread, so it only enqueues the message; decoding,
+    calculation and publishing happen in `process_message`.
 
     :param client: mqtt.Client
         The MQTT client instance.
@@ -39,72 +557,425 @@ def on_message(client, userdata, msg):
         The MQTT message containing a topic and payload.
     :return: None
     """
-    try:
-        data = json.loads(msg.payload)
-        topic_id = msg.topic.split("/")[-1]
-        result = calculate_supplement(data)
-        results[topic_id] = result
-        # Publish the result back to the output topic
-        output_topic = f"{MQTT_OUTPUT_TOPIC_BASE}/{topic_id}"
-        client.publish(output_topic, json.dumps(result))
-    except Exception as e:
-        print(f"Error processing MQTT message: {e}")
+    MQTT_RECEIVED.labels(topic_kind(msg.topic)).inc()
+    if not dispatcher.submit((client, msg)):
+        MQTT_DROPPED.inc()
+
+def on_connect(client, userdata, flags, rc):
+    """
+    Subscribe to the input and output topics whenever the connection is (re)established,
+    then replay the offline queue in the background.
+
+    With MQTT_CONSUME_INPUT disabled, only the output topics are subscribed: the input
+    stream is calculated by `consumer.py` workers. Results are read from the batch
+    output topic when batching is enabled without per-topic fan-out.
 
-client.on_message = on_message
-client.connect(BROKER, PORT)
-client.loop_start()
+    :param client: mqtt.Client
+        The MQTT client instance.
+    :param userdata:
+        User-defined data (not used in this function).
+    :param flags: dict
+        Response flags sent by the broker.
+    :param rc: int
+        The connection result; 0 means success.
+    :return: None
+    """
+    if rc != 0:
+        ERRORS.labels("connect", "ConnectionRefused").inc()
+        print(f"MQTT connection refused: {mqtt.connack_string(rc)}")
+        return
+    if MQTT_CONSUME_INPUT:
+        client.subscribe(f"{MQTT_INPUT_TOPIC_BASE}/#", qos=MQTT_QOS)
+        client.subscribe(f"{MQTT_INPUT_BATCH_TOPIC}/#", qos=MQTT_QOS)
+    if MQTT_OUTPUT_BATCHING and not MQTT_OUTPUT_FANOUT:
+        client.subscribe(f"{MQTT_OUTPUT_BATCH_TOPIC}/#", qos=MQTT_QOS)
+    else:
+        client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#", qos=MQTT_QOS)
+    if offline_queue is not None and len(offline_queue):
+        start_offline_replay(client)
+
+_mqtt_lock = threading.Lock()
+_mqtt_started = False
+
+def start_mqtt():
+    """
+    Start the worker pool and connect the MQTT client in the background.
 
-@app.route('/submit', methods=['POST'])
+    The connection is made asynchronously by the paho network thread, which retries
+    with exponential backoff between MQTT_RECONNECT_MIN_DELAY and MQTT_RECONNECT_MAX_DELAY
+    seconds until the broker is reachable. Calling this more than once has no effect.
+    The rule set is loaded first, so an invalid rule-set file fails startup, and the
+    offline queue is opened so its depth is reported from startup.
+
+    :return: None
+    :raises RuleSetError:
+        If the configured rule-set file is invalid.
+    """
+    global _mqtt_started
+    with _mqtt_lock:
+        if _mqtt_started:
+            return
+        current_rules()
+        if offline_queue is not None:
+            offline_queue.open()  # Reports the backlog of a previous run before the first reconnect
+        client.on_connect = on_connect
+        client.on_message = on_message
+        dispatcher.start()
+        client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        client.reconnect_delay_set(MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY)
+        client.connect_async(BROKER, PORT)
+        client.loop_start()
+        _mqtt_started = True
+
+def stop_mqtt():
+    """
+    Finish the messages already queued, publish the buffered output batch, then
+    disconnect the MQTT client.
+
+    :return: None
+    """
+    global _mqtt_started
+    with _mqtt_lock:
+        if not _mqtt_started:
+            return
+        dispatcher.shutdown(drain=True)
+        if output_batcher is not None:
+            output_batcher.close()
+        client.disconnect()
+        client.loop_stop()
+        _mqtt_started = False
+
+@api.route('/submit', methods=['POST'])
 def submit():
     """
     Handle data submission via the `/submit` endpoint.
 
+    Only new work is published: a completed topic ID re-submitted with the same input
+    keeps its stored result, an input calculated before is answered from the memo cache,
+    and a request identical to one in flight waits for that calculation.
+
     :return: Response object
         HTTP 200 with JSON: {"id": topic_id} if validation passes.
         HTTP 400 with JSON error messages if input validation fails.
+        HTTP 429 with a Retry-After header if admission control rejects the request.
+        HTTP 503 if the record could not be published; the requests coalesced onto it
+        are given an error result.
     :raises KeyError:
         If required fields are missing from the input.
     """
-    data = request.get_json()
-    topic_id = data.get("id")
+    rejected = admission_response()
+    if rejected is not None:
+        return rejected
+    with profiler.phase("parse"):
+        data = read_json()
+    try:
+        with profiler.phase("validate"):
+            family = decode_family(data)
+    except ValidationError as e:
+        return json_response({"error": str(e)}, 400)
+    topic_id = family.id
+
+    # The result is marked "pending" before publishing so a fast reply is not overwritten
+    with profiler.phase("dedup"):
+        decision, result = deduplicator.admit(topic_id, family)
+    if decision == SUBMIT:
+        # Publish input data to the MQTT input topic
+        input_topic = f"{MQTT_INPUT_TOPIC_BASE}/{topic_id}"
+        if not publish_input(client, input_topic, codec.dumps(data)):
+            deduplicator.abort(topic_id)
+            return json_response({"error": "MQTT broker unavailable"}, 503)
+    elif decision == MEMO:
+        results[topic_id] = result
+        aggregator.add(topic_id, family.family_composition, family.number_of_children, result)
+        publish_result(client, topic_id, result)
+    return json_response({"id": topic_id}, 200)
+
+
+def parse_batch_body():
+    """
+    Parse the body of a `/submit/batch` request.
 
-    if not topic_id:
-        return jsonify({"error": "Topic ID is required"}), 400
+    :return: list or None
+        The submitted records, or None if the body is neither a JSON array nor NDJSON.
+        Unparseable NDJSON lines are returned as None so they are reported per item.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(codec.loads(line))
+            except ValueError:
+                records.append(None)
+        return records
 
-    family_composition = data.get("familyComposition")
-    if family_composition not in ["single", "couple"]:
-        return jsonify({"error": "Invalid familyComposition"}), 400
+    data = read_json()
+    return data if isinstance(data, list) else None
 
-    number_of_children = data.get("numberOfChildren")
-    if not isinstance(number_of_children, int) or number_of_children < 0:
-        return jsonify({"error": "Invalid numberOfChildren"}), 400
 
-    family_unit_in_pay = data.get("familyUnitInPayForDecember")
-    if not isinstance(family_unit_in_pay, bool):
-        return jsonify({"error": "Invalid familyUnitInPayForDecember"}), 400
+@api.route('/submit/batch', methods=['POST'])
+def submit_batch():
+    """
+    Handle bulk data submission via the `/submit/batch` endpoint.
 
-    # Publish input data to the MQTT input topic
-    input_topic = f"{MQTT_INPUT_TOPIC_BASE}/{topic_id}"
-    client.publish(input_topic, json.dumps(data))
+    Accepts a JSON array or an NDJSON stream of family records. Every record is
+    validated with the same rules as `/submit` and deduplicated the same way; records
+    needing a calculation are published in groups of up to `MQTT_BATCH_MAX_ITEMS` to
+    `MQTT_INPUT_BATCH_TOPIC`.
 
-    # Initialize the result as "pending"
-    results[topic_id] = {"status": "pending"}
-    return jsonify({"id": topic_id}), 200
+    :return: Response object
+        HTTP 200 with JSON: {"items": [...], "accepted": int, "rejected": int}, where each
+        item is {"id": topic_id} or {"index": int, "id": topic_id, "error": message}; records
+        that could not be published are reported as errors, and the requests coalesced onto
+        them are given an error result.
+        HTTP 400 with a JSON error message if the body is not a list of records.
+        HTTP 429 with a Retry-After header if admission control rejects the request.
+    """
+    with profiler.phase("parse"):
+        records = parse_batch_body()
+    if records is None:
+        return json_response({"error": "Expected a JSON array or NDJSON records"}, 400)
+    rejected = admission_response(len(records))
+    if rejected is not None:
+        return rejected
 
+    items = []
+    valid = []
+    seen = set()
+    for index, data in enumerate(records):
+        try:
+            if data is None:
+                raise ValidationError("Invalid JSON")
+            with profiler.phase("validate"):
+                family = decode_family(data)
+            if family.id in seen:
+                raise ValidationError("Duplicate id in batch")
+            error = None
+        except ValidationError as e:
+            error = str(e)
+        if error:
+            item = {"index": index, "error": error}
+            if isinstance(data, dict) and is_topic_id(data.get("id")):
+                item["id"] = data["id"]
+            items.append(item)
+            continue
+        seen.add(family.id)
+        valid.append((family, data))
+        items.append({"id": family.id})
 
-@app.route('/result/<topic_id>', methods=['GET'])
+    # Results are marked "pending" before publishing so a fast reply is not overwritten
+    pending = []
+    for family, data in valid:
+        with profiler.phase("dedup"):
+            decision, result = deduplicator.admit(family.id, family)
+        if decision == SUBMIT:
+            pending.append(data)
+        elif decision == MEMO:
+            results[family.id] = result
+            aggregator.add(family.id, family.family_composition, family.number_of_children, result)
+            publish_result(client, family.id, result)
+    failed = set()
+    for start in range(0, len(pending), MQTT_BATCH_MAX_ITEMS):
+        group = pending[start:start + MQTT_BATCH_MAX_ITEMS]
+        if not publish_input(client, MQTT_INPUT_BATCH_TOPIC, codec.dumps(group)):
+            for data in group:
+                failed.update(deduplicator.abort(data["id"]))
+    if failed:
+        for index, item in enumerate(items):
+            if "error" not in item and item["id"] in failed:
+                items[index] = {"index": index, "id": item["id"], "error": "MQTT broker unavailable"}
+    accepted = sum(1 for item in items if "error" not in item)
+
+    return json_response({"items": items, "accepted": accepted, "rejected": len(items) - accepted}, 200)
+
+
+@api.route('/result/<topic_id>', methods=['GET'])
 def get_result(topic_id):
     """
     Fetch calculation result via the `/result/<topic_id>` endpoint.
 
+    With `?wait=<seconds>` (up to RESULT_MAX_WAIT_SECONDS), a pending request is held
+    until `on_message` stores the result or the timeout expires.
+
     :param topic_id: str
         The unique identifier for the calculation.
     :return: Response object
         HTTP 200 with the result (JSON object). 
         If the result is not ready, returns {"status": "pending"}.
+        If the result was stored but has expired, returns {"status": "expired"}.
+        If the MQTT input failed validation, returns {"status": "error", "error": message}.
+        HTTP 400 if `wait` is not a number.
+    """
+    try:
+        wait = min(max(float(request.args.get("wait", 0)), 0.0), RESULT_MAX_WAIT_SECONDS)
+    except ValueError:
+        return json_response({"error": "Invalid wait"}, 400)
+
+    result = results.wait_for(topic_id, wait)
+    if result is EXPIRED:
+        return json_response({"status": "expired"})
+    if result is MISSING:
+        return json_response({"status": "pending"})
+    return json_response(result)
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Serve the metrics via the `/metrics` endpoint.
+
+    :return: Response object
+        HTTP 200 with the Prometheus text exposition format.
+    """
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+@api.route('/rules', methods=['GET'])
+def get_rules():
     """
-    result = results.get(topic_id, {"status": "pending"})
-    return jsonify(result)
+    Serve the active rule set via the `/rules` endpoint.
+
+    :return: Response object
+        HTTP 200 with the rule set in the rule-set file format.
+    """
+    return json_response(current_rules().to_dict())
+
+@api.route('/rules/reload', methods=['POST'])
+def post_rules_reload():
+    """
+    Reload the configured rule set via the `/rules/reload` endpoint.
+
+    :return: Response object
+        HTTP 200 with the new rule set.
+        HTTP 400 with a JSON error message if the rule-set file is invalid; the
+        active rules are then unchanged.
+    """
+    try:
+        rule_set = reload_rule_set()
+    except RuleSetError as e:
+        return json_response({"error": str(e)}, 400)
+    return json_response(rule_set.to_dict())
+
+@api.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Serve the aggregate statistics of the stored results via the `/stats` endpoint.
+
+    The totals are kept up to date as results are stored, so the cost of a query does
+    not depend on the number of results. They cover the results stored by this process
+    since it started, each topic ID counted once with its latest result.
+
+    :return: Response object
+        HTTP 200 with JSON (see `SupplementAggregator.snapshot`).
+    """
+    return json_response(aggregator.snapshot())
+
+@api.route('/debug/profile', methods=['GET', 'DELETE'])
+def debug_profile():
+    """
+    Serve the aggregated profile via the `/debug/profile` endpoint (when PROFILE_DEBUG_ENDPOINT is on).
+
+    Query parameters: `sort` (cumulative, tottime or calls), `limit` (functions listed)
+    and `format=text` for the `pstats` listing instead of JSON.
+
+    :return: Response object
+        HTTP 200 with the report (see `RequestProfiler.report`); DELETE clears it.
+        HTTP 400 if `sort` or `limit` is invalid.
+        HTTP 404 if the endpoint is disabled.
+    """
+    if not PROFILE_DEBUG_ENDPOINT:
+        return json_response({"error": "Not found"}, 404)
+    if request.method == "DELETE":
+        profiler.reset()
+        return json_response({"status": "reset"})
+    sort = request.args.get("sort", "cumulative")
+    try:
+        limit = int(request.args.get("limit", 30))
+    except ValueError:
+        limit = -1
+    if sort not in PROFILE_SORT_KEYS or limit < 0:
+        return json_response({"error": "Invalid sort or limit"}, 400)
+    if request.args.get("format") == "text":
+        return Response(profiler.report_text(sort, limit), content_type="text/plain")
+    return json_response(profiler.report(sort, limit))
+
+def reload_rule_set(path=None):
+    """
+    Load a rule set and swap it in, then forget the results memoized with the previous rules.
+
+    Requests are not paused: calculations in progress finish with the rules they started with.
+
+    :param path: str or None
+        Rule-set file; defaults to the configured benefit year.
+    :return: RuleSet
+        The new active rule set.
+    :raises RuleSetError:
+        If the file is missing or invalid.
+    """
+    rule_set = reload_rules(path)
+    deduplicator.clear(rule_set.version)
+    RULE_RELOADS.inc()
+    print(f"Loaded rule set {rule_set.version}")
+    return rule_set
+
+def reload_in_background(signum=None, frame=None):
+    """
+    Reload the rule set on a separate thread (used as the SIGHUP handler).
+
+    :return: None
+    """
+    def reload():
+        try:
+            reload_rule_set()
+        except RuleSetError as e:
+            ERRORS.labels("rules", "RuleSetError").inc()
+            print(f"Rule set not reloaded: {e}")
+
+    threading.Thread(target=reload, name="rule-reload", daemon=True).start()
+
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    force = PROFILE_HEADER is not None and PROFILE_HEADER in request.headers
+    if force or profiler.capturing:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        g.profile = profiler.begin(f"{request.method} {route}", force)
+
+def record_request(response):
+    """
+    Count a finished request and record its latency by route.
+
+    :param response: Response object
+    :return: Response object
+    """
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+    started = g.get("request_started")
+    if started is not None:
+        HTTP_LATENCY.labels(route).observe(time.perf_counter() - started)
+    return response
+
+def end_request_profile(error=None):
+    profiler.end(g.pop("profile", None))
+
+def create_app(start_mqtt_client=False):
+    """
+    Build the Flask application.
+
+    :param start_mqtt_client: bool
+        Start the MQTT client (see `start_mqtt`); WSGI servers can use
+        `app:create_app(start_mqtt_client=True)` as their entry point.
+    :return: Flask
+    """
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(api)
+    flask_app.before_request(start_request_timer)
+    flask_app.after_request(record_request)
+    flask_app.teardown_request(end_request_profile)
+    if start_mqtt_client:
+        start_mqtt()
+    return flask_app
+
+# Flask App (importing it does not connect to the broker)
+app = create_app()
 
 if __name__ == '__main__':
     """
@@ -112,5 +983,11 @@ if __name__ == '__main__':
 
     :return: None
     """
-    client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
-    app.run(debug=True, port=5000)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, reload_in_background)
+    start_mqtt()
+    try:
+        app.run(debug=True, port=5000)
+    finally:
+        stop_mqtt()
+        results.close()
@@ -0,0 +1,238 @@
+"""
+Winter Supplement Calculator (asyncio service mode)
+Author: Liliya
+----------------------------
+This module serves the same `/submit` and `/result/<topic_id>` contract as `app.py`
+on a single asyncio event loop, using aiohttp for HTTP and aiomqtt for MQTT. Waiting
+for a result (`GET /result/<topic_id>?wait=<seconds>`) costs a coroutine, not a thread,
+so long-polling clients are cheap to serve.
+
+Usage:
+    python async_app.py
+
+Main Classes and Functions:
+- SupplementService: Validates submissions, handles MQTT messages and stores results.
+- create_app: Builds the aiohttp application for a service.
+- run_mqtt: Connects to the broker and feeds messages to the service.
+"""
+
+import asyncio
+
+import aiomqtt
+from aiohttp import web
+
+import codec
+from records import ValidationError, decode_family, is_topic_id
+from supplement_calculator import calculate
+from result_store import AsyncResultStore, InMemoryResultStore, EXPIRED, MISSING
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, BROKER, PORT
+from config import RESULT_STORE_MAX_ENTRIES, RESULT_STORE_TTL_SECONDS, RESULT_MAX_WAIT_SECONDS
+from config import MQTT_INPUT_BATCH_TOPIC
+
+MQTT_RECONNECT_SECONDS = 5.0
+
+
+class SupplementService:
+    """
+    Transport-independent core of the asyncio service.
+
+    The MQTT client only needs an awaitable `publish(topic, payload)` method.
+    """
+
+    def __init__(self, store=None, mqtt_client=None):
+        """
+        :param store: AsyncResultStore or None
+            Result store; a bounded in-memory store is created when None.
+        :param mqtt_client:
+            Client used to publish; may be attached later by `run_mqtt`.
+        """
+        self.store = store or AsyncResultStore(
+            InMemoryResultStore(max_entries=RESULT_STORE_MAX_ENTRIES, ttl_seconds=RESULT_STORE_TTL_SECONDS)
+        )
+        self.mqtt_client = mqtt_client
+
+    async def submit(self, data):
+        """
+        Validate a family record and publish it to the MQTT input topic.
+
+        :param data: dict
+            The submitted record.
+        :return: str or None
+            The error message if validation fails, otherwise None.
+        :raises ConnectionError:
+            If the MQTT client is not connected yet.
+        """
+        try:
+            topic_id = decode_family(data).id
+        except ValidationError as e:
+            return str(e)
+        if self.mqtt_client is None:
+            raise ConnectionError("MQTT broker unavailable")
+        self.store.set(topic_id, {"status": "pending"})
+        await self.mqtt_client.publish(f"{MQTT_INPUT_TOPIC_BASE}/{topic_id}", codec.dumps(data))
+        return None
+
+    async def handle_message(self, topic, payload):
+        """
+        Handle an incoming MQTT message.
+
+        Input messages are calculated with `calculate`, stored and published
+        to the output topic; output messages (calculated elsewhere) are only stored.
+        In a batch message, records without a valid `id` are skipped and records failing
+        validation are stored as errors, without aborting the other records.
+
+        :param topic: str
+            The topic the message was published to, optionally with a format suffix.
+        :param payload: bytes or str
+            The payload, JSON unless the topic suffix selects another format.
+        :return: None
+        """
+        topic, fmt = codec.split_format(topic)
+        data = codec.decode(payload, fmt)
+        if topic == MQTT_INPUT_BATCH_TOPIC:
+            for record in data:
+                topic_id = record.get("id") if isinstance(record, dict) else None
+                if not is_topic_id(topic_id):
+                    continue  # No topic ID to report it under
+                try:
+                    await self.process_record(topic_id, record, fmt)
+                except ValidationError:
+                    pass  # Stored as an error result by process_record
+        elif topic.startswith(f"{MQTT_OUTPUT_TOPIC_BASE}/"):
+            self.store.set(topic.split("/")[-1], data)
+        else:
+            await self.process_record(topic.split("/")[-1], data, fmt)
+
+    async def process_record(self, topic_id, data, fmt=codec.JSON):
+        try:
+            family = decode_family(data, require_id=False)
+        except ValidationError as e:
+            self.store.set(topic_id, {"status": "error", "error": str(e)})
+            raise
+        result = calculate(family).to_dict()
+        self.store.set(topic_id, result)
+        output_topic = codec.with_format(f"{MQTT_OUTPUT_TOPIC_BASE}/{topic_id}", fmt)
+        await self.mqtt_client.publish(output_topic, codec.encode(result, fmt))
+
+
+SERVICE = web.AppKey("service", SupplementService)
+
+def parse_wait(request):
+    """
+    Read the optional `wait` query parameter.
+
+    :param request: web.Request
+    :return: float
+        Seconds to wait, clamped to [0, RESULT_MAX_WAIT_SECONDS].
+    :raises ValueError:
+        If the parameter is not a number.
+    """
+    wait = float(request.query.get("wait", 0))
+    return min(max(wait, 0.0), RESULT_MAX_WAIT_SECONDS)
+
+
+async def submit(request):
+    """
+    Handle data submission via the `/submit` endpoint.
+
+    :return: web.Response
+        HTTP 200 with JSON: {"id": topic_id} if validation passes.
+        HTTP 400 with JSON error messages if input validation fails.
+        HTTP 503 if the MQTT client is not connected yet.
+    """
+    try:
+        data = codec.loads(await request.read())
+    except ValueError:
+        data = None
+    try:
+        error = await request.app[SERVICE].submit(data)
+    except ConnectionError as e:
+        return web.json_response({"error": str(e)}, status=503, dumps=codec.dumps_text)
+    if error:
+        return web.json_response({"error": error}, status=400, dumps=codec.dumps_text)
+    return web.json_response({"id": data["id"]}, dumps=codec.dumps_text)
+
+
+async def get_result(request):
+    """
+    Fetch calculation result via the `/result/<topic_id>` endpoint.
+
+    With `?wait=<seconds>`, a pending request is held until the result is stored or
+    the timeout expires.
+
+    :return: web.Response
+        HTTP 200 with the result, {"status": "pending"} or {"status": "expired"}.
+        HTTP 400 if `wait` is not a number.
+    """
+    try:
+        wait = parse_wait(request)
+    except ValueError:
+        return web.json_response({"error": "Invalid wait"}, status=400, dumps=codec.dumps_text)
+    result = await request.app[SERVICE].store.wait_for(request.match_info["topic_id"], wait)
+    if result is EXPIRED:
+        return web.json_response({"status": "expired"}, dumps=codec.dumps_text)
+    if result is MISSING:
+        return web.json_response({"status": "pending"}, dumps=codec.dumps_text)
+    return web.json_response(result, dumps=codec.dumps_text)
+
+
+async def run_mqtt(service, hostname=BROKER, port=PORT):
+    """
+    Connect to the broker, subscribe to the input and output topics and feed every
+    message to the service, reconnecting after connection errors.
+
+    :param service: SupplementService
+    :param hostname: str
+    :param port: int
+    :return: None
+    """
+    while True:
+        try:
+            async with aiomqtt.Client(hostname, port) as client:
+                service.mqtt_client = client
+                async with client.messages() as messages:
+                    await client.subscribe(f"{MQTT_INPUT_TOPIC_BASE}/#")
+                    await client.subscribe(f"{MQTT_INPUT_BATCH_TOPIC}/#")
+                    await client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
+                    async for message in messages:
+                        try:
+                            await service.handle_message(message.topic.value, message.payload)
+                        except Exception as e:
+                            print(f"Error processing MQTT message: {e}")
+        except aiomqtt.MqttError as e:
+            service.mqtt_client = None
+            print(f"MQTT connection lost ({e}); reconnecting in {MQTT_RECONNECT_SECONDS}s")
+            await asyncio.sleep(MQTT_RECONNECT_SECONDS)
+
+
+def create_app(service=None, connect_mqtt=True):
+    """
+    Build the aiohttp application.
+
+    :param service: SupplementService or None
+        The service to expose; a new one is created when None.
+    :param connect_mqtt: bool
+        Run the MQTT client as a background task for the lifetime of the application.
+    :return: web.Application
+    """
+    app = web.Application()
+    app[SERVICE] = service or SupplementService()
+    app.router.add_post("/submit", submit)
+    app.router.add_get("/result/{topic_id}", get_result)
+
+    if connect_mqtt:
+        async def mqtt_task(app):
+            task = asyncio.create_task(run_mqtt(app[SERVICE]))
+            yield
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        app.cleanup_ctx.append(mqtt_task)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), port=5000)
@@ -0,0 +1,565 @@
+"""
+Winter Supplement Benchmarks
+Author: Liliya
+----------------------------
+This module is a reproducible benchmark suite for the supplement calculator and the
+Flask/MQTT pipeline. HTTP endpoints are driven through Flask's test client and MQTT
+traffic goes through the in-process `LocalBroker`, so no network is needed. The `qos`
+benchmark is the exception: it needs a real broker (BROKER:PORT, or `--broker`) and only
+runs when selected with `--only qos`.
+
+Results are written to a JSON baseline; compare mode re-runs the suite and flags
+metrics that regressed beyond a threshold. Metric names ending in `PerSecond` are
+better when higher, names ending in `Ms` are better when lower.
+
+Usage:
+    python benchmark.py run --output benchmark_baseline.json
+    python benchmark.py compare benchmark_baseline.json --threshold 0.10
+    python benchmark.py run --only calculator,rule_table
+    python benchmark.py run --only import --import-budget-ms 500
+    python benchmark.py run --only qos --broker localhost:1883
+
+Main Functions:
+- bench_calculator: Scalar `calculate_supplement` throughput.
+- bench_rule_table: Compares `calculate_supplement` with and without the precompiled rule table.
+- bench_http: `/submit` and `/result` latency percentiles.
+- bench_round_trip: submit -> MQTT -> calculate -> result latency percentiles.
+- bench_output_batching: Result publishing throughput with and without output batching.
+- bench_metrics: Cost of updating a counter and a histogram on the hot path.
+- bench_qos: Publish-to-receive throughput at QoS 0, 1 and 2 against a real broker.
+- bench_import: Cold import time of `app` and `supplement_calculator`, checked against a budget.
+- run_suite: Runs the selected benchmarks.
+- compare_results: Lists regressions between a baseline and a new run.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+import supplement_calculator
+from supplement_calculator import calculate_supplement
+
+# A representative mix of inputs, cycled through by the calculator benchmarks
+SAMPLE_RECORDS = [
+    {"familyComposition": composition, "numberOfChildren": children, "familyUnitInPayForDecember": eligible}
+    for composition, children, eligible in itertools.product(["single", "couple"], range(5), [True, True, False])
+]
+
+DEFAULT_THRESHOLD = 0.10  # Relative change counted as a regression
+PERCENTILES = (50, 90, 99)
+IMPORT_BUDGET_MS = 1000  # Cold import time allowed for `app`, over a bare interpreter
+IMPORT_MODULES = ("app", "supplement_calculator")
+QOS_TIMEOUT = 60  # Seconds allowed for one QoS level to deliver every message
+
+
+def time_calls(func, records, number):
+    """
+    Time `func` over `number` calls, cycling through `records`.
+
+    :param func: callable
+        Called with one record per call.
+    :param records: list
+        Inputs to cycle through.
+    :param number: int
+        Total number of calls.
+    :return: float
+        Calls per second (best of three runs).
+    """
+    batch = list(itertools.islice(itertools.cycle(records), number))
+
+    def run():
+        for record in batch:
+            func(record)
+
+    return number / min(timeit.repeat(run, number=1, repeat=3))
+
+
+def percentiles(samples, points=PERCENTILES):
+    """
+    Summarize latency samples with nearest-rank percentiles.
+
+    :param samples: list of float
+        Latencies in seconds.
+    :param points: tuple of int or float
+        Percentiles to report; 99.9 is reported as `p999Ms`.
+    :return: dict
+        {"p50Ms": ..., "p90Ms": ..., "p99Ms": ...} in milliseconds.
+    """
+    ordered = sorted(samples)
+    summary = {}
+    for point in points:
+        index = max(0, min(len(ordered) - 1, math.ceil(point * len(ordered) / 100) - 1))
+        summary[f"p{point:g}Ms".replace(".", "")] = ordered[index] * 1000
+    return summary
+
+
+def sample_submission(index):
+    record = SAMPLE_RECORDS[index % len(SAMPLE_RECORDS)]
+    return dict(record, id=f"bench{index}")
+
+
+@contextlib.contextmanager
+def local_pipeline():
+    """
+    Point `app.client` at an in-process broker for the duration of a benchmark.
+
+    The client subscribes to the input topics and the worker pool is started, so
+    submissions flow through `on_message` exactly as they would against a real broker.
+    Rate limiting is disabled, since every request comes from the same client.
+
+    :return: tuple
+        (app module, LocalBroker).
+    """
+    import app as app_module
+    from config import MQTT_INPUT_TOPIC_BASE, MQTT_INPUT_BATCH_TOPIC
+    from local_broker import LocalBroker, LocalClient
+
+    broker = LocalBroker()
+    local_client = LocalClient(broker)
+    local_client.on_message = app_module.on_message
+    local_client.connect()
+    local_client.subscribe(f"{MQTT_INPUT_TOPIC_BASE}/#")
+    local_client.subscribe(f"{MQTT_INPUT_BATCH_TOPIC}/#")
+    original_client, original_limiter = app_module.client, app_module.rate_limiter
+    app_module.client, app_module.rate_limiter = local_client, None
+    app_module.dispatcher.start()
+    try:
+        yield app_module, broker
+    finally:
+        app_module.client, app_module.rate_limiter = original_client, original_limiter
+        local_client.disconnect()
+        broker.stop()
+
+
+def bench_calculator(number=200000):
+    """
+    Measure scalar `calculate_supplement` throughput.
+
+    :param number: int
+        Calls per measurement.
+    :return: dict
+    """
+    return {"callsPerSecond": time_calls(calculate_supplement, SAMPLE_RECORDS, number)}
+
+
+def bench_rule_table(number=200000):
+    """
+    Compare `calculate_supplement` throughput with and without the rule table.
+
+    :param number: int
+        Calls per measurement.
+    :return: dict
+        Calls per second for the table and formula paths, and the speedup.
+    """
+    from rule_sets import parse_rule_set
+
+    rules = supplement_calculator.current_rules()
+    with_table = time_calls(calculate_supplement, SAMPLE_RECORDS, number)
+    supplement_calculator.install_rules(parse_rule_set(rules.to_dict(), max_children=-1))
+    try:
+        with_formula = time_calls(calculate_supplement, SAMPLE_RECORDS, number)
+    finally:
+        supplement_calculator.install_rules(rules)
+    return {
+        "tableCallsPerSecond": with_table,
+        "formulaCallsPerSecond": with_formula,
+        "speedup": with_table / with_formula,
+    }
+
+
+def bench_http(requests=2000):
+    """
+    Measure `/submit` and `/result/<topic_id>` latency through Flask's test client.
+
+    :param requests: int
+        Requests per endpoint.
+    :return: dict
+        Percentiles prefixed with `submit` and `result`.
+    """
+    with local_pipeline() as (app_module, broker):
+        test_client = app_module.app.test_client()
+        submit_samples = []
+        for index in range(requests):
+            body = json.dumps(sample_submission(index))
+            started = time.perf_counter()
+            test_client.post("/submit", data=body, content_type="application/json")
+            submit_samples.append(time.perf_counter() - started)
+        broker.flush()
+
+        result_samples = []
+        for index in range(requests):
+            started = time.perf_counter()
+            test_client.get(f"/result/bench{index}")
+            result_samples.append(time.perf_counter() - started)
+
+    summary = {}
+    for name, samples in (("submit", submit_samples), ("result", result_samples)):
+        for key, value in percentiles(samples).items():
+            summary[name + key[0].upper() + key[1:]] = value
+    return summary
+
+
+def bench_round_trip(requests=500):
+    """
+    Measure the latency from POST /submit until GET /result returns the calculated
+    result, with the message flowing through the local broker and `on_message`.
+
+    :param requests: int
+        Number of sequential round trips.
+    :return: dict
+        Latency percentiles and round trips per second.
+    """
+    with local_pipeline() as (app_module, broker):
+        test_client = app_module.app.test_client()
+        samples = []
+        started_all = time.perf_counter()
+        for index in range(requests):
+            body = json.dumps(sample_submission(index))
+            started = time.perf_counter()
+            test_client.post("/submit", data=body, content_type="application/json")
+            response = test_client.get(f"/result/bench{index}?wait=5")
+            samples.append(time.perf_counter() - started)
+            if response.get_json().get("status") == "pending":
+                raise RuntimeError(f"Round trip bench{index} timed out")
+        elapsed = time.perf_counter() - started_all
+
+    summary = percentiles(samples)
+    summary["roundTripsPerSecond"] = requests / elapsed
+    return summary
+
+
+def bench_output_batching(results=20000, max_items=500, max_delay=0.02):
+    """
+    Compare publishing results one message each with publishing them through an
+    `OutputBatcher`, delivered by the local broker.
+
+    :param results: int
+        Results published per measurement.
+    :param max_items: int
+        Batch size.
+    :param max_delay: float
+        Batch delay in seconds.
+    :return: dict
+        Results per second and messages published for each mode.
+    """
+    import codec
+    from config import MQTT_OUTPUT_TOPIC_BASE, MQTT_OUTPUT_BATCH_TOPIC
+    from local_broker import LocalBroker, LocalClient
+    from output_batcher import OutputBatcher
+
+    result = supplement_calculator.calculate_supplement(SAMPLE_RECORDS[0])
+    summary = {}
+    for mode in ("unbatched", "batched"):
+        broker = LocalBroker()
+        subscriber = LocalClient(broker)
+        subscriber.on_message = lambda client, userdata, msg: None
+        subscriber.connect()
+        subscriber.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
+        subscriber.subscribe(MQTT_OUTPUT_BATCH_TOPIC)
+        publisher = LocalClient(broker)
+        publisher.connect()
+        started = time.perf_counter()
+        if mode == "batched":
+            batcher = OutputBatcher(publisher.publish, MQTT_OUTPUT_BATCH_TOPIC, max_items, max_delay)
+            for index in range(results):
+                batcher.add(f"bench{index}", result)
+            batcher.close()
+        else:
+            for index in range(results):
+                publisher.publish(f"{MQTT_OUTPUT_TOPIC_BASE}/bench{index}", codec.dumps(result))
+        broker.flush()
+        elapsed = time.perf_counter() - started
+        broker.stop()
+        summary[f"{mode}ResultsPerSecond"] = results / elapsed
+        summary[f"{mode}Messages"] = broker.published
+    return summary
+
+
+def bench_metrics(number=200000):
+    """
+    Measure the cost of the metric updates made on the request and message paths.
+
+    :param number: int
+        Updates per measurement.
+    :return: dict
+        Labelled counter increments and histogram observations per second.
+    """
+    from metrics import Registry
+
+    registry = Registry()
+    counter = registry.counter("bench_total", "Benchmark counter.", ("route",))
+    histogram = registry.histogram("bench_seconds", "Benchmark histogram.", ("route",))
+    return {
+        "counterIncPerSecond": time_calls(lambda route: counter.labels(route).inc(), ["/submit", "/result"], number),
+        "histogramObservePerSecond": time_calls(
+            lambda value: histogram.labels("/submit").observe(value), [0.0004, 0.003, 0.2], number
+        ),
+    }
+
+
+def bench_qos(messages=10000, levels=(0, 1, 2), broker=None):
+    """
+    Measure the throughput of real MQTT clients at each QoS level: one client publishes
+    `messages` messages and the time is taken until a second client received them all.
+
+    `LocalBroker` has no acknowledgement flow, so this runs against a real broker.
+
+    :param messages: int
+        Messages published per QoS level.
+    :param levels: tuple of int
+        QoS levels measured.
+    :param broker: tuple or None
+        (host, port) of the broker; defaults to (BROKER, PORT).
+    :return: dict
+        `qos<level>MessagesPerSecond` per level.
+    :raises RuntimeError:
+        If a level does not deliver every message within QOS_TIMEOUT seconds.
+    """
+    import threading
+
+    import paho.mqtt.client as mqtt
+    from config import BROKER, PORT, MQTT_MAX_INFLIGHT
+
+    host, port = broker or (BROKER, PORT)
+    payload = json.dumps(sample_submission(0)).encode("utf-8")
+    summary = {}
+    for qos in levels:
+        topic = f"benchmark/qos{qos}/{os.getpid()}"
+        done = threading.Event()
+        subscribed = threading.Event()
+        received = [0]
+
+        def on_message(client, userdata, msg):
+            received[0] += 1
+            if received[0] >= messages:
+                done.set()
+
+        subscriber = mqtt.Client()
+        subscriber.on_message = on_message
+        subscriber.on_subscribe = lambda *args: subscribed.set()
+        subscriber.connect(host, port)
+        subscriber.subscribe(topic, qos=qos)
+        subscriber.loop_start()
+        publisher = mqtt.Client()
+        publisher.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        publisher.connect(host, port)
+        publisher.loop_start()
+        try:
+            if not subscribed.wait(QOS_TIMEOUT):
+                raise RuntimeError(f"Subscription at QoS {qos} was not acknowledged")
+            started = time.perf_counter()
+            for _ in range(messages):
+                publisher.publish(topic, payload, qos=qos)
+            if not done.wait(QOS_TIMEOUT):
+                raise RuntimeError(f"QoS {qos}: received {received[0]} of {messages} messages")
+            summary[f"qos{qos}MessagesPerSecond"] = messages / (time.perf_counter() - started)
+        finally:
+            for client in (publisher, subscriber):
+                client.disconnect()
+                client.loop_stop()
+    return summary
+
+
+def time_import(statement, repeat=5):
+    """
+    Time a fresh interpreter running `statement`.
+
+    :param statement: str
+        Python source passed to `python -c`.
+    :param repeat: int
+        Number of runs.
+    :return: float
+        The best wall time in seconds.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=here, check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_import(repeat=5, budget_ms=None):
+    """
+    Measure the cold import time of the application modules in a fresh interpreter,
+    over the start-up time of a bare interpreter.
+
+    :param repeat: int
+        Runs per module (the best run is kept).
+    :param budget_ms: float or None
+        Import time allowed for `app`; defaults to IMPORT_BUDGET_MS.
+    :return: dict
+        `<module>ImportMs` per module.
+    :raises RuntimeError:
+        If importing `app` exceeds the budget.
+    """
+    budget_ms = IMPORT_BUDGET_MS if budget_ms is None else budget_ms
+    interpreter = time_import("pass", repeat)
+    summary = {}
+    for module in IMPORT_MODULES:
+        elapsed = time_import(f"import {module}", repeat) - interpreter
+        summary[f"{module.replace('_', '')}ImportMs"] = max(0.0, elapsed * 1000)
+    if summary["appImportMs"] > budget_ms:
+        raise RuntimeError(f"Importing app took {summary['appImportMs']:.1f} ms (budget {budget_ms} ms)")
+    return summary
+
+
+BENCHMARKS = {
+    "calculator": bench_calculator,
+    "rule_table": bench_rule_table,
+    "http": bench_http,
+    "round_trip": bench_round_trip,
+    "output_batching": bench_output_batching,
+    "metrics": bench_metrics,
+    "import": bench_import,
+    "qos": bench_qos,
+}
+OPT_IN_BENCHMARKS = ("qos",)  # Need external services; run only when selected
+
+
+def run_suite(only=None, import_budget_ms=None, broker=None):
+    """
+    Run the selected benchmarks.
+
+    :param only: list of str or None
+        Benchmark names to run; every benchmark but OPT_IN_BENCHMARKS runs when None.
+    :param import_budget_ms: float or None
+        Import time budget passed to `bench_import`.
+    :param broker: tuple or None
+        (host, port) passed to `bench_qos`.
+    :return: dict
+        {"environment": {...}, "results": {name: metrics}}.
+    """
+    names = only or [name for name in BENCHMARKS if name not in OPT_IN_BENCHMARKS]
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}")
+    options = {"import": {"budget_ms": import_budget_ms}, "qos": {"broker": broker}}
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+        },
+        "results": {
+            name: BENCHMARKS[name](**options.get(name, {})) for name in names
+        },
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    List the metrics that regressed beyond `threshold`.
+
+    :param baseline: dict
+        A previous `run_suite` result.
+    :param current: dict
+        A new `run_suite` result.
+    :param threshold: float
+        Relative change counted as a regression (0.10 is 10%).
+    :return: list of dict
+        One entry per regression: benchmark, metric, baseline, current and change.
+    """
+    regressions = []
+    for name, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            previous = baseline["results"].get(name, {}).get(metric)
+            if not previous:
+                continue
+            change = (value - previous) / previous
+            if metric.endswith("PerSecond"):
+                regressed = change < -threshold
+            elif metric.endswith("Ms"):
+                regressed = change > threshold
+            else:
+                continue
+            if regressed:
+                regressions.append({
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": previous,
+                    "current": value,
+                    "change": change,
+                })
+    return regressions
+
+
+def print_results(results):
+    for name, metrics in results["results"].items():
+        print(f"{name}:")
+        for metric, value in metrics.items():
+            print(f"  {metric}: {value:.3f}")
+
+
+def parse_broker(value):
+    host, _, port = value.rpartition(":")
+    try:
+        return host, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected <host>:<port>, e.g. localhost:1883")
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        0 on success, 1 if compare mode found regressions.
+    """
+    parser = argparse.ArgumentParser(description="Winter supplement benchmark suite.")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="Run the suite and optionally save a baseline")
+    run_parser.add_argument("--output", help="JSON file receiving the results")
+    compare_parser = subparsers.add_parser("compare", help="Run the suite and compare with a baseline")
+    compare_parser.add_argument("baseline", help="Baseline JSON file")
+    compare_parser.add_argument("current", nargs="?", help="Results JSON file to compare instead of running")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Relative change counted as a regression")
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("--only", help="Comma-separated benchmark names")
+        subparser.add_argument("--import-budget-ms", type=float, default=None,
+                               help=f"Import time allowed for app (default {IMPORT_BUDGET_MS})")
+        subparser.add_argument("--broker", type=parse_broker, default=None,
+                               help="<host>:<port> of the MQTT broker used by the qos benchmark")
+    args = parser.parse_args(argv)
+
+    only = args.only.split(",") if getattr(args, "only", None) else None
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if args.current:
+            with open(args.current) as f:
+                current = json.load(f)
+        else:
+            current = run_suite(only or list(baseline["results"]), args.import_budget_ms, args.broker)
+            print_results(current)
+        regressions = compare_results(baseline, current, args.threshold)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['benchmark']}.{regression['metric']}: "
+                f"{regression['baseline']:.3f} -> {regression['current']:.3f} ({regression['change']:+.1%})"
+            )
+        return 1 if regressions else 0
+
+    results = run_suite(only, getattr(args, "import_budget_ms", None), getattr(args, "broker", None))
+    print_results(results)
+    if getattr(args, "output", None):
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+"""
+Winter Supplement Bulk Calculator
+Author: Liliya
+----------------------------
+This module streams family records from JSONL or CSV files through the supplement calculator
+without the Flask/MQTT stack. Records are read, calculated and written in fixed-size chunks,
+so memory use stays constant regardless of the input size. Invalid records are written to a
+separate reject file instead of aborting the run. Chunks can optionally be calculated in a
+pool of worker processes; results are always written in input order, so the output is
+byte-identical to a serial run.
+
+Usage:
+    python bulk_calculator.py requests.jsonl results.jsonl --rejects rejects.jsonl
+    python bulk_calculator.py families.csv results.csv --chunk-size 5000
+    python bulk_calculator.py requests.jsonl results.jsonl --workers 32
+
+Main Functions:
+- process_chunk: Validates and calculates one chunk of raw records.
+- map_chunks: Processes chunks serially or in a process pool, preserving input order.
+- run: Streams an input file to an output file and returns run statistics.
+- main: Command-line entry point.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from records import decode_family
+from supplement_calculator import calculate, current_rules
+
+RESULT_FIELDS = ["id", "isEligible", "baseAmount", "childrenAmount", "supplementAmount", "ruleVersion"]
+DEFAULT_CHUNK_SIZE = 1000
+PROGRESS_INTERVAL_SECONDS = 10.0
+MAX_PENDING_CHUNKS_PER_WORKER = 2  # Bounds memory while keeping every worker busy
+
+# Bytes that are not valid UTF-8 are read as lone surrogates ("surrogateescape")
+_UNDECODABLE = re.compile("[\udc80-\udcff]")
+
+
+def detect_format(path, explicit=None):
+    """
+    Determine the file format from an explicit choice or the file extension.
+
+    :param path: str
+        The file path ("-" for stdin/stdout).
+    :param explicit: str or None
+        "jsonl" or "csv" to override detection.
+    :return: str
+        "csv" for .csv files, otherwise "jsonl".
+    """
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(stream, input_format):
+    """
+    Lazily read raw records from an input stream.
+
+    :param stream: file object
+        The open input file.
+    :param input_format: str
+        "jsonl" or "csv".
+    :return: iterator
+        JSONL lines (str) or CSV rows (dict), one per record; blank JSONL lines are skipped.
+    """
+    if input_format == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def parse_csv_value(field, value):
+    """
+    Convert a CSV cell to the type `records.decode_family` expects.
+
+    :param field: str
+        The column name.
+    :param value: str
+        The cell text.
+    :return: object
+        An int for numberOfChildren, a bool for familyUnitInPayForDecember, otherwise the
+        text unchanged (unconvertible cells are left as text so validation rejects them).
+    """
+    text = value.strip() if isinstance(value, str) else value
+    if field == "numberOfChildren":
+        try:
+            return int(text)
+        except (TypeError, ValueError):
+            return value
+    if field == "familyUnitInPayForDecember":
+        flag = text.lower() if isinstance(text, str) else text
+        if flag in ("true", "1", "yes"):
+            return True
+        if flag in ("false", "0", "no"):
+            return False
+    return text
+
+
+def parse_record(raw, input_format):
+    """
+    Parse a raw record into the dict accepted by `records.decode_family`.
+
+    :param raw: str or dict
+        A JSONL line or a CSV row.
+    :param input_format: str
+        "jsonl" or "csv".
+    :return: dict
+    :raises ValueError:
+        If the record is not valid UTF-8, or a JSONL line is not valid JSON.
+    """
+    if input_format == "csv":
+        if any(isinstance(value, str) and _UNDECODABLE.search(value) for value in raw.values()):
+            raise ValueError("Invalid UTF-8")
+        return {field: parse_csv_value(field, value) for field, value in raw.items()}
+    if _UNDECODABLE.search(raw):
+        raise ValueError("Invalid UTF-8")
+    return json.loads(raw)
+
+
+def format_results(rows, output_format):
+    """
+    Serialize result rows for the output file.
+
+    :param rows: list of dict
+        Results keyed by RESULT_FIELDS.
+    :param output_format: str
+        "jsonl" or "csv".
+    :return: str
+    """
+    if output_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=RESULT_FIELDS, lineterminator="\n")
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+def process_chunk(chunk, input_format, output_format):
+    """
+    Validate and calculate one chunk of raw records.
+
+    This function only depends on its arguments, so chunks can be processed in any
+    order (or in other processes) and written out afterwards.
+
+    :param chunk: tuple
+        (record number of the first record, list of raw records).
+    :param input_format: str
+        "jsonl" or "csv".
+    :param output_format: str
+        "jsonl" or "csv".
+    :return: tuple
+        (serialized results, serialized rejects as JSONL, accepted count, rejected count).
+    """
+    first_record, raws = chunk
+    rules = current_rules()  # One rule version for the whole chunk
+    rows = []
+    rejects = []
+    for offset, raw in enumerate(raws):
+        try:
+            family = decode_family(parse_record(raw, input_format))
+            rows.append({"id": family.id, **calculate(family, rules).to_dict()})
+            continue
+        except ValueError as e:
+            error = str(e)
+        text = raw.rstrip("\r\n") if isinstance(raw, str) else raw
+        rejects.append(json.dumps({"record": first_record + offset, "error": error, "input": text}) + "\n")
+    return format_results(rows, output_format), "".join(rejects), len(rows), len(rejects)
+
+
+def iter_chunks(records, chunk_size):
+    """
+    Group raw records into numbered chunks.
+
+    :param records: iterator
+        Raw records.
+    :param chunk_size: int
+        Maximum records per chunk.
+    :return: iterator of tuple
+        (record number of the first record, list of raw records), numbered from 1.
+    """
+    chunk = []
+    first_record = 1
+    for raw in records:
+        chunk.append(raw)
+        if len(chunk) >= chunk_size:
+            yield first_record, chunk
+            first_record += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_record, chunk
+
+
+def map_chunks(chunks, input_format, output_format, workers=1):
+    """
+    Process chunks with `process_chunk`, serially or in a pool of worker processes.
+
+    Workers share nothing: each receives a chunk of raw records and returns serialized
+    output. At most `workers * MAX_PENDING_CHUNKS_PER_WORKER` chunks are in flight, so
+    memory stays bounded however large the input is.
+
+    :param chunks: iterator of tuple
+        Chunks produced by `iter_chunks`.
+    :param input_format: str
+        "jsonl" or "csv".
+    :param output_format: str
+        "jsonl" or "csv".
+    :param workers: int
+        Number of worker processes; 1 processes chunks in the current process.
+    :return: iterator of tuple
+        `process_chunk` results in input order.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield process_chunk(chunk, input_format, output_format)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(process_chunk, chunk, input_format, output_format))
+            if len(pending) >= workers * MAX_PENDING_CHUNKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def open_stream(path, mode):
+    # Input is read with "surrogateescape", so an undecodable line is rejected by
+    # `parse_record` instead of aborting the run
+    errors = "surrogateescape" if "r" in mode else "strict"
+    if path == "-":
+        if "r" not in mode:
+            return sys.stdout
+        if hasattr(sys.stdin, "reconfigure"):
+            sys.stdin.reconfigure(errors=errors)
+        return sys.stdin
+    return open(path, mode, newline="", encoding="utf-8", errors=errors)
+
+
+def run(input_path, output_path, reject_path=None, chunk_size=DEFAULT_CHUNK_SIZE,
+        input_format=None, output_format=None, log=sys.stderr, workers=1):
+    """
+    Stream an input file through the calculator into an output file.
+
+    :param input_path: str
+        JSONL or CSV input ("-" for stdin).
+    :param output_path: str
+        JSONL or CSV output ("-" for stdout).
+    :param reject_path: str or None
+        JSONL file receiving invalid records; rejects are discarded when None.
+    :param chunk_size: int
+        Records read, calculated and written at a time.
+    :param input_format: str or None
+        Overrides format detection for the input.
+    :param output_format: str or None
+        Overrides format detection for the output.
+    :param log: file object or None
+        Receives progress and throughput reports.
+    :param workers: int
+        Number of worker processes calculating chunks in parallel.
+    :return: dict
+        Run statistics: accepted, rejected, seconds and recordsPerSecond.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(output_path, output_format)
+
+    accepted = rejected = 0
+    started = last_report = time.perf_counter()
+    source = open_stream(input_path, "r")
+    sink = open_stream(output_path, "w")
+    reject_sink = open_stream(reject_path, "w") if reject_path else None
+    try:
+        if output_format == "csv":
+            sink.write(",".join(RESULT_FIELDS) + "\n")
+        chunks = iter_chunks(read_records(source, input_format), chunk_size)
+        for output, rejects, ok, bad in map_chunks(chunks, input_format, output_format, workers):
+            sink.write(output)
+            if reject_sink and rejects:
+                reject_sink.write(rejects)
+            accepted += ok
+            rejected += bad
+
+            now = time.perf_counter()
+            if log and now - last_report >= PROGRESS_INTERVAL_SECONDS:
+                processed = accepted + rejected
+                log.write(f"Processed {processed} records ({processed / (now - started):.0f} records/s)\n")
+                last_report = now
+    finally:
+        for stream in (source, sink, reject_sink):
+            if stream is not None and stream not in (sys.stdin, sys.stdout):
+                stream.close()
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "accepted": accepted,
+        "rejected": rejected,
+        "seconds": seconds,
+        "recordsPerSecond": (accepted + rejected) / seconds if seconds > 0 else 0.0,
+    }
+    if log:
+        log.write(
+            f"Processed {accepted + rejected} records ({rejected} rejected) in {seconds:.2f}s "
+            f"({stats['recordsPerSecond']:.0f} records/s)\n"
+        )
+    return stats
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        Process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Calculate winter supplements for a JSONL or CSV file.")
+    parser.add_argument("input", help="Input file (.jsonl or .csv), or - for stdin")
+    parser.add_argument("output", help="Output file (.jsonl or .csv), or - for stdout")
+    parser.add_argument("--rejects", help="JSONL file receiving invalid records")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Records per chunk")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes calculating chunks in parallel (0 uses every CPU)")
+    parser.add_argument("--input-format", choices=["jsonl", "csv"], help="Override input format detection")
+    parser.add_argument("--output-format", choices=["jsonl", "csv"], help="Override output format detection")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    run(args.input, args.output, args.rejects, args.chunk_size, args.input_format, args.output_format,
+        workers=workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Winter Supplement Codec
+Author: Liliya
+----------------------------
+This module is the serialization layer for MQTT payloads and HTTP responses. JSON is
+encoded with orjson when it is installed and with the standard library otherwise.
+MQTT topics can also carry compact MessagePack payloads (when msgpack is installed),
+negotiated per message through a topic suffix or an MQTT v5 content-type property:
+
+    BRE/calculateWinterSupplementInput/<topic_id>           JSON
+    BRE/calculateWinterSupplementInput/<topic_id>/msgpack   MessagePack
+
+Results are published in the same format as the message they answer.
+
+Main Functions:
+- dumps / loads: Fast JSON encoding to bytes and decoding.
+- dumps_text: Fast JSON encoding to str, for APIs that expect text.
+- encode / decode: Encoding and decoding in a named format.
+- split_format: Separates the format suffix from a topic.
+- with_format: Appends the format suffix to a topic.
+- message_format: Determines the format of an incoming MQTT message.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Payload formats
+JSON = "json"
+MSGPACK = "msgpack"
+
+CONTENT_TYPES = {
+    JSON: "application/json",
+    MSGPACK: "application/msgpack",
+}
+
+
+def dumps(obj):
+    """
+    Encode an object as JSON.
+
+    :param obj: dict or list
+    :return: bytes
+        UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_text(obj):
+    """
+    Encode an object as JSON text.
+
+    :param obj: dict or list
+    :return: str
+    """
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data):
+    """
+    Decode JSON.
+
+    :param data: bytes or str
+    :return: object
+    :raises ValueError:
+        If the data is not valid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def available_formats():
+    """
+    List the payload formats that can be encoded in this environment.
+
+    :return: list of str
+    """
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def encode(obj, fmt=JSON):
+    """
+    Encode an object in a payload format.
+
+    :param obj: dict or list
+    :param fmt: str
+        `JSON` or `MSGPACK`.
+    :return: bytes
+    :raises ValueError:
+        If the format is unknown or its library is not installed.
+    """
+    if fmt == JSON:
+        return dumps(obj)
+    if fmt == MSGPACK and msgpack is not None:
+        return msgpack.packb(obj)
+    raise ValueError(f"Unsupported payload format: {fmt}")
+
+
+def decode(data, fmt=JSON):
+    """
+    Decode a payload.
+
+    :param data: bytes
+    :param fmt: str
+        `JSON` or `MSGPACK`.
+    :return: object
+    :raises ValueError:
+        If the payload cannot be decoded or the format is unsupported.
+    """
+    if fmt == JSON:
+        return loads(data)
+    if fmt == MSGPACK and msgpack is not None:
+        try:
+            return msgpack.unpackb(data)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack payload: {e}") from e
+    raise ValueError(f"Unsupported payload format: {fmt}")
+
+
+def split_format(topic):
+    """
+    Separate a format suffix from a topic.
+
+    :param topic: str
+        e.g. "BRE/calculateWinterSupplementInput/abc/msgpack".
+    :return: tuple
+        (topic without the suffix, format); the format is `JSON` when there is no suffix.
+    """
+    base, _, suffix = topic.rpartition("/")
+    if base and suffix in CONTENT_TYPES and suffix != JSON:
+        return base, suffix
+    return topic, JSON
+
+
+def with_format(topic, fmt):
+    """
+    Append a format suffix to a topic (JSON topics have no suffix).
+
+    :param topic: str
+    :param fmt: str
+    :return: str
+    """
+    return topic if fmt == JSON else f"{topic}/{fmt}"
+
+
+def message_format(msg):
+    """
+    Determine the payload format of an MQTT message and the topic without its suffix.
+
+    An MQTT v5 content-type property takes precedence over the topic suffix.
+
+    :param msg: mqtt.MQTTMessage
+    :return: tuple
+        (topic without the format suffix, format).
+    """
+    topic, fmt = split_format(msg.topic)
+    content_type = getattr(getattr(msg, "properties", None), "ContentType", None)
+    for name, value in CONTENT_TYPES.items():
+        if content_type == value:
+            fmt = name
+    return topic, fmt
@@ -7,3 +7,77 @@ PORT = 1883
 # MQTT Topic Configuration
 MQTT_INPUT_TOPIC_BASE = "BRE/calculateWinterSupplementInput"
 MQTT_OUTPUT_TOPIC_BASE = "BRE/calculateWinterSupplementOutput"
+
+# Result Store Configuration
+RESULT_STORE_MAX_ENTRIES = 100000  # Least recently used results are evicted beyond this
+RESULT_STORE_TTL_SECONDS = 3600  # Results expire this many seconds after being stored
+
+# Batch Submission Configuration
+MQTT_INPUT_BATCH_TOPIC = "BRE/calculateWinterSupplementBatchInput"  # Receives JSON arrays of records
+MQTT_BATCH_MAX_ITEMS = 500  # Maximum records grouped into one batch message
+
+# MQTT Worker Pool Configuration
+MQTT_WORKERS = 4  # Threads decoding, calculating and publishing MQTT messages
+MQTT_QUEUE_SIZE = 10000  # Maximum messages waiting for a worker
+MQTT_QUEUE_POLICY = "block"  # "block" the network thread or "drop" new messages when the queue is full
+
+# Result Polling Configuration
+RESULT_MAX_WAIT_SECONDS = 30  # Upper bound for GET /result/<topic_id>?wait=<seconds>
+
+# MQTT Connection Configuration
+MQTT_RECONNECT_MIN_DELAY = 1  # Seconds before the first reconnect attempt
+MQTT_RECONNECT_MAX_DELAY = 60  # Upper bound of the exponential reconnect backoff
+
+# Deduplication Configuration
+DEDUP_MAX_ENTRIES = 100000  # Topic IDs and memoized inputs remembered by the idempotency layer
+DEDUP_INFLIGHT_TIMEOUT_SECONDS = 30  # Identical requests are coalesced onto a calculation this long
+
+# Consumer Configuration
+MQTT_CONSUME_INPUT = True  # Calculate input messages in the API process; False when consumer.py workers do it
+MQTT_SHARED_GROUP = "supplement-workers"  # Shared subscription group joined by consumer.py workers
+
+# Shared Result Store Configuration
+RESULT_STORE_BACKEND = "memory"  # "memory" (per process), or "sqlite"/"redis" to share results between HTTP workers
+RESULT_STORE_PATH = "results.db"  # Database file of the "sqlite" backend
+RESULT_STORE_REDIS_URL = "redis://localhost:6379/0"  # Server of the "redis" backend
+
+# Output Batching Configuration
+MQTT_OUTPUT_BATCHING = False  # Also publish results in batches on MQTT_OUTPUT_BATCH_TOPIC
+MQTT_OUTPUT_BATCH_TOPIC = "BRE/calculateWinterSupplementBatchOutput"  # Receives JSON arrays of results with their id
+MQTT_OUTPUT_BATCH_MAX_ITEMS = 500  # Results per batch message
+MQTT_OUTPUT_BATCH_MAX_DELAY_MS = 20  # Longest a result waits for its batch
+MQTT_OUTPUT_FANOUT = True  # Publish each result on its own output topic too (always on without batching)
+
+# MQTT Delivery Configuration
+MQTT_QOS = 0  # QoS of every publish and subscription (0 = at most once, 1 = at least once, 2 = exactly once)
+MQTT_CLIENT_ID = ""  # Fixed client ID, required for a persistent session; "" lets paho generate one
+MQTT_CLEAN_SESSION = True  # False keeps subscriptions and queued QoS>0 messages on the broker across reconnects
+MQTT_MAX_INFLIGHT = 1000  # QoS>0 messages awaiting acknowledgement before publishes are held back
+MQTT_OFFLINE_QUEUE_PATH = None  # On-disk queue of messages published while disconnected (e.g. "mqtt_offline.db"); None disables
+MQTT_OFFLINE_QUEUE_MAX_MESSAGES = 100000  # Oldest queued messages are dropped beyond this
+
+# Admission Control Configuration
+RATE_LIMIT_PER_SECOND = 1000  # Records per second each client may submit; None disables rate limiting
+RATE_LIMIT_BURST = 2000  # Records a client may submit at once after being idle
+RATE_LIMIT_MAX_CLIENTS = 10000  # Clients tracked; the least recently seen are forgotten beyond this
+RATE_LIMIT_CLIENT_HEADER = None  # Header identifying a client (e.g. "X-API-Key"); None uses the remote address
+MAX_PENDING_RESULTS = 10000  # Submissions awaiting a result before /submit answers 429; None disables the cap
+PENDING_TIMEOUT_SECONDS = 60  # Pending submissions older than this are assumed lost and no longer counted
+ADMISSION_RETRY_AFTER_SECONDS = 1  # Retry-After sent when the pending cap is reached
+
+# Rule Set Configuration
+RULE_SET_DIRECTORY = "rules"  # Versioned rule-set files, one <benefit year>.json each (relative to the code)
+RULE_SET_BENEFIT_YEAR = None  # Benefit year whose rules are loaded; None loads the latest year
+
+# Incremental Recompute Configuration
+RECOMPUTE_INPUT_SET_PATH = "inputs.db"  # Family inputs indexed by recompute.py for incremental recalculation
+
+# Profiling Configuration
+PROFILE_SAMPLE_RATIO = 0.0  # Fraction of requests and MQTT messages run under cProfile; 0 disables sampling
+PROFILE_HEADER = None  # Request header that profiles a request when present (e.g. "X-Profile"); None disables
+SLOW_REQUEST_SECONDS = None  # Requests and messages slower than this are logged with their phase timings; None disables
+SLOW_REQUEST_MAX_ENTRIES = 100  # Slow requests kept for /debug/profile
+PROFILE_DEBUG_ENDPOINT = False  # Serve the aggregated profile on /debug/profile
+
+# Aggregate Statistics Configuration
+STATS_MAX_CHILDREN_BUCKET = 4  # Families with at least this many children share one /stats bucket ("4+")
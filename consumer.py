@@ -0,0 +1,338 @@
+"""
+Winter Supplement Consumer Worker
+Author: Liliya
+----------------------------
+This module runs the calculation side of the MQTT pipeline as a standalone worker, so
+calculation can be scaled across processes and nodes. Several workers split the input
+stream in one of two ways:
+
+- shared (default): every worker joins the MQTT shared subscription
+  `$share/<group>/BRE/calculateWinterSupplementInput/#` and the broker hands each message
+  to one member of the group;
+- shard: every worker subscribes to the whole input stream and only calculates the
+  topic IDs whose CRC-32 falls in its shard (`--shard 0/3`, `--shard 1/3`, ...), for
+  brokers without shared subscriptions.
+
+Results are published to the output topic, where the Flask application stores them,
+and to the batch output topic when MQTT_OUTPUT_BATCHING is enabled (see `output_batcher`).
+Records failing validation are published as {"status": "error", "error": message}, so
+the API can report them. Run the API with `MQTT_CONSUME_INPUT = False` once workers
+do the calculation.
+
+Usage:
+    python consumer.py
+    python consumer.py --group supplement-workers --workers 8
+    python consumer.py --shard 0/3
+
+Main Classes and Functions:
+- shard_of: The shard of a topic ID.
+- Consumer: Subscribes to the input topics and calculates its share of the records.
+- main: Command-line entry point.
+
+Send SIGHUP to a worker to reload the configured rule set without stopping it.
+"""
+
+import argparse
+import signal
+import sys
+import threading
+import zlib
+
+import paho.mqtt.client as mqtt
+
+import codec
+from records import ValidationError, decode_family, is_topic_id
+from supplement_calculator import calculate, reload_rules
+from rule_sets import RuleSetError
+from dispatcher import MessageDispatcher
+from output_batcher import OutputBatcher
+from config import BROKER, PORT, MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, MQTT_INPUT_BATCH_TOPIC
+from config import MQTT_WORKERS, MQTT_QUEUE_SIZE, MQTT_QUEUE_POLICY, MQTT_SHARED_GROUP
+from config import MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY
+from config import MQTT_OUTPUT_BATCHING, MQTT_OUTPUT_BATCH_TOPIC, MQTT_OUTPUT_FANOUT
+from config import MQTT_OUTPUT_BATCH_MAX_ITEMS, MQTT_OUTPUT_BATCH_MAX_DELAY_MS
+from config import MQTT_QOS, MQTT_CLEAN_SESSION, MQTT_MAX_INFLIGHT
+
+# Ways of splitting the input stream between workers
+SHARED = "shared"
+SHARD = "shard"
+
+
+def shard_of(topic_id, shard_count):
+    """
+    Map a topic ID to a shard.
+
+    CRC-32 is stable across processes and Python versions, unlike `hash()`.
+
+    :param topic_id: str
+    :param shard_count: int
+    :return: int
+        A shard index in [0, shard_count).
+    """
+    return zlib.crc32(str(topic_id).encode("utf-8")) % shard_count
+
+
+class Consumer:
+    """
+    A calculation worker consuming the input topics.
+
+    Messages are handed to a `MessageDispatcher`, so the MQTT network thread only
+    enqueues them.
+    """
+
+    def __init__(self, client, mode=SHARED, group=MQTT_SHARED_GROUP, shard_index=0, shard_count=1,
+                 workers=MQTT_WORKERS, max_queue=MQTT_QUEUE_SIZE, policy=MQTT_QUEUE_POLICY,
+                 batching=MQTT_OUTPUT_BATCHING, fanout=MQTT_OUTPUT_FANOUT, qos=MQTT_QOS, connect_options=None):
+        """
+        :param client: mqtt.Client
+            The MQTT client (or a `LocalClient`) used to consume and publish.
+        :param mode: str
+            `SHARED` or `SHARD`.
+        :param group: str
+            Shared subscription group, with `SHARED`.
+        :param shard_index: int
+            Shard calculated by this worker, with `SHARD`.
+        :param shard_count: int
+            Number of shards, with `SHARD`.
+        :param workers: int
+            Threads calculating messages.
+        :param max_queue: int
+            Maximum messages waiting for a thread.
+        :param policy: str
+            Queue-full policy (see `dispatcher`).
+        :param batching: bool
+            Publish results in batches on MQTT_OUTPUT_BATCH_TOPIC.
+        :param fanout: bool
+            With batching, also publish each result on its own output topic.
+        :param qos: int
+            QoS of the subscriptions and published results.
+        :param connect_options: dict or None
+            Extra keyword arguments for `connect_async` (e.g. MQTT v5 `clean_start`).
+        """
+        if mode not in (SHARED, SHARD):
+            raise ValueError(f"Invalid consumer mode: {mode}")
+        if not 0 <= shard_index < shard_count:
+            raise ValueError("shard_index must be in [0, shard_count)")
+        self.client = client
+        self.mode = mode
+        self.group = group
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.dispatcher = MessageDispatcher(self.handle_message, workers=workers, max_queue=max_queue,
+                                            policy=policy, name="consumer-worker")
+        self.qos = qos
+        self.connect_options = connect_options or {}
+        self.output_batcher = OutputBatcher(
+            lambda topic, payload: self.client.publish(topic, payload, qos=self.qos),
+            MQTT_OUTPUT_BATCH_TOPIC,
+            max_items=MQTT_OUTPUT_BATCH_MAX_ITEMS,
+            max_delay=MQTT_OUTPUT_BATCH_MAX_DELAY_MS / 1000,
+        ) if batching else None
+        self.fanout = fanout or not batching
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.rejected = 0
+        self.skipped = 0
+
+    def topics(self):
+        """
+        List the subscription filters of this worker.
+
+        :return: list of str
+        """
+        topics = [f"{MQTT_INPUT_TOPIC_BASE}/#", f"{MQTT_INPUT_BATCH_TOPIC}/#"]
+        if self.mode == SHARED:
+            return [f"$share/{self.group}/{topic}" for topic in topics]
+        return topics
+
+    def owns(self, topic_id):
+        """
+        Check whether this worker calculates a topic ID.
+
+        :param topic_id: str
+        :return: bool
+        """
+        return self.mode == SHARED or shard_of(topic_id, self.shard_count) == self.shard_index
+
+    def start(self):
+        """
+        Start the worker threads and connect in the background (with reconnect backoff).
+
+        :return: None
+        """
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.dispatcher.start()
+        self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)
+        self.client.reconnect_delay_set(MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY)
+        self.client.connect_async(BROKER, PORT, **self.connect_options)
+        self.client.loop_start()
+
+    def stop(self):
+        """
+        Finish the messages already queued, publish the buffered output batch, then disconnect.
+
+        :return: None
+        """
+        self.dispatcher.shutdown(drain=True)
+        if self.output_batcher is not None:
+            self.output_batcher.close()
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        """
+        Subscribe to the input topics whenever the connection is (re)established.
+
+        :return: None
+        """
+        if rc != 0:
+            print(f"MQTT connection refused: {rc}")
+            return
+        for topic in self.topics():
+            client.subscribe(topic, qos=self.qos)
+
+    def on_message(self, client, userdata, msg):
+        """
+        Queue an incoming message for the worker threads.
+
+        :return: None
+        """
+        if not self.dispatcher.submit(msg):
+            print(f"Dropped MQTT message on {msg.topic}: worker queue is full")
+
+    def handle_message(self, msg):
+        """
+        Calculate the records of one input message that belong to this worker.
+
+        Records without a valid topic ID are counted as rejected: there is no output
+        topic to publish their error to.
+
+        :param msg: mqtt.MQTTMessage
+        :return: None
+        :raises ValueError:
+            If the payload cannot be decoded.
+        """
+        topic, fmt = codec.message_format(msg)
+        data = codec.decode(msg.payload, fmt)
+        if topic == MQTT_INPUT_BATCH_TOPIC:
+            for record in data:
+                topic_id = record.get("id") if isinstance(record, dict) else None
+                if not is_topic_id(topic_id):
+                    self._count("rejected")
+                elif self.owns(topic_id):
+                    self.process_record(topic_id, record, fmt)
+                else:
+                    self._count("skipped")
+        else:
+            topic_id = topic.split("/")[-1]
+            if not is_topic_id(topic_id):
+                self._count("rejected")
+            elif self.owns(topic_id):
+                self.process_record(topic_id, data, fmt)
+            else:
+                self._count("skipped")
+
+    def process_record(self, topic_id, data, fmt=codec.JSON):
+        """
+        Calculate one record and publish the result (or its validation error).
+
+        :param topic_id: str
+        :param data: dict
+        :param fmt: str
+            Payload format of the published result.
+        :return: None
+        """
+        try:
+            result = calculate(decode_family(data, require_id=False)).to_dict()
+            self._count("processed")
+        except ValidationError as e:
+            result = {"status": "error", "error": str(e)}
+            self._count("rejected")
+        if self.output_batcher is not None:
+            self.output_batcher.add(topic_id, result, fmt)
+        if self.fanout:
+            output_topic = codec.with_format(f"{MQTT_OUTPUT_TOPIC_BASE}/{topic_id}", fmt)
+            self.client.publish(output_topic, codec.encode(result, fmt), qos=self.qos)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """
+        Report worker counters.
+
+        :return: dict
+            Records calculated, rejected and skipped (owned by another shard), and the queue stats.
+        """
+        with self._lock:
+            return {
+                "processed": self.processed,
+                "rejected": self.rejected,
+                "skipped": self.skipped,
+                "queue": self.dispatcher.stats(),
+            }
+
+
+def parse_shard(value):
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected <index>/<count>, e.g. 0/3")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("Shard index must be in [0, count)")
+    return index, count
+
+
+def main(argv=None):
+    """
+    Command-line entry point: consume until interrupted.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        Process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Winter supplement calculation worker.")
+    parser.add_argument("--group", default=MQTT_SHARED_GROUP, help="Shared subscription group")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="Consume shard <index>/<count> of the topic IDs instead of a shared subscription")
+    parser.add_argument("--workers", type=int, default=MQTT_WORKERS, help="Calculation threads")
+    parser.add_argument("--client-id", default="",
+                        help="MQTT client ID (set it to keep a persistent session with MQTT_CLEAN_SESSION = False)")
+    parser.add_argument("--qos", type=int, choices=[0, 1, 2], default=MQTT_QOS, help="QoS of subscriptions and results")
+    args = parser.parse_args(argv)
+
+    if args.shard:
+        consumer = Consumer(mqtt.Client(args.client_id, clean_session=MQTT_CLEAN_SESSION), mode=SHARD,
+                            shard_index=args.shard[0], shard_count=args.shard[1], workers=args.workers,
+                            qos=args.qos)
+    else:
+        consumer = Consumer(mqtt.Client(args.client_id, protocol=mqtt.MQTTv5), group=args.group,
+                            workers=args.workers, qos=args.qos,
+                            connect_options={"clean_start": MQTT_CLEAN_SESSION})
+
+    def reload():
+        try:
+            print(f"Loaded rule set {reload_rules().version}")
+        except RuleSetError as e:
+            print(f"Rule set not reloaded: {e}")
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=reload, daemon=True).start())
+    consumer.start()
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        consumer.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Winter Supplement Request Deduplication
+Author: Liliya
+----------------------------
+This module is the idempotency layer in front of the MQTT pipeline. Submissions are
+keyed on their topic ID and a fingerprint of the normalized input, so that:
+
+- re-submitting a completed topic ID with the same input is answered from the result
+  store without touching MQTT;
+- identical requests already in flight (the same topic ID, or another topic ID with the
+  same input) are coalesced onto the one calculation in progress;
+- inputs calculated before are answered from a bounded memo cache.
+
+Main Classes and Functions:
+- fingerprint: The normalized, hashable key of a family input.
+- RequestDeduplicator: Decides how each submission is handled and tracks hit rates.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from result_store import EXPIRED, MISSING, is_pending
+
+# Decisions returned by `RequestDeduplicator.admit`
+SUBMIT = "submit"  # New work: publish the record to the input topic
+DUPLICATE = "duplicate"  # The topic ID was already calculated for the same input
+COALESCED = "coalesced"  # An identical request is in flight; its result will be reused
+MEMO = "memo"  # The input was calculated before; the memoized result is returned
+
+
+def fingerprint(family):
+    """
+    Build the normalized key of a family input.
+
+    Every ineligible family gets the same result, so they share one key.
+
+    :param family: FamilyInput
+    :return: tuple
+        (familyComposition, numberOfChildren, familyUnitInPayForDecember).
+    """
+    if not family.family_unit_in_pay:
+        return (None, 0, False)
+    return (family.family_composition, family.number_of_children, True)
+
+
+def _is_result(value):
+    return (
+        value is not MISSING and value is not EXPIRED and not is_pending(value)
+        and value.get("status") != "error"
+    )
+
+
+class _Flight:
+    """A calculation in progress and the topic IDs waiting for its result."""
+
+    __slots__ = ("leader", "family", "started", "followers")
+
+    def __init__(self, leader, family, started):
+        self.leader = leader
+        self.family = family  # The leader's FamilyInput
+        self.started = started
+        self.followers = {}  # topic ID -> its own FamilyInput, in arrival order
+
+
+class RequestDeduplicator:
+    """
+    Idempotency and memoization layer for submissions.
+
+    `admit` is called before publishing a record and `complete` whenever a result is
+    stored, which returns the input the topic ID was admitted with and the coalesced
+    topic IDs that should receive the same result.
+    A flight that has not completed within `inflight_timeout` is considered lost, and
+    the next identical request is published again; `abort` drops a flight at once when
+    its record could not be published.
+    """
+
+    def __init__(self, store, max_entries=100000, inflight_timeout=30, clock=time.monotonic):
+        """
+        :param store: ResultStore
+            The store holding results and "pending" placeholders.
+        :param max_entries: int
+            Maximum number of topic IDs and memoized inputs remembered (each is an LRU).
+        :param inflight_timeout: float
+            Seconds after which an uncompleted calculation is no longer coalesced onto.
+        :param clock: callable
+            Returns the current time in seconds (overridable for tests).
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.store = store
+        self.max_entries = max_entries
+        self.inflight_timeout = inflight_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = OrderedDict()  # topic ID -> fingerprint of its last submission
+        self._memo = OrderedDict()  # fingerprint -> result dict
+        self._inflight = {}  # fingerprint -> _Flight
+        self._rule_version = None  # Only results of this rule version are memoized, when set
+        self.submitted = 0
+        self.duplicates = 0
+        self.coalesced = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+    def admit(self, topic_id, family):
+        """
+        Decide how a validated submission is handled.
+
+        For `SUBMIT` and `COALESCED`, the "pending" placeholder is stored before returning.
+
+        :param topic_id: str
+        :param family: FamilyInput
+        :return: tuple
+            (decision, result): the result is the stored or memoized result for
+            `DUPLICATE` and `MEMO`, otherwise None.
+        """
+        key = fingerprint(family)
+        # The store lookup may be a network round trip, so it runs outside the lock; the
+        # topic ID is checked again under the lock in case it was resubmitted meanwhile
+        with self._lock:
+            known = self._ids.get(topic_id) == key
+        current = self.store.lookup(topic_id) if known else MISSING
+        with self._lock:
+            now = self._clock()
+            flight = self._inflight.get(key)
+            if flight is not None and now - flight.started > self.inflight_timeout:
+                del self._inflight[key]
+                flight = None
+
+            previous = self._ids.get(topic_id)
+            if previous == key:
+                if _is_result(current):
+                    self.duplicates += 1
+                    self._ids.move_to_end(topic_id)
+                    return DUPLICATE, current
+                if flight is not None and (flight.leader == topic_id or topic_id in flight.followers):
+                    if topic_id == flight.leader:
+                        flight.family = family
+                    else:
+                        flight.followers[topic_id] = family
+                    self.coalesced += 1
+                    return COALESCED, None
+            elif previous is not None:
+                stale = self._inflight.get(previous)
+                if stale is not None:
+                    stale.followers.pop(topic_id, None)
+            self._remember(topic_id, key)
+
+            result = self._memo.get(key)
+            if result is not None:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return MEMO, result
+            self.memo_misses += 1
+
+            self.store[topic_id] = {"status": "pending"}
+            if flight is not None:
+                flight.followers[topic_id] = family
+                self.coalesced += 1
+                return COALESCED, None
+            self._inflight[key] = _Flight(topic_id, family, now)
+            self.submitted += 1
+            return SUBMIT, None
+
+    def complete(self, topic_id, result):
+        """
+        Record the result stored for a topic ID.
+
+        :param topic_id: str
+        :param result: dict
+            The stored result; error results are neither memoized nor shared, and
+            results of another rule version than the one given to `clear` are not memoized.
+        :return: tuple
+            (FamilyInput or None, list of tuple): the input the topic ID was admitted
+            with, if its calculation was still in flight, and the (topic ID, FamilyInput)
+            of the coalesced requests that should receive the same result, each with its
+            own input: inputs sharing a fingerprint may still differ (every ineligible
+            family shares one).
+        """
+        if not _is_result(result):
+            return None, []
+        with self._lock:
+            key = self._ids.get(topic_id)
+            if key is None:
+                return None, []
+            if self._rule_version is None or result.get("ruleVersion", self._rule_version) == self._rule_version:
+                self._memo[key] = result
+                self._memo.move_to_end(key)
+                if len(self._memo) > self.max_entries:
+                    self._memo.popitem(last=False)
+            flight = self._inflight.get(key)
+            if flight is None or (flight.leader != topic_id and topic_id not in flight.followers):
+                return None, []
+            del self._inflight[key]
+            family = flight.family if flight.leader == topic_id else flight.followers[topic_id]
+            followers = [(follower, own) for follower, own in flight.followers.items() if follower != topic_id]
+            return family, followers
+
+    def abort(self, topic_id, error="MQTT broker unavailable"):
+        """
+        Drop the calculation of a topic ID whose record could not be published.
+
+        The topic ID and the requests coalesced onto it are forgotten, so a resubmission
+        is published again, and each is given an error result instead of "pending".
+
+        :param topic_id: str
+        :param error: str
+            Message of the stored error results.
+        :return: list of str
+            The topic IDs given an error result: the topic ID, then its followers.
+        """
+        with self._lock:
+            key = self._ids.get(topic_id)
+            if key is None:
+                return []
+            aborted = [topic_id]
+            flight = self._inflight.get(key)
+            if flight is not None and flight.leader == topic_id:
+                del self._inflight[key]
+                aborted += [follower for follower in flight.followers if follower != topic_id]
+            for aborted_id in aborted:
+                if self._ids.get(aborted_id) == key:
+                    del self._ids[aborted_id]
+                self.store[aborted_id] = {"status": "error", "error": error}
+            return aborted
+
+    def clear(self, rule_version=None):
+        """
+        Forget every topic ID, flight and memoized result (e.g. after the rules change).
+
+        :param rule_version: str or None
+            The new rule version: results of other versions, still being calculated,
+            are then not memoized when they complete.
+        :return: None
+        """
+        with self._lock:
+            self._rule_version = rule_version
+            self._ids.clear()
+            self._memo.clear()
+            self._inflight.clear()
+
+    def _remember(self, topic_id, key):
+        self._ids[topic_id] = key
+        self._ids.move_to_end(topic_id)
+        if len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+
+    def stats(self):
+        """
+        Report deduplication counters.
+
+        :return: dict
+            Submissions published, duplicates and coalesced requests answered without
+            publishing, memo cache size, hits, misses and hit rate, and flights in progress.
+        """
+        with self._lock:
+            lookups = self.memo_hits + self.memo_misses
+            return {
+                "submitted": self.submitted,
+                "duplicates": self.duplicates,
+                "coalesced": self.coalesced,
+                "memoSize": len(self._memo),
+                "memoHits": self.memo_hits,
+                "memoMisses": self.memo_misses,
+                "memoHitRate": self.memo_hits / lookups if lookups else 0.0,
+                "inflight": len(self._inflight),
+            }
@@ -0,0 +1,169 @@
+"""
+Winter Supplement Message Dispatcher
+Author: Liliya
+----------------------------
+This module moves MQTT message processing off the paho network thread. Incoming
+messages are placed on a bounded queue and handled by a pool of worker threads,
+so a burst of input messages cannot stall keepalives and acks.
+
+Main Classes:
+- MessageDispatcher: A bounded queue drained by a configurable pool of workers.
+"""
+
+import queue
+import threading
+
+# Queue-full policies
+BLOCK = "block"  # Wait for space, pushing backpressure onto the network thread
+DROP = "drop"  # Discard the incoming message and count it as dropped
+
+_STOP = object()  # Queued once per worker to stop it
+
+
+class MessageDispatcher:
+    """
+    Dispatch items to a handler running on a pool of worker threads.
+
+    Items are processed in arrival order per worker; with more than one worker,
+    items may complete out of order.
+    """
+
+    def __init__(self, handler, workers=4, max_queue=10000, policy=BLOCK, block_timeout=None,
+                 name="mqtt-worker"):
+        """
+        :param handler: callable
+            Called with each submitted item on a worker thread.
+        :param workers: int
+            Number of worker threads.
+        :param max_queue: int
+            Maximum number of queued items.
+        :param policy: str
+            `BLOCK` or `DROP`, applied when the queue is full.
+        :param block_timeout: float or None
+            With `BLOCK`, how long to wait for space before dropping; None waits forever.
+        :param name: str
+            Prefix for worker thread names.
+        """
+        if workers <= 0:
+            raise ValueError("workers must be positive")
+        if policy not in (BLOCK, DROP):
+            raise ValueError(f"Invalid queue policy: {policy}")
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._accepting = False
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.blocked = 0
+
+    def start(self):
+        """
+        Start the worker threads.
+
+        :return: None
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._accepting = True
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item):
+        """
+        Queue an item for processing.
+
+        :param item:
+            Passed unchanged to the handler.
+        :return: bool
+            True if the item was queued, False if it was dropped.
+        """
+        if not self._accepting:
+            self._count("dropped")
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == DROP:
+                self._count("dropped")
+                return False
+            self._count("blocked")
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    def shutdown(self, drain=True, timeout=None):
+        """
+        Stop accepting items and stop the workers.
+
+        :param drain: bool
+            Process every queued item before stopping; otherwise queued items are discarded.
+        :param timeout: float or None
+            Maximum seconds to wait for each worker to finish.
+        :return: None
+        """
+        with self._lock:
+            self._accepting = False
+            threads, self._threads = self._threads, []
+        if not drain:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._count("dropped")
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """
+        Report backpressure metrics.
+
+        :return: dict
+            Queue depth and capacity, policy, and enqueued/processed/failed/dropped/blocked counters.
+        """
+        with self._lock:
+            return {
+                "queueDepth": self._queue.qsize(),
+                "maxQueue": self.max_queue,
+                "policy": self.policy,
+                "workers": len(self._threads),
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "blocked": self.blocked,
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            try:
+                self.handler(item)
+            except Exception as e:
+                self._count("failed")
+                print(f"Error in {threading.current_thread().name}: {e}")
+            else:
+                self._count("processed")
@@ -0,0 +1,279 @@
+"""
+Winter Supplement Load Generator
+Author: Liliya
+----------------------------
+This module drives the `app.py` pipeline at a configurable rate and concurrency, entirely
+offline: submissions go to `/submit` through Flask's test client, or straight to the MQTT
+input topics, and flow through the in-process `LocalBroker`, `on_message` and the worker
+pool exactly as they would against a real broker. An observer subscribed to the output
+topics timestamps every result.
+
+Latency is measured from the moment a request was scheduled to be sent until its result is
+published, so a generator falling behind its schedule shows up as latency instead of being
+hidden (no coordinated omission). Requests whose result is not published within the
+timeout count as lost; submissions refused with HTTP 429 are reported separately.
+
+Inputs are unique by default (the number of children grows with every request), so every
+request is calculated; `--repeat-inputs` cycles through a small mix that the deduplication
+layer mostly answers from its memo cache.
+
+Usage:
+    python loadgen.py --mode http --requests 20000 --concurrency 8
+    python loadgen.py --mode mqtt --rate 2000 --duration 10
+    python loadgen.py --mode http --rate 500,1000,2000,4000 --duration 5
+
+Main Functions:
+- make_record: Builds the input of one request.
+- run_load: Runs one load step and reports throughput, latency percentiles and loss.
+- sweep: Runs one step per target rate and marks the steps where the pipeline saturated.
+- main: Command-line entry point.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+
+import codec
+from benchmark import SAMPLE_RECORDS, local_pipeline, percentiles
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, MQTT_OUTPUT_BATCH_TOPIC
+
+MODES = ("http", "mqtt")
+LATENCY_PERCENTILES = (50, 99, 99.9)
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 10.0  # Seconds a result may take after the last request is sent
+SATURATION_RATIO = 0.95  # Throughput below this share of the offered rate counts as saturated
+DRAIN_POLL_SECONDS = 0.01
+
+_runs = itertools.count(1)  # Keeps topic IDs unique across runs in one process
+_unique_inputs = itertools.count()  # Keeps unique inputs unique across runs in one process
+
+
+def make_record(topic_id, index, repeat_inputs=False):
+    """
+    Build the input of one request.
+
+    :param topic_id: str
+    :param index: int
+        Request number.
+    :param repeat_inputs: bool
+        Cycle through SAMPLE_RECORDS instead of generating an input never calculated before.
+    :return: dict
+    """
+    if repeat_inputs:
+        return dict(SAMPLE_RECORDS[index % len(SAMPLE_RECORDS)], id=topic_id)
+    return {
+        "id": topic_id,
+        "familyComposition": "couple" if index % 2 else "single",
+        "numberOfChildren": next(_unique_inputs),
+        "familyUnitInPayForDecember": True,
+    }
+
+
+def run_load(mode="http", requests=10000, rate=0.0, concurrency=DEFAULT_CONCURRENCY,
+             repeat_inputs=False, timeout=DEFAULT_TIMEOUT):
+    """
+    Send `requests` submissions through the local pipeline and wait for their results.
+
+    :param mode: str
+        "http" posts to `/submit`; "mqtt" publishes to the input topics.
+    :param requests: int
+        Number of requests.
+    :param rate: float
+        Target requests per second across all senders; 0 sends as fast as possible.
+    :param concurrency: int
+        Number of sender threads.
+    :param repeat_inputs: bool
+        Passed to `make_record`.
+    :param timeout: float
+        Seconds to wait for outstanding results after the last request is sent.
+    :return: dict
+        sent, rejected (HTTP 429), failed (other errors), completed, lost, lossRate,
+        seconds, offeredPerSecond, throughputPerSecond and latency percentiles
+        (`p50Ms`, `p99Ms`, `p999Ms`) when any result arrived.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    if requests <= 0 or concurrency <= 0:
+        raise ValueError("requests and concurrency must be positive")
+    prefix = f"load{next(_runs)}-"
+    scheduled = [0.0] * requests  # request number -> time the request was due
+    accepted = set()
+    completed = {}  # request number -> time its result was published
+    counts = {"rejected": 0, "failed": 0}
+    lock = threading.Lock()
+    next_index = itertools.count()
+
+    def on_result(client, userdata, msg):
+        arrived = time.perf_counter()
+        topic, fmt = codec.message_format(msg)
+        if topic == MQTT_OUTPUT_BATCH_TOPIC:
+            topic_ids = [result["id"] for result in codec.decode(msg.payload, fmt)]
+        else:
+            topic_ids = [topic.rsplit("/", 1)[-1]]
+        for topic_id in topic_ids:
+            if topic_id.startswith(prefix):
+                completed.setdefault(int(topic_id[len(prefix):]), arrived)
+
+    with local_pipeline() as (app_module, broker):
+        from local_broker import LocalClient
+
+        observer = LocalClient(broker)
+        observer.on_message = on_result
+        observer.connect()
+        observer.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
+        observer.subscribe(MQTT_OUTPUT_BATCH_TOPIC)
+
+        def send(index, sender):
+            record = make_record(f"{prefix}{index}", index, repeat_inputs)
+            if mode == "http":
+                response = sender.post("/submit", data=codec.dumps(record), content_type="application/json")
+                status = response.status_code
+            else:
+                status = 200 if sender.publish(f"{MQTT_INPUT_TOPIC_BASE}/{record['id']}",
+                                               codec.dumps(record)).rc == 0 else 500
+            with lock:
+                if status == 200:
+                    accepted.add(index)
+                else:
+                    counts["rejected" if status == 429 else "failed"] += 1
+
+        def sender_thread():
+            if mode == "http":
+                sender = app_module.app.test_client()
+            else:
+                sender = LocalClient(broker)
+                sender.connect()
+            while True:
+                index = next(next_index)
+                if index >= requests:
+                    return
+                due = started + index / rate if rate > 0 else time.perf_counter()
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled[index] = due
+                send(index, sender)
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=sender_thread, name=f"loadgen-{n}", daemon=True)
+                   for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sent_seconds = time.perf_counter() - started
+
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline and not accepted.issubset(completed):
+            time.sleep(DRAIN_POLL_SECONDS)
+        observer.disconnect()
+
+    done = [index for index in accepted if index in completed]
+    lost = len(accepted) - len(done)
+    summary = {
+        "sent": requests,
+        "rejected": counts["rejected"],
+        "failed": counts["failed"],
+        "completed": len(done),
+        "lost": lost,
+        "lossRate": lost / len(accepted) if accepted else 0.0,
+        "seconds": sent_seconds,
+        "offeredPerSecond": requests / sent_seconds if sent_seconds > 0 else 0.0,
+        "throughputPerSecond": 0.0,
+    }
+    if done:
+        finished = max(completed[index] for index in done) - started
+        summary["throughputPerSecond"] = len(done) / finished if finished > 0 else 0.0
+        summary.update(percentiles([completed[index] - scheduled[index] for index in done], LATENCY_PERCENTILES))
+    return summary
+
+
+def sweep(rates, duration, mode="http", concurrency=DEFAULT_CONCURRENCY, repeat_inputs=False,
+          timeout=DEFAULT_TIMEOUT):
+    """
+    Run one load step per target rate, each lasting about `duration` seconds.
+
+    A step is saturated when results are lost, requests are rejected, or the throughput
+    falls below SATURATION_RATIO of the target rate.
+
+    :param rates: list of float
+        Target requests per second, one step each.
+    :param duration: float
+        Seconds of load per step.
+    :param mode: str
+    :param concurrency: int
+    :param repeat_inputs: bool
+    :param timeout: float
+    :return: list of dict
+        `run_load` summaries with `targetPerSecond` and `saturated` added.
+    """
+    steps = []
+    for rate in rates:
+        summary = run_load(mode, max(1, int(rate * duration)), rate, concurrency, repeat_inputs, timeout)
+        summary["targetPerSecond"] = rate
+        summary["saturated"] = bool(
+            summary["lost"] or summary["rejected"] or summary["failed"]
+            or summary["throughputPerSecond"] < SATURATION_RATIO * rate
+        )
+        steps.append(summary)
+    return steps
+
+
+def parse_rates(value):
+    try:
+        rates = [float(rate) for rate in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected comma-separated requests per second, e.g. 500,1000")
+    if any(rate < 0 for rate in rates):
+        raise argparse.ArgumentTypeError("Rates cannot be negative")
+    return rates
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        0 if no step lost results, otherwise 1.
+    """
+    parser = argparse.ArgumentParser(description="Offline load generator for the winter supplement pipeline.")
+    parser.add_argument("--mode", choices=MODES, default="http", help="Submit over HTTP or MQTT")
+    parser.add_argument("--rate", type=parse_rates, default=[0.0],
+                        help="Target requests per second (0 = as fast as possible); a list runs a sweep")
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per step without --duration")
+    parser.add_argument("--duration", type=float, help="Seconds per step; requests = rate * duration")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Sender threads")
+    parser.add_argument("--repeat-inputs", action="store_true",
+                        help="Cycle through a few inputs, exercising the deduplication memo cache")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds to wait for results after the last request")
+    parser.add_argument("--output", help="JSON file receiving the results")
+    args = parser.parse_args(argv)
+
+    if args.duration and all(args.rate):
+        steps = sweep(args.rate, args.duration, args.mode, args.concurrency, args.repeat_inputs, args.timeout)
+    else:
+        steps = []
+        for rate in args.rate:
+            summary = run_load(args.mode, args.requests, rate, args.concurrency, args.repeat_inputs, args.timeout)
+            summary["targetPerSecond"] = rate
+            steps.append(summary)
+
+    for step in steps:
+        print(f"{args.mode} target {step['targetPerSecond'] or 'max'} req/s:")
+        for metric, value in step.items():
+            if metric != "targetPerSecond":
+                print(f"  {metric}: {value:.3f}" if isinstance(value, float) else f"  {metric}: {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mode": args.mode, "steps": steps}, f, indent=2)
+    return 1 if any(step["lost"] for step in steps) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
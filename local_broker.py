@@ -0,0 +1,235 @@
+"""
+Winter Supplement Local Broker
+Author: Liliya
+----------------------------
+This module provides an in-process stand-in for an MQTT broker, so the message flow
+of `app.py` can be exercised offline in tests, benchmarks and load tests without
+`config.BROKER`.
+
+Messages are delivered on a single broker thread in publish order, like a real broker
+delivering over the network, so callbacks never run on the publishing thread.
+Shared subscriptions (`$share/<group>/<filter>`) deliver each message to one member
+of the group, in round-robin order.
+
+Main Classes:
+- LocalBroker: Routes published messages to matching subscriptions.
+- LocalClient: A client with the subset of the `paho.mqtt.client.Client` API used by this project.
+"""
+
+import itertools
+import queue
+from collections import defaultdict
+import threading
+
+import paho.mqtt.client as mqtt
+
+_STOP = object()
+
+
+class LocalBroker:
+    """
+    In-process MQTT broker stand-in.
+
+    Supports `+`/`#` wildcards and shared subscriptions; retained messages are not stored.
+    """
+
+    SHARED_PREFIX = "$share/"
+
+    def __init__(self):
+        self._subscriptions = []  # (topic filter, client)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._mids = itertools.count(1)
+        self._thread = None
+        self._next_member = defaultdict(int)  # shared subscription -> round-robin position
+        self.published = 0
+        self.delivered = 0
+
+    def start(self):
+        """
+        Start the delivery thread.
+
+        :return: None
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._deliver, name="local-broker", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """
+        Deliver the messages already published, then stop the delivery thread.
+
+        :return: None
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every message published so far has been delivered.
+
+        :param timeout: float or None
+            Maximum seconds to wait.
+        :return: bool
+            True if the queue was drained within the timeout.
+        """
+        self.start()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def subscribe(self, client, topic_filter):
+        with self._lock:
+            if (topic_filter, client) not in self._subscriptions:
+                self._subscriptions.append((topic_filter, client))
+
+    def unsubscribe(self, client, topic_filter):
+        with self._lock:
+            if (topic_filter, client) in self._subscriptions:
+                self._subscriptions.remove((topic_filter, client))
+
+    def disconnect(self, client):
+        with self._lock:
+            self._subscriptions = [entry for entry in self._subscriptions if entry[1] is not client]
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """
+        Queue a message for delivery to every matching subscription.
+
+        :param topic: str
+        :param payload: bytes, str or None
+        :param qos: int
+        :param retain: bool
+        :return: int
+            The message ID.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        mid = next(self._mids)
+        with self._lock:
+            self.published += 1
+        self._queue.put((mid, topic, payload or b"", qos, retain))
+        return mid
+
+    def _route(self, topic):
+        """
+        Select the clients receiving a message on `topic`: one delivery per client for
+        ordinary subscriptions, plus one delivery per shared subscription group.
+
+        :param topic: str
+        :return: list of LocalClient
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        clients = []
+        groups = {}  # (group, filter) -> subscribed clients, in subscription order
+        for topic_filter, client in subscriptions:
+            if topic_filter.startswith(self.SHARED_PREFIX):
+                group, _, shared_filter = topic_filter[len(self.SHARED_PREFIX):].partition("/")
+                if mqtt.topic_matches_sub(shared_filter, topic):
+                    groups.setdefault((group, shared_filter), []).append(client)
+            elif client not in clients and mqtt.topic_matches_sub(topic_filter, topic):
+                clients.append(client)
+        for key, members in groups.items():
+            with self._lock:
+                position = self._next_member[key]
+                self._next_member[key] = position + 1
+            clients.append(members[position % len(members)])
+        return clients
+
+    def _deliver(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            mid, topic, payload, qos, retain = item
+            for client in self._route(topic):
+                msg = mqtt.MQTTMessage(mid, topic.encode("utf-8"))
+                msg.payload = payload
+                msg.qos = qos
+                msg.retain = retain
+                with self._lock:
+                    self.delivered += 1
+                client._receive(msg)
+
+
+class LocalClient:
+    """
+    MQTT client connected to a `LocalBroker`.
+
+    Implements the parts of `paho.mqtt.client.Client` used by this project, so it can
+    replace `app.client` in tests and benchmarks.
+    """
+
+    def __init__(self, broker, client_id="", userdata=None):
+        self.broker = broker
+        self.client_id = client_id
+        self.userdata = userdata
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+        self._connected = False
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.broker.start()
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, self.userdata, {}, mqtt.MQTT_ERR_SUCCESS)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def connect_async(self, host=None, port=None, keepalive=60):
+        return self.connect(host, port, keepalive)
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def max_inflight_messages_set(self, inflight):
+        pass
+
+    def loop_start(self):
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def loop_stop(self, force=False):
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def is_connected(self):
+        return self._connected
+
+    def disconnect(self):
+        self.broker.disconnect(self)
+        self._connected = False
+        if self.on_disconnect:
+            self.on_disconnect(self, self.userdata, mqtt.MQTT_ERR_SUCCESS)
+        return mqtt.MQTT_ERR_SUCCESS
+
+    def subscribe(self, topic, qos=0):
+        self.broker.subscribe(self, topic)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        return mqtt.MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self._connected:
+            info = mqtt.MQTTMessageInfo(0)
+            info.rc = mqtt.MQTT_ERR_NO_CONN
+            return info
+        info = mqtt.MQTTMessageInfo(self.broker.publish(topic, payload, qos, retain))
+        info.rc = mqtt.MQTT_ERR_SUCCESS
+        info._set_as_published()
+        return info
+
+    def _receive(self, msg):
+        if self.on_message:
+            try:
+                self.on_message(self, self.userdata, msg)
+            except Exception as e:
+                print(f"Error in on_message for {msg.topic}: {e}")
@@ -0,0 +1,306 @@
+"""
+Winter Supplement Metrics
+Author: Liliya
+----------------------------
+This module is a small, dependency-free metrics registry rendered in the Prometheus
+text exposition format (version 0.0.4), so `/metrics` can be scraped by Prometheus
+or read with curl.
+
+Updating a metric is a dict lookup and an addition under a lock, cheap enough to
+leave on the hot path. Values owned by other components (result store size, queue
+depth, ...) are read by callbacks only when the registry is rendered.
+
+Main Classes and Functions:
+- Counter: A monotonically increasing value, optionally labelled.
+- Histogram: Counts observations into cumulative buckets, optionally labelled.
+- Registry: Holds metrics and callbacks, and renders them as text.
+- REGISTRY: The process-wide registry.
+"""
+
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.01)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Common state of labelled metrics: children are keyed by their label values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        Select the child metric for a set of label values.
+
+        :param values: str
+            One value per label name, in order.
+        :return: the child metric
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self, reads=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._samples()):
+            lines.extend(child._render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing value."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """
+        Increment an unlabelled counter.
+
+        :param amount: int or float
+        :return: None
+        """
+        self._children[()].inc(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "_upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds):
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def _render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._upper_bounds + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, (("le", _format_value(float(bound))),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Counts observations into buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        :param name: str
+        :param documentation: str
+        :param labelnames: tuple of str
+        :param buckets: tuple of float
+            Sorted upper bounds; a `+Inf` bucket is always added.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """
+        Record an observation on an unlabelled histogram.
+
+        :param value: float
+        :return: None
+        """
+        self._children[()].observe(value)
+
+
+class _Callback:
+    """
+    A metric whose samples are read from a function when rendered.
+
+    With a `key`, the function returns a dict of several metrics and the sample is its
+    `key`; the function is then called once per render for all the metrics sharing it.
+    """
+
+    def __init__(self, name, documentation, kind, function, labelnames=(), key=None):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.function = function
+        self.labelnames = tuple(labelnames)
+        self.key = key
+
+    def render(self, reads=None):
+        if self.key is None:
+            value = self.function()
+        else:
+            if reads is None:
+                reads = {}
+            values = reads.get(self.function)
+            if values is None:
+                values = reads[self.function] = self.function()
+            value = values[self.key]
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, sample in sorted(samples):
+            values = values if isinstance(values, tuple) else (values,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(sample)}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Register a counter.
+
+        :return: Counter
+        """
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Register a histogram.
+
+        :return: Histogram
+        """
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, function, kind="gauge", labelnames=()):
+        """
+        Register a metric read from `function` when the registry is rendered.
+
+        :param function: callable
+            Returns a number, or a dict mapping label values (a str or a tuple of
+            str, one per label name) to numbers.
+        :param kind: str
+            "gauge" or "counter".
+        :return: None
+        """
+        self._register(_Callback(name, documentation, kind, function, labelnames))
+
+    def callbacks(self, function, metrics):
+        """
+        Register several metrics read from one call of `function` per render, for
+        components whose statistics are expensive to read (e.g. a result store).
+
+        :param function: callable
+            Returns a dict holding the value of every metric.
+        :param metrics: iterable of tuple
+            (name, kind, key, documentation) per metric; `key` selects its value.
+        :return: None
+        """
+        for name, kind, key, documentation in metrics:
+            self._register(_Callback(name, documentation, kind, function, key=key))
+
+    def unregister(self, name):
+        """
+        Remove a metric.
+
+        :param name: str
+        :return: None
+        """
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format.
+
+        :return: str
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        reads = {}  # Values of the shared callback functions, read once per render
+        for metric in metrics:
+            lines.extend(metric.render(reads))
+        return "\n".join(lines) + "\n"
+
+
+# The process-wide registry rendered by `/metrics`
+REGISTRY = Registry()
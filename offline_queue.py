@@ -0,0 +1,206 @@
+"""
+Winter Supplement Offline Queue
+Author: Liliya
+----------------------------
+This module keeps MQTT messages published while the client is disconnected in a
+bounded on-disk queue (SQLite), so inputs and results survive broker outages and
+process restarts. The queue is replayed in publish order once the client reconnects;
+until the replay has drained it, new messages are queued behind the backlog (`defer`)
+instead of overtaking it. When the queue is full, the oldest messages are dropped and
+counted.
+
+Main Classes:
+- OfflineQueue: A bounded, persistent FIFO of (topic, payload, qos) messages.
+"""
+
+import sqlite3
+import threading
+
+
+class OfflineQueue:
+    """
+    Bounded on-disk FIFO of MQTT messages.
+
+    The database is opened by `open` or on first use, so creating a queue performs no I/O.
+    """
+
+    def __init__(self, path, max_messages=100000):
+        """
+        :param path: str
+            Database file; created if it does not exist.
+        :param max_messages: int
+            Maximum number of queued messages; the oldest are dropped beyond it.
+        """
+        if max_messages <= 0:
+            raise ValueError("max_messages must be positive")
+        self.path = path
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._replaying = False  # True until a replay finds the queue empty
+        self._connection = None
+        self._size = 0
+        self.queued = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def _open(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, topic TEXT NOT NULL, payload BLOB NOT NULL, "
+                "qos INTEGER NOT NULL)"
+            )
+            connection.commit()
+            self._size = connection.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    def open(self):
+        """
+        Open the database and count the messages left by a previous run, so `stats`
+        reports the backlog before anything is queued or replayed.
+
+        :return: None
+        """
+        with self._lock:
+            self._open()
+
+    def put(self, topic, payload, qos=0):
+        """
+        Queue a message, dropping the oldest if the queue is full.
+
+        :param topic: str
+        :param payload: bytes or str
+        :param qos: int
+        :return: None
+        """
+        with self._lock:
+            self._put(topic, payload, qos)
+
+    def defer(self, topic, payload, qos=0):
+        """
+        Queue a message behind the backlog if there is one, so it is not published
+        before the messages still waiting to be replayed.
+
+        :param topic: str
+        :param payload: bytes or str
+        :param qos: int
+        :return: bool
+            True if the message was queued; False if the queue is empty and no replay
+            is running, in which case the caller publishes it directly.
+        """
+        with self._lock:
+            if not self._size and not self._replaying:
+                return False
+            self._put(topic, payload, qos)
+            return True
+
+    @property
+    def replaying(self):
+        """True while a replay is running."""
+        return self._replaying
+
+    def _put(self, topic, payload, qos):
+        # Called with the lock held
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        connection = self._open()
+        with connection:
+            connection.execute("INSERT INTO messages (topic, payload, qos) VALUES (?, ?, ?)",
+                               (topic, payload, qos))
+            self._size += 1
+            self.queued += 1
+            excess = self._size - self.max_messages
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM messages WHERE seq IN (SELECT seq FROM messages ORDER BY seq LIMIT ?)",
+                    (excess,),
+                )
+                self._size -= excess
+                self.dropped += excess
+
+    def replay(self, publish, batch_size=500):
+        """
+        Publish the queued messages in order, removing each one once it is handed over.
+
+        Only one replay runs at a time; a concurrent call returns immediately. Messages
+        deferred while it runs are replayed by it too: it ends only once the queue is
+        empty, in the same step that lets `defer` publish directly again.
+
+        :param publish: callable
+            Called with (topic, payload, qos); returns False to stop the replay and keep
+            the message (e.g. because the connection was lost again).
+        :param batch_size: int
+            Messages read from disk at a time.
+        :return: int
+            Number of messages replayed.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        replayed = 0
+        with self._lock:
+            self._replaying = True
+        try:
+            while True:
+                with self._lock:
+                    rows = self._open().execute(
+                        "SELECT seq, topic, payload, qos FROM messages ORDER BY seq LIMIT ?", (batch_size,)
+                    ).fetchall()
+                    if not rows:
+                        self._replaying = False
+                        return replayed
+                done = None
+                for seq, topic, payload, qos in rows:
+                    if not publish(topic, payload, qos):
+                        break
+                    done = seq
+                if done is not None:
+                    with self._lock:
+                        with self._connection:
+                            removed = self._connection.execute(
+                                "DELETE FROM messages WHERE seq <= ?", (done,)
+                            ).rowcount
+                        self._size -= removed
+                        self.replayed += removed
+                        replayed += removed
+                if done != rows[-1][0]:
+                    return replayed
+        finally:
+            with self._lock:
+                self._replaying = False
+            self._replay_lock.release()
+
+    def __len__(self):
+        with self._lock:
+            self._open()
+            return self._size
+
+    def stats(self):
+        """
+        Report queue counters.
+
+        :return: dict
+            Messages queued now, and messages queued, replayed and dropped so far.
+        """
+        with self._lock:
+            return {
+                "size": self._size,
+                "maxMessages": self.max_messages,
+                "queued": self.queued,
+                "replayed": self.replayed,
+                "dropped": self.dropped,
+            }
+
+    def close(self):
+        """
+        Close the database; it is reopened on next use.
+
+        :return: None
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,171 @@
+"""
+Winter Supplement Output Batcher
+Author: Liliya
+----------------------------
+This module micro-batches published results. Instead of one MQTT message per result,
+results are buffered for up to `max_items` records or `max_delay` seconds and
+published as one array on the batch output topic:
+
+    BRE/calculateWinterSupplementBatchOutput
+    [{"id": "<topic_id>", "isEligible": true, "baseAmount": 60.0, ...}, ...]
+
+Results are buffered per payload format, so each batch is encoded in one format.
+Larger batches mean fewer packets for the broker; a longer delay means later results.
+Each flush reports its size, the time its oldest result waited and why it was flushed
+(size, time or close), to tune the two limits.
+
+Main Classes:
+- OutputBatcher: Buffers results and publishes them in batches.
+"""
+
+import threading
+import time
+
+import codec
+
+# Reasons a batch is flushed
+SIZE = "size"  # The batch reached max_items
+TIME = "time"  # The oldest result waited max_delay
+CLOSE = "close"  # The batcher was flushed or closed
+
+
+class OutputBatcher:
+    """
+    Buffer results and publish them as arrays on a batch topic.
+
+    A background thread, started with the first result, flushes batches whose oldest
+    result has waited `max_delay` seconds; full batches are published by the thread
+    that filled them.
+    """
+
+    def __init__(self, publish, topic, max_items=500, max_delay=0.02, observe=None, clock=time.monotonic):
+        """
+        :param publish: callable
+            Called with (topic, payload) to publish a batch.
+        :param topic: str
+            The batch output topic; a format suffix is appended for non-JSON batches.
+        :param max_items: int
+            Results per batch.
+        :param max_delay: float
+            Maximum seconds a result stays buffered.
+        :param observe: callable or None
+            Called with (batch size, seconds the oldest result waited, reason) after each flush.
+        :param clock: callable
+            Returns the current time in seconds (overridable for tests).
+        """
+        if max_items <= 0:
+            raise ValueError("max_items must be positive")
+        self.publish = publish
+        self.topic = topic
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self.observe = observe
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._buffers = {}  # format -> buffered records
+        self._first = {}  # format -> time its oldest record was buffered
+        self._thread = None
+        self._closed = False
+        self.items = 0
+        self.batches = 0
+
+    def add(self, topic_id, result, fmt=codec.JSON):
+        """
+        Buffer a result, publishing its batch if it is full.
+
+        :param topic_id: str
+        :param result: dict
+        :param fmt: str
+            Payload format of the batch.
+        :return: None
+        """
+        record = {"id": topic_id, **result}
+        with self._lock:
+            buffer = self._buffers.get(fmt)
+            if buffer is None:
+                buffer = self._buffers[fmt] = []
+                self._first[fmt] = self._clock()
+                self._changed.notify()
+            buffer.append(record)
+            full = self._take(fmt) if len(buffer) >= self.max_items else None
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="output-batcher", daemon=True)
+                self._thread.start()
+        if full is not None:
+            self._publish(fmt, full, SIZE)
+
+    def flush(self):
+        """
+        Publish every buffered result now.
+
+        :return: None
+        """
+        with self._lock:
+            batches = [(fmt, self._take(fmt)) for fmt in list(self._buffers)]
+        for fmt, batch in batches:
+            self._publish(fmt, batch, CLOSE)
+
+    def close(self):
+        """
+        Stop the background thread and publish the buffered results.
+
+        :return: None
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            self._changed.notify()
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            self._closed = False  # A later result starts a new background thread
+        self.flush()
+
+    def stats(self):
+        """
+        Report batching counters.
+
+        :return: dict
+            Results buffered now, results published and batches published.
+        """
+        with self._lock:
+            return {
+                "buffered": sum(len(buffer) for buffer in self._buffers.values()),
+                "items": self.items,
+                "batches": self.batches,
+            }
+
+    def _take(self, fmt):
+        return self._buffers.pop(fmt), self._first.pop(fmt)
+
+    def _publish(self, fmt, batch, reason):
+        records, first = batch
+        self.publish(codec.with_format(self.topic, fmt), codec.encode(records, fmt))
+        waited = self._clock() - first
+        with self._lock:
+            self.items += len(records)
+            self.batches += 1
+        if self.observe is not None:
+            self.observe(len(records), waited, reason)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    now = self._clock()
+                    due = [fmt for fmt, first in self._first.items() if now - first >= self.max_delay]
+                    if due:
+                        break
+                    if self._first:
+                        self._changed.wait(min(self._first.values()) + self.max_delay - now)
+                    else:
+                        self._changed.wait()
+                if self._closed:
+                    return
+                batches = [(fmt, self._take(fmt)) for fmt in due]
+            for fmt, batch in batches:
+                try:
+                    self._publish(fmt, batch, TIME)
+                except Exception as e:
+                    print(f"Error publishing output batch: {e}")
@@ -0,0 +1,271 @@
+"""
+Winter Supplement Profiling Hooks
+Author: Liliya
+----------------------------
+This module provides opt-in profiling of HTTP requests and MQTT messages, to find where
+the time goes when latency spikes: Flask request parsing, validation, deduplication,
+publishing, or the calculation and storage on the MQTT workers.
+
+- Sampling: a fraction of requests (or every request carrying the profiling header)
+  runs under cProfile; the samples are merged into one set of hot-path statistics.
+- Phases: while a request is captured, code wrapped in `phase(name)` is timed, giving
+  a breakdown such as parse/validate/publish or parse/validate/calc/store/publish.
+- Slow requests: with a threshold set, every request is captured for its phases, and
+  those slower than the threshold are logged and kept for inspection.
+
+When nothing is captured, `begin` returns None and `phase` returns a shared no-op context
+manager after checking one counter, so the hooks cost close to nothing.
+
+Main Classes:
+- RequestProfiler: Captures requests, times their phases and aggregates the results.
+"""
+
+import contextlib
+import io
+import random
+import threading
+import time
+from collections import deque
+
+# pstats sort keys accepted by `RequestProfiler.report`
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+class _Capture:
+    """One captured request: its phase timings and optional cProfile profile."""
+
+    __slots__ = ("name", "started", "phases", "profile")
+
+    def __init__(self, name, profile):
+        self.name = name
+        self.phases = {}  # phase name -> seconds
+        self.profile = None
+        if profile:
+            import cProfile
+
+            try:
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            except ValueError:  # Another profiler is active on this thread
+                self.profile = None
+        self.started = time.perf_counter()
+
+
+class _PhaseTimer:
+    __slots__ = ("capture", "name", "started")
+
+    def __init__(self, capture, name):
+        self.capture = capture
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        phases = self.capture.phases
+        phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class _ThreadState(threading.local):
+    capture = None  # The capture in progress on this thread
+
+
+class RequestProfiler:
+    """
+    Sampled cProfile capture, phase timing and slow-request log.
+
+    `begin` and `end` bracket a request on the thread that handles it; `phase` times
+    a part of the request currently captured on the calling thread.
+    """
+
+    def __init__(self, sample_ratio=0.0, slow_seconds=None, max_slow=100, random=random.random, log=print):
+        """
+        :param sample_ratio: float
+            Fraction of requests run under cProfile (0 disables sampling).
+        :param slow_seconds: float or None
+            Requests taking at least this long are logged with their phases; None disables.
+        :param max_slow: int
+            Slow requests kept for `report`.
+        :param random: callable
+            Returns a float in [0, 1) (overridable for tests).
+        :param log: callable or None
+            Receives one line per slow request.
+        """
+        if not 0.0 <= sample_ratio <= 1.0:
+            raise ValueError("sample_ratio must be between 0 and 1")
+        self.sample_ratio = sample_ratio
+        self.slow_seconds = slow_seconds
+        self._random = random
+        self._log = log
+        self._local = _ThreadState()
+        self._lock = threading.Lock()
+        self._stats = None  # pstats.Stats merged from every profiled request
+        self._phases = {}  # phase name -> [count, total seconds, max seconds]
+        self._slow = deque(maxlen=max_slow)
+        self._active = 0  # Captures in progress on any thread
+        self.captured = 0
+        self.profiled = 0
+        self.slow = 0
+
+    @property
+    def capturing(self):
+        """True if requests may be captured without being forced."""
+        return self.sample_ratio > 0 or self.slow_seconds is not None
+
+    def begin(self, name, force=False):
+        """
+        Start capturing a request on the current thread, if it is selected.
+
+        :param name: str
+            The route or topic kind of the request.
+        :param force: bool
+            Profile the request regardless of the sample ratio (e.g. the profiling header was sent).
+        :return: _Capture or None
+            The capture to pass to `end`; None if the request is not captured.
+        """
+        if not force and not self.capturing:
+            return None
+        if self._local.capture is not None:
+            return None  # Nested requests are part of the enclosing capture
+        profile = force or (self.sample_ratio > 0 and self._random() < self.sample_ratio)
+        if not profile and self.slow_seconds is None:
+            return None
+        capture = _Capture(name, profile)
+        self._local.capture = capture
+        with self._lock:
+            self._active += 1
+        return capture
+
+    def phase(self, name):
+        """
+        Time a phase of the request captured on the current thread.
+
+        :param name: str
+            The phase, e.g. "parse", "validate", "calc", "store" or "publish".
+        :return: context manager
+            A no-op context manager when no request is captured.
+        """
+        if not self._active:
+            return _NO_PHASE
+        capture = self._local.capture
+        if capture is None:
+            return _NO_PHASE
+        return _PhaseTimer(capture, name)
+
+    def end(self, capture):
+        """
+        Finish a capture: merge its profile and phases, and log it if it was slow.
+
+        :param capture: _Capture or None
+            The value returned by `begin`.
+        :return: None
+        """
+        if capture is None:
+            return
+        seconds = time.perf_counter() - capture.started
+        if self._local.capture is capture:
+            self._local.capture = None
+        stats = None
+        if capture.profile is not None:
+            capture.profile.disable()
+            import pstats
+
+            stats = pstats.Stats(capture.profile)
+        slow = self.slow_seconds is not None and seconds >= self.slow_seconds
+        with self._lock:
+            self._active -= 1
+            self.captured += 1
+            for name, elapsed in capture.phases.items():
+                totals = self._phases.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += elapsed
+                totals[2] = max(totals[2], elapsed)
+            if stats is not None:
+                self.profiled += 1
+                if self._stats is None:
+                    self._stats = stats
+                else:
+                    self._stats.add(stats)
+            if slow:
+                self.slow += 1
+                self._slow.append({
+                    "name": capture.name,
+                    "timestamp": time.time(),
+                    "seconds": seconds,
+                    "phases": dict(capture.phases),
+                })
+        if slow and self._log:
+            breakdown = ", ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in capture.phases.items())
+            self._log(f"Slow request {capture.name}: {seconds * 1000:.1f}ms ({breakdown or 'no phases'})")
+
+    def report(self, sort="cumulative", limit=30):
+        """
+        Summarize everything captured so far.
+
+        :param sort: str
+            One of SORT_KEYS: the order of the hot-path functions.
+        :param limit: int
+            Number of functions listed.
+        :return: dict
+            captured, profiled and slow counts; `phases` ({name: count, totalSeconds,
+            meanSeconds, maxSeconds}); `functions` (the hottest functions of the
+            profiled requests); and `slowRequests` (the most recent slow requests).
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        column = {"cumulative": 3, "tottime": 2, "calls": 1}[sort]
+        with self._lock:
+            rows = list(self._stats.stats.items()) if self._stats is not None else []
+            phases = {
+                name: {"count": count, "totalSeconds": total, "meanSeconds": total / count, "maxSeconds": longest}
+                for name, (count, total, longest) in self._phases.items()
+            }
+            slow_requests = list(self._slow)
+            counts = {"captured": self.captured, "profiled": self.profiled, "slow": self.slow}
+        rows.sort(key=lambda row: row[1][column], reverse=True)
+        functions = [
+            {
+                "function": f"{filename}:{line}({function})",
+                "calls": calls,
+                "primitiveCalls": primitive_calls,
+                "totalSeconds": total,
+                "cumulativeSeconds": cumulative,
+            }
+            for (filename, line, function), (primitive_calls, calls, total, cumulative, _) in rows[:limit]
+        ]
+        return {**counts, "phases": phases, "functions": functions, "slowRequests": slow_requests}
+
+    def report_text(self, sort="cumulative", limit=30):
+        """
+        Format the merged profile the way `pstats` prints it.
+
+        :param sort: str
+            One of SORT_KEYS.
+        :param limit: int
+            Number of functions listed.
+        :return: str
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        with self._lock:
+            if self._stats is None:
+                return "No profiled requests\n"
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def reset(self):
+        """
+        Forget everything captured so far.
+
+        :return: None
+        """
+        with self._lock:
+            self._stats = None
+            self._phases.clear()
+            self._slow.clear()
+            self.captured = self.profiled = self.slow = 0
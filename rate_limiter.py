@@ -0,0 +1,98 @@
+"""
+Winter Supplement Rate Limiter
+Author: Liliya
+----------------------------
+This module limits how fast each client may submit records, so one misbehaving
+client cannot fill the result store and the MQTT input topics for everyone else.
+
+Each client has a token bucket refilled at `rate` tokens per second up to `burst`.
+A submission costs one token per record. A request is admitted while the bucket
+holds enough tokens for it (or is full, for requests larger than `burst`); the
+bucket may then go negative, so large batches are paid for by a longer wait.
+Buckets are kept in an LRU of at most `max_clients` entries: each request costs a
+dict lookup and a little arithmetic, and memory does not grow with the number of
+clients ever seen.
+
+Main Classes:
+- TokenBucketLimiter: Per-client token buckets in a bounded LRU.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """
+    Per-client token-bucket rate limiter.
+
+    A client forgotten by the LRU starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, clock=time.monotonic):
+        """
+        :param rate: float
+            Tokens added to each bucket per second.
+        :param burst: float
+            Bucket capacity: the tokens a client may spend at once.
+        :param max_clients: int
+            Buckets kept; the least recently used is forgotten beyond it.
+        :param clock: callable
+            Returns the current time in seconds (overridable for tests).
+        """
+        if rate <= 0 or burst <= 0:
+            raise ValueError("rate and burst must be positive")
+        if max_clients <= 0:
+            raise ValueError("max_clients must be positive")
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # client -> [tokens, time of the last refill]
+        self.admitted = 0
+        self.limited = 0
+
+    def acquire(self, client, cost=1):
+        """
+        Spend `cost` tokens from a client's bucket if the request is admitted.
+
+        :param client: str
+            The client key (e.g. its address or API key).
+        :param cost: float
+            Tokens the request costs, e.g. its number of records.
+        :return: float
+            0.0 if the request is admitted, otherwise the seconds until it would be.
+        """
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            needed = min(cost, self.burst)
+            if bucket[0] >= needed:
+                bucket[0] -= cost
+                self.admitted += 1
+                return 0.0
+            self.limited += 1
+            return (needed - bucket[0]) / self.rate
+
+    def stats(self):
+        """
+        Report limiter counters.
+
+        :return: dict
+            Clients tracked, and requests admitted and limited so far.
+        """
+        with self._lock:
+            return {
+                "clients": len(self._buckets),
+                "admitted": self.admitted,
+                "limited": self.limited,
+            }
@@ -0,0 +1,281 @@
+"""
+Winter Supplement Incremental Recompute
+Author: Liliya
+----------------------------
+This module recalculates a persisted set of family inputs when the rules change,
+touching only the records whose result can differ. Inputs are indexed in SQLite by
+the features the rules depend on, which split them into partitions:
+
+    (familyComposition, numberOfChildren > 0, familyUnitInPayForDecember)
+
+A rule diff maps to the partitions it affects: `childSupplement` and
+`baseAmountWithChildren` only change eligible families with children,
+`baseAmountSingleNoChildren` only eligible single people without children, and so
+on; ineligible families are never affected. Only the affected partitions are read,
+and a delta is emitted for every record whose amounts changed.
+
+Usage:
+    python recompute.py index requests.jsonl --db inputs.db
+    python recompute.py diff --db inputs.db --new rules/2025.json --output deltas.jsonl
+
+Main Classes and Functions:
+- partition_of: The partition of a family input.
+- affected_partitions: The partitions whose results differ between two rule sets.
+- InputSet: The persisted, partitioned input set.
+- recompute: Recalculates the affected partitions and emits the deltas.
+- main: Command-line entry point.
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+
+from records import FAMILY_COMPOSITIONS, decode_family
+from rule_sets import load_rule_set
+from bulk_calculator import detect_format, open_stream, parse_record, read_records
+from supplement_calculator import RULE_TABLE_MAX_CHILDREN, load_configured_rules
+from config import RECOMPUTE_INPUT_SET_PATH
+
+# Rule set attributes and the (composition, has children) partitions they apply to
+RULE_PARTITIONS = {
+    "base_amount_single": [("single", False)],
+    "base_amount_couple": [("couple", False)],
+    "base_amount_with_children": [(composition, True) for composition in FAMILY_COMPOSITIONS],
+    "child_supplement": [(composition, True) for composition in FAMILY_COMPOSITIONS],
+}
+
+
+def partition_of(family):
+    """
+    Map a family input to its partition.
+
+    :param family: FamilyInput
+    :return: tuple
+        (familyComposition, has children, familyUnitInPayForDecember).
+    """
+    return family.family_composition, family.number_of_children > 0, family.family_unit_in_pay
+
+
+def affected_partitions(old_rules, new_rules):
+    """
+    Work out which partitions a rule diff affects.
+
+    :param old_rules: RuleSet
+    :param new_rules: RuleSet
+    :return: list of tuple
+        The affected partitions, in a stable order; ineligible families are never affected.
+    """
+    affected = set()
+    for attribute, partitions in RULE_PARTITIONS.items():
+        if getattr(old_rules, attribute) != getattr(new_rules, attribute):
+            affected.update((composition, has_children, True) for composition, has_children in partitions)
+    return sorted(affected)
+
+
+class InputSet:
+    """
+    Family inputs persisted in SQLite and indexed by partition.
+
+    Adding a record with a known ID replaces it.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str
+            Database file; created if it does not exist.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS inputs ("
+            "id TEXT PRIMARY KEY, family_composition TEXT NOT NULL, number_of_children INTEGER NOT NULL, "
+            "has_children INTEGER NOT NULL, eligible INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS inputs_partition ON inputs (eligible, family_composition, has_children)"
+        )
+        self._connection.commit()
+
+    def add(self, families):
+        """
+        Store family inputs.
+
+        :param families: iterable of FamilyInput
+        :return: int
+            Number of records stored.
+        """
+        rows = [
+            (family.id, family.family_composition, family.number_of_children,
+             family.number_of_children > 0, family.family_unit_in_pay)
+            for family in families
+        ]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO inputs (id, family_composition, number_of_children, has_children, eligible) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def load(self, input_path, input_format=None, chunk_size=1000):
+        """
+        Store the valid records of a JSONL or CSV file (the `bulk_calculator` input formats).
+
+        :param input_path: str
+            Input file ("-" for stdin).
+        :param input_format: str or None
+            Overrides format detection.
+        :param chunk_size: int
+            Records stored per transaction.
+        :return: tuple
+            (records stored, invalid records skipped).
+        """
+        input_format = detect_format(input_path, input_format)
+        stored = rejected = 0
+        chunk = []
+        source = open_stream(input_path, "r")
+        try:
+            for raw in read_records(source, input_format):
+                try:
+                    chunk.append(decode_family(parse_record(raw, input_format)))
+                except ValueError:
+                    rejected += 1
+                if len(chunk) >= chunk_size:
+                    stored += self.add(chunk)
+                    chunk = []
+            stored += self.add(chunk)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        return stored, rejected
+
+    def iter_partition(self, partition):
+        """
+        Read the records of one partition.
+
+        :param partition: tuple
+            (familyComposition, has children, familyUnitInPayForDecember).
+        :return: iterator
+            (id, numberOfChildren) pairs.
+        """
+        composition, has_children, eligible = partition
+        return self._connection.execute(
+            "SELECT id, number_of_children FROM inputs "
+            "WHERE eligible = ? AND family_composition = ? AND has_children = ? ORDER BY id",
+            (eligible, composition, has_children),
+        )
+
+    def partition_counts(self):
+        """
+        Count the records of every partition.
+
+        :return: dict
+            {(familyComposition, has children, familyUnitInPayForDecember): count}.
+        """
+        rows = self._connection.execute(
+            "SELECT family_composition, has_children, eligible, COUNT(*) FROM inputs "
+            "GROUP BY family_composition, has_children, eligible"
+        )
+        return {(composition, bool(has_children), bool(eligible)): count
+                for composition, has_children, eligible, count in rows}
+
+    def __len__(self):
+        return self._connection.execute("SELECT COUNT(*) FROM inputs").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+
+def recompute(input_set, old_rules, new_rules, emit):
+    """
+    Recalculate the records of the partitions affected by a rule change.
+
+    Results only depend on the family composition and number of children within a
+    partition, so each distinct combination is calculated once.
+
+    :param input_set: InputSet
+    :param old_rules: RuleSet
+        The rules the current results were calculated with.
+    :param new_rules: RuleSet
+    :param emit: callable
+        Called with one delta dict per changed record: its id, the new result,
+        `previousRuleVersion` and `supplementAmountChange`.
+    :return: dict
+        affectedPartitions, scanned (records read), skipped (records in unaffected
+        partitions) and changed (deltas emitted).
+    """
+    partitions = affected_partitions(old_rules, new_rules)
+    scanned = changed = 0
+    for partition in partitions:
+        composition = partition[0]
+        deltas = {}  # number of children -> delta fields, or None if unchanged
+        for topic_id, number_of_children in input_set.iter_partition(partition):
+            scanned += 1
+            delta = deltas.get(number_of_children, False)
+            if delta is False:
+                old = old_rules.result(composition, number_of_children)
+                new = new_rules.result(composition, number_of_children)
+                delta = None
+                if (old.base_amount, old.children_amount) != (new.base_amount, new.children_amount):
+                    delta = new.to_dict()
+                    delta["previousRuleVersion"] = old.rule_version
+                    delta["supplementAmountChange"] = new.supplement_amount - old.supplement_amount
+                deltas[number_of_children] = delta
+            if delta is not None:
+                emit({"id": topic_id, **delta})
+                changed += 1
+    return {
+        "affectedPartitions": [list(partition) for partition in partitions],
+        "scanned": scanned,
+        "skipped": len(input_set) - scanned,
+        "changed": changed,
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    :param argv: list of str or None
+        Arguments (defaults to sys.argv).
+    :return: int
+        Process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Recalculate only the records affected by a rule change.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    index_parser = subparsers.add_parser("index", help="Add the records of a JSONL or CSV file to the input set")
+    index_parser.add_argument("input", help="Input file (.jsonl or .csv), or - for stdin")
+    index_parser.add_argument("--input-format", choices=["jsonl", "csv"], help="Override input format detection")
+    diff_parser = subparsers.add_parser("diff", help="Emit the deltas between two rule sets")
+    diff_parser.add_argument("--old", help="Rule-set file of the current results (default: the configured rules)")
+    diff_parser.add_argument("--new", required=True, help="Rule-set file to recalculate with")
+    diff_parser.add_argument("--output", default="-", help="JSONL file receiving the deltas, or - for stdout")
+    for subparser in (index_parser, diff_parser):
+        subparser.add_argument("--db", default=RECOMPUTE_INPUT_SET_PATH, help="Input set database")
+    args = parser.parse_args(argv)
+
+    input_set = InputSet(args.db)
+    try:
+        if args.command == "index":
+            stored, rejected = input_set.load(args.input, args.input_format)
+            sys.stderr.write(f"Stored {stored} records ({rejected} invalid) in {args.db}\n")
+            return 0
+
+        old_rules = load_rule_set(args.old, RULE_TABLE_MAX_CHILDREN) if args.old else load_configured_rules()
+        new_rules = load_rule_set(args.new, RULE_TABLE_MAX_CHILDREN)
+        sink = open_stream(args.output, "w")
+        try:
+            stats = recompute(input_set, old_rules, new_rules, lambda delta: sink.write(json.dumps(delta) + "\n"))
+        finally:
+            if sink is not sys.stdout:
+                sink.close()
+        sys.stderr.write(json.dumps(stats) + "\n")
+        return 0
+    finally:
+        input_set.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
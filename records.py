@@ -0,0 +1,137 @@
+"""
+Winter Supplement Records
+Author: Liliya
+----------------------------
+This module defines compact, typed records for family inputs and supplement results,
+and the schema-driven validator shared by the Flask API, the MQTT handlers, the
+calculator and the bulk paths. Records use `__slots__`, so they carry no per-instance
+`__dict__`.
+
+Main Classes and Functions:
+- FamilyInput: A validated family record.
+- SupplementResult: An immutable calculation result.
+- ValidationError: Raised when a record does not match the schema.
+- is_topic_id: Checks that a value is a valid topic ID.
+- decode_family: Parses and validates a submitted dict in one pass.
+"""
+
+from dataclasses import dataclass
+
+FAMILY_COMPOSITIONS = ("single", "couple")
+
+
+class ValidationError(ValueError):
+    """Raised when a submitted record does not match the family input schema."""
+
+
+@dataclass
+class FamilyInput:
+    """A validated family record."""
+
+    __slots__ = ("id", "family_composition", "number_of_children", "family_unit_in_pay")
+    id: str
+    family_composition: str
+    number_of_children: int
+    family_unit_in_pay: bool
+
+    def to_dict(self):
+        """
+        Convert the record back to the submitted JSON shape.
+
+        :return: dict
+        """
+        data = {
+            "numberOfChildren": self.number_of_children,
+            "familyComposition": self.family_composition,
+            "familyUnitInPayForDecember": self.family_unit_in_pay,
+        }
+        if self.id is not None:
+            data["id"] = self.id
+        return data
+
+
+@dataclass(frozen=True)
+class SupplementResult:
+    """An immutable supplement calculation result; instances can be shared safely."""
+
+    __slots__ = ("is_eligible", "base_amount", "children_amount", "supplement_amount", "rule_version")
+    is_eligible: bool
+    base_amount: float
+    children_amount: float
+    supplement_amount: float
+    rule_version: str
+
+    def to_dict(self):
+        """
+        Convert the result to the published JSON shape.
+
+        :return: dict
+            isEligible, baseAmount, childrenAmount, supplementAmount and ruleVersion
+            (the version of the rules that calculated it).
+        """
+        return {
+            "isEligible": self.is_eligible,
+            "baseAmount": self.base_amount,
+            "childrenAmount": self.children_amount,
+            "supplementAmount": self.supplement_amount,
+            "ruleVersion": self.rule_version,
+        }
+
+
+def _is_non_negative_int(value):
+    return isinstance(value, int) and value >= 0
+
+
+# Characters that would change the meaning of the MQTT topic a topic ID is appended to
+_TOPIC_ID_FORBIDDEN = frozenset("/+#\0")
+
+
+def is_topic_id(value):
+    """
+    Check that a value can be used as a topic ID: a non-empty string that is a single
+    MQTT topic level (no "/", no "+" or "#" wildcards, no NUL).
+
+    :param value: object
+    :return: bool
+    """
+    return isinstance(value, str) and value != "" and _TOPIC_ID_FORBIDDEN.isdisjoint(value)
+
+
+# The family input schema: (JSON key, check, error message), in validation order
+FAMILY_SCHEMA = (
+    ("id", is_topic_id, "Topic ID is required"),
+    ("familyComposition", FAMILY_COMPOSITIONS.__contains__, "Invalid familyComposition"),
+    ("numberOfChildren", _is_non_negative_int, "Invalid numberOfChildren"),
+    ("familyUnitInPayForDecember", lambda value: isinstance(value, bool), "Invalid familyUnitInPayForDecember"),
+)
+
+
+def decode_family(data, require_id=True):
+    """
+    Parse and validate a submitted family record in one pass.
+
+    :param data: dict
+        The submitted record.
+    :param require_id: bool
+        Whether the record must carry its own `id` (MQTT input messages take the
+        topic ID from the topic instead); an `id` that is present must still be valid.
+    :return: FamilyInput
+    :raises ValidationError:
+        With the error message of the first invalid field.
+    """
+    if not isinstance(data, dict):
+        raise ValidationError("Invalid record")
+    values = []
+    for key, check, message in FAMILY_SCHEMA:
+        value = data.get(key)
+        if key == "id" and not require_id and value in (None, ""):
+            values.append(None)
+            continue
+        try:
+            valid = check(value)
+        except TypeError:
+            valid = False
+        if not valid:
+            raise ValidationError(message)
+        values.append(value)
+    return FamilyInput(*values)
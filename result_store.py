@@ -0,0 +1,740 @@
+"""
+Winter Supplement Result Store
+Author: Liliya
+----------------------------
+This module stores calculation results keyed by MQTT topic ID behind a small,
+pluggable interface so the Flask API does not depend on a particular backend.
+The SQLite and Redis stores are shared between processes, so any HTTP worker can
+answer `/result/<topic_id>` for a result stored by another.
+
+Main Classes and Functions:
+- ResultStore: The interface every result store implements.
+- InMemoryResultStore: A bounded LRU store with a per-entry time-to-live.
+- SQLiteResultStore: A store shared by the processes of one host (SQLite in WAL mode).
+- RedisResultStore: A store shared across hosts (requires the redis package).
+- AsyncResultStore: An asyncio wrapper that lets coroutines wait for a result.
+- create_result_store: Builds the store selected in the configuration.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import codec
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Sentinels returned by `ResultStore.lookup`
+MISSING = object()  # The topic ID has never been stored (or was evicted)
+EXPIRED = object()  # The topic ID was stored but its time-to-live has passed
+
+
+def is_pending(value):
+    """
+    Check whether a stored value is the placeholder written by `/submit`.
+
+    :param value: dict or sentinel
+        A value returned by `ResultStore.lookup`.
+    :return: bool
+    """
+    return isinstance(value, dict) and value.get("status") == "pending"
+
+
+class ResultStore:
+    """
+    Interface for result stores.
+
+    Subclasses implement `set`, `lookup` and `stats`; the mapping helpers below are
+    built on top of them so a store can be used like the original `results` dict.
+    """
+
+    def set(self, key, value):
+        """
+        Store a value for a topic ID.
+
+        :param key: str
+            The topic ID.
+        :param value: dict
+            The result (or pending placeholder) to store.
+        :return: None
+        """
+        raise NotImplementedError
+
+    def lookup(self, key):
+        """
+        Look up a topic ID.
+
+        :param key: str
+            The topic ID.
+        :return: dict or sentinel
+            The stored value, `EXPIRED` if its time-to-live has passed, or `MISSING`.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Report store counters.
+
+        :return: dict
+            Counters such as hits, misses, evictions and the current size.
+        """
+        raise NotImplementedError
+
+    def pending_count(self):
+        """
+        Count the pending placeholders awaiting a result, in constant time.
+
+        Placeholders older than the store's `pending_timeout` are assumed lost and not
+        counted. Shared stores count the placeholders written by this process.
+
+        :return: int
+        """
+        raise NotImplementedError
+
+    def wait_for(self, key, timeout):
+        """
+        Wait until a result (not a pending placeholder) is stored for a topic ID.
+
+        Stores without change notification return immediately.
+
+        :param key: str
+            The topic ID.
+        :param timeout: float
+            Maximum seconds to wait.
+        :return: dict or sentinel
+            The same values as `lookup`, after the result arrived or the timeout expired.
+        """
+        return self.lookup(key)
+
+    def close(self):
+        """
+        Release the resources of the store, committing any buffered writes.
+
+        :return: None
+        """
+
+    def get(self, key, default=None):
+        value = self.lookup(key)
+        if value is MISSING or value is EXPIRED:
+            return default
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        value = self.lookup(key)
+        if value is MISSING or value is EXPIRED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        value = self.lookup(key)
+        return value is not MISSING and value is not EXPIRED
+
+
+class _PendingTracker:
+    """
+    Pending placeholders in the order they were stored, so the number still awaiting a
+    result is known without scanning the store. Callers hold the store lock.
+    """
+
+    def __init__(self, timeout=None, max_entries=100000):
+        """
+        :param timeout: float or None
+            Seconds after which a placeholder is no longer counted.
+        :param max_entries: int
+            Placeholders tracked; the oldest are forgotten beyond it.
+        """
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._started = OrderedDict()  # topic ID -> time its placeholder was stored
+
+    def update(self, key, value, now):
+        if is_pending(value):
+            self._started[key] = now
+            self._started.move_to_end(key)
+            if len(self._started) > self.max_entries:
+                self._started.popitem(last=False)
+        else:
+            self._started.pop(key, None)
+
+    def discard(self, key):
+        self._started.pop(key, None)
+
+    def count(self, now):
+        started = self._started
+        if self.timeout is not None:
+            while started:
+                key = next(iter(started))
+                if now - started[key] < self.timeout:
+                    break
+                del started[key]
+        return len(started)
+
+
+class _Entry:
+    """A stored value and the monotonic time after which it expires."""
+
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value, expires_at):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class InMemoryResultStore(ResultStore):
+    """
+    Process-local result store bounded by entry count and time-to-live.
+
+    Least recently used entries are evicted once `max_entries` is reached. Expired
+    entries are detected lazily on lookup; their value is released immediately but
+    the key is kept (until evicted) so lookups can report `EXPIRED` rather than `MISSING`.
+    Threads blocked in `wait_for` share one event per topic ID, set when its result is stored.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, pending_timeout=None, clock=time.monotonic):
+        """
+        :param max_entries: int
+            Maximum number of entries kept before the least recently used is evicted.
+        :param ttl_seconds: float or None
+            Time-to-live of each entry; None disables expiry.
+        :param pending_timeout: float or None
+            Seconds after which a pending placeholder is no longer counted by
+            `pending_count`; defaults to `ttl_seconds`.
+        :param clock: callable
+            Returns the current time in seconds (overridable for tests).
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._waiters = {}  # topic ID -> [threading.Event, number of waiting threads]
+        self._pending = _PendingTracker(pending_timeout or ttl_seconds, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def set(self, key, value):
+        now = self._clock()
+        expires_at = None if self.ttl_seconds is None else now + self.ttl_seconds
+        with self._lock:
+            entries = self._entries
+            if key in entries:
+                entries.move_to_end(key)
+            elif len(entries) >= self.max_entries:
+                evicted, _ = entries.popitem(last=False)
+                self._pending.discard(evicted)
+                self.evictions += 1
+            entries[key] = _Entry(value, expires_at)
+            self._pending.update(key, value, now)
+            waiter = None if is_pending(value) else self._waiters.pop(key, None)
+        if waiter is not None:
+            waiter[0].set()
+
+    def lookup(self, key):
+        with self._lock:
+            return self._lookup_locked(key)
+
+    def wait_for(self, key, timeout):
+        with self._lock:
+            value = self._lookup_locked(key)
+            if timeout <= 0 or not (value is MISSING or is_pending(value)):
+                return value
+            waiter = self._waiters.get(key)
+            if waiter is None:
+                waiter = self._waiters[key] = [threading.Event(), 0]
+            waiter[1] += 1
+        waiter[0].wait(timeout)
+        with self._lock:
+            waiter[1] -= 1
+            if waiter[1] == 0 and self._waiters.get(key) is waiter:
+                del self._waiters[key]
+            return self._lookup_locked(key)
+
+    def _lookup_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if entry.value is EXPIRED:
+            self.misses += 1
+            return EXPIRED
+        if entry.expires_at is not None and self._clock() >= entry.expires_at:
+            entry.value = EXPIRED
+            self._pending.discard(key)
+            self.expirations += 1
+            self.misses += 1
+            return EXPIRED
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "waiters": sum(waiter[1] for waiter in self._waiters.values()),
+                "pending": self._pending.count(self._clock()),
+            }
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending.count(self._clock())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _BatchedResultStore(ResultStore):
+    """
+    Base class of the stores shared between processes.
+
+    Writes are buffered and committed by a background thread in batches of up to
+    `batch_size`, at least every `flush_interval` seconds, so a burst of results from
+    the MQTT workers costs one transaction instead of one per result. Lookups in the
+    writing process see buffered values immediately; other processes see them after
+    the next flush. `wait_for` is woken by local writes and polls the backend every
+    `poll_interval` seconds for writes made by other processes.
+
+    Subclasses implement `_read`, `_write_batch` and `_size`.
+    """
+
+    def __init__(self, ttl_seconds=3600, batch_size=500, flush_interval=0.005, poll_interval=0.05,
+                 pending_timeout=None, clock=time.time):
+        """
+        :param ttl_seconds: float or None
+            Time-to-live of each entry; None disables expiry.
+        :param batch_size: int
+            Buffered writes that trigger an immediate flush.
+        :param flush_interval: float
+            Maximum seconds a write stays buffered.
+        :param poll_interval: float
+            Seconds between backend lookups while waiting for a result.
+        :param pending_timeout: float or None
+            Seconds after which a pending placeholder written by this process is no longer
+            counted by `pending_count`; defaults to `ttl_seconds`.
+        :param clock: callable
+            Returns the current wall-clock time in seconds, shared by all processes.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Commits batches one at a time, in order
+        self._changed = threading.Condition(self._lock)
+        self._buffer = {}  # topic ID -> (value, expires_at), not yet handed to the writer
+        self._flushing = {}  # the batch being committed by the writer
+        self._wake = threading.Event()
+        self._writer = None
+        self._closed = False
+        self._waiting = 0
+        self._pending = _PendingTracker(pending_timeout or ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.flushes = 0
+        self.writes = 0
+
+    def _read(self, key):
+        """
+        Read a committed entry.
+
+        :param key: str
+        :return: tuple or None
+            (value, expires_at), or None if the key is not stored.
+        """
+        raise NotImplementedError
+
+    def _write_batch(self, items):
+        """
+        Commit a batch of entries.
+
+        :param items: list of tuple
+            (key, value, expires_at) for every entry.
+        :return: None
+        """
+        raise NotImplementedError
+
+    def _size(self):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        now = self._clock()
+        expires_at = None if self.ttl_seconds is None else now + self.ttl_seconds
+        with self._lock:
+            self._buffer[key] = (value, expires_at)
+            self._pending.update(key, value, now)
+            if self._writer is None and not self._closed:
+                self._writer = threading.Thread(target=self._write_loop, name="result-store-writer", daemon=True)
+                self._writer.start()
+            if not is_pending(value):
+                self._changed.notify_all()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def lookup(self, key):
+        with self._lock:
+            entry = self._buffer.get(key) or self._flushing.get(key)
+        if entry is None:
+            entry = self._read(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                self.expirations += 1
+                self.misses += 1
+                return EXPIRED
+            self.hits += 1
+            return value
+
+    def wait_for(self, key, timeout):
+        deadline = time.monotonic() + timeout
+        value = self.lookup(key)
+        while value is MISSING or is_pending(value):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._lock:
+                self._waiting += 1
+                self._changed.wait(min(remaining, self.poll_interval))
+                self._waiting -= 1
+            value = self.lookup(key)
+        return value
+
+    def flush(self):
+        """
+        Commit every buffered write now.
+
+        :return: None
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, {}
+                self._flushing = batch
+            if not batch:
+                return
+            try:
+                self._write_batch([(key, value, expires_at) for key, (value, expires_at) in batch.items()])
+            finally:
+                with self._lock:
+                    self._flushing = {}
+                    self.flushes += 1
+                    self.writes += len(batch)
+
+    def close(self):
+        """
+        Stop the writer after committing the buffered writes.
+
+        :return: None
+        """
+        with self._lock:
+            self._closed = True
+            writer, self._writer = self._writer, None
+        self._wake.set()
+        if writer is not None:
+            writer.join()
+        self.flush()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing results: {e}")
+            if self._closed:
+                return
+
+    def stats(self):
+        size = self._size()
+        with self._lock:
+            return {
+                "size": size,
+                "buffered": len(self._buffer) + len(self._flushing),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": 0,
+                "expirations": self.expirations,
+                "waiters": self._waiting,
+                "flushes": self.flushes,
+                "writes": self.writes,
+                "pending": self._pending.count(self._clock()),
+            }
+
+    def pending_count(self):
+        with self._lock:
+            return self._pending.count(self._clock())
+
+
+class SQLiteResultStore(_BatchedResultStore):
+    """
+    Result store in a SQLite database in WAL mode, shared by every process on the host.
+
+    WAL lets readers proceed while the writer commits. Each thread keeps its own
+    connection, reused for the lifetime of the thread. Beyond `max_entries`, the
+    least recently written entries are deleted, at most every `prune_interval` seconds.
+    """
+
+    def __init__(self, path, max_entries=100000, ttl_seconds=3600, prune_interval=1.0, **kwargs):
+        """
+        :param path: str
+            Database file; created if it does not exist.
+        :param max_entries: int
+            Maximum number of entries kept.
+        :param ttl_seconds: float or None
+            Time-to-live of each entry; None disables expiry.
+        :param prune_interval: float
+            Minimum seconds between deletions of the entries beyond `max_entries`.
+        :param kwargs:
+            Batching options of `_BatchedResultStore`.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        super().__init__(ttl_seconds=ttl_seconds, **kwargs)
+        self.path = path
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self.evictions = 0
+        self._next_prune = 0.0
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL, written_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS results_written_at ON results (written_at)")
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level="DEFERRED")
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _read(self, key):
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return codec.loads(row[0]), row[1]
+
+    def _write_batch(self, items):
+        connection = self._connection()
+        now = self._clock()
+        evicted = 0
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO results (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)",
+                [(key, codec.dumps(value), expires_at, now) for key, value, expires_at in items],
+            )
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self.prune_interval
+                evicted = connection.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY written_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+        if evicted > 0:
+            with self._lock:
+                self.evictions += evicted
+
+    def _size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats["maxEntries"] = self.max_entries
+        stats["evictions"] = self.evictions
+        return stats
+
+
+class RedisResultStore(_BatchedResultStore):
+    """
+    Result store in Redis (or a Redis-compatible server), shared by every process and host.
+
+    Connections come from a `redis.ConnectionPool` and each flush is one pipeline.
+    Redis evicts entries itself (configure `maxmemory-policy`); expired entries are
+    kept for one further time-to-live so lookups can report `EXPIRED`. The size is
+    read from a sorted set indexing every key by the time Redis deletes it, so it
+    costs no scan of the keyspace; entries evicted by `maxmemory-policy` before then
+    are still counted. Requires the `redis` package.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", ttl_seconds=3600, prefix="supplement:result:",
+                 max_connections=16, index_key=None, **kwargs):
+        """
+        :param url: str
+            Redis URL.
+        :param ttl_seconds: float or None
+            Time-to-live of each entry; None disables expiry.
+        :param prefix: str
+            Prefix of the Redis keys.
+        :param max_connections: int
+            Size of the connection pool.
+        :param index_key: str or None
+            Key of the sorted set counting the entries; defaults to the prefix with "-index"
+            in place of its trailing ":" (outside the namespace of the entries).
+        :param kwargs:
+            Batching options of `_BatchedResultStore`.
+        """
+        if redis is None:
+            raise RuntimeError("RedisResultStore requires the redis package")
+        super().__init__(ttl_seconds=ttl_seconds, **kwargs)
+        self.prefix = prefix
+        self.index_key = index_key or prefix.rstrip(":") + "-index"
+        self.pool = redis.ConnectionPool.from_url(url, max_connections=max_connections)
+        self._redis = redis.Redis(connection_pool=self.pool)
+
+    def _read(self, key):
+        data = self._redis.get(self.prefix + key)
+        if data is None:
+            return None
+        entry = codec.loads(data)
+        return entry["value"], entry["expiresAt"]
+
+    def _write_batch(self, items):
+        pipeline = self._redis.pipeline(transaction=False)
+        deleted_at = "+inf" if self.ttl_seconds is None else self._clock() + self.ttl_seconds * 2
+        for key, value, expires_at in items:
+            data = codec.dumps({"value": value, "expiresAt": expires_at})
+            if self.ttl_seconds is None:
+                pipeline.set(self.prefix + key, data)
+            else:
+                pipeline.set(self.prefix + key, data, px=int(self.ttl_seconds * 2000))
+        pipeline.zadd(self.index_key, {key: deleted_at for key, _, _ in items})
+        pipeline.execute()
+
+    def _size(self):
+        # Drop the keys Redis has deleted since, then count the rest: O(log n + removed)
+        pipeline = self._redis.pipeline(transaction=False)
+        pipeline.zremrangebyscore(self.index_key, "-inf", self._clock())
+        pipeline.zcard(self.index_key)
+        return pipeline.execute()[1]
+
+
+def create_result_store(backend="memory", max_entries=100000, ttl_seconds=3600, path="results.db",
+                        redis_url="redis://localhost:6379/0", pending_timeout=None):
+    """
+    Build the result store selected in the configuration.
+
+    :param backend: str
+        "memory" (process-local), "sqlite" or "redis" (shared between processes).
+    :param max_entries: int
+        Maximum number of entries kept (Redis evicts by its own memory policy).
+    :param ttl_seconds: float or None
+        Time-to-live of each entry.
+    :param path: str
+        Database file of the "sqlite" backend.
+    :param redis_url: str
+        Server URL of the "redis" backend.
+    :param pending_timeout: float or None
+        Seconds after which a pending placeholder is no longer counted as in flight.
+    :return: ResultStore
+    :raises ValueError:
+        If the backend is unknown.
+    """
+    if backend == "memory":
+        return InMemoryResultStore(max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                   pending_timeout=pending_timeout)
+    if backend == "sqlite":
+        return SQLiteResultStore(path, max_entries=max_entries, ttl_seconds=ttl_seconds,
+                                 pending_timeout=pending_timeout)
+    if backend == "redis":
+        return RedisResultStore(redis_url, ttl_seconds=ttl_seconds, pending_timeout=pending_timeout)
+    raise ValueError(f"Unknown result store backend: {backend}")
+
+
+class AsyncResultStore:
+    """
+    Asyncio front end for a result store.
+
+    Waiting for a result costs one future per waiting coroutine instead of a thread.
+    All methods must be called from the event loop that owns the waiters.
+    """
+
+    def __init__(self, store):
+        """
+        :param store: ResultStore
+            The underlying store; lookups and writes must not block.
+        """
+        self.store = store
+        self._waiters = {}
+
+    def set(self, key, value):
+        """
+        Store a value and wake the coroutines waiting for it unless it is pending.
+
+        :param key: str
+            The topic ID.
+        :param value: dict
+            The result (or pending placeholder) to store.
+        :return: None
+        """
+        self.store.set(key, value)
+        if not is_pending(value):
+            for waiter in self._waiters.pop(key, ()):
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def lookup(self, key):
+        return self.store.lookup(key)
+
+    def pending_count(self):
+        return self.store.pending_count()
+
+    def stats(self):
+        stats = self.store.stats()
+        stats["waiters"] = stats.get("waiters", 0) + sum(len(waiters) for waiters in self._waiters.values())
+        return stats
+
+    async def wait_for(self, key, timeout):
+        """
+        Wait until a result is stored for a topic ID or the timeout expires.
+
+        :param key: str
+            The topic ID.
+        :param timeout: float
+            Maximum seconds to wait.
+        :return: dict or sentinel
+            The same values as `lookup`, after the result arrived or the timeout expired.
+        """
+        value = self.store.lookup(key)
+        if timeout <= 0 or not (value is MISSING or is_pending(value)):
+            return value
+        waiter = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(key, set())
+        waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters.discard(waiter)
+            if not waiters and self._waiters.get(key) is waiters:
+                del self._waiters[key]
+        return self.store.lookup(key)
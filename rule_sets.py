@@ -0,0 +1,260 @@
+"""
+Winter Supplement Rule Sets
+Author: Liliya
+----------------------------
+This module loads the supplement amounts from versioned rule-set files, one per
+benefit year, and compiles them into immutable `RuleSet` objects. A rule-set file
+is a JSON object:
+
+    {
+        "version": "2024.1",
+        "benefitYear": 2024,
+        "baseAmountSingleNoChildren": 60.0,
+        "baseAmountCoupleNoChildren": 120.0,
+        "baseAmountWithChildren": 120.0,
+        "childSupplement": 20.0
+    }
+
+Files are named `<benefit year>.json` and kept in one directory (RULE_SET_DIRECTORY).
+A compiled rule set never changes, so a calculation that holds one sees the same
+amounts from start to end, whatever is loaded meanwhile.
+
+Main Classes and Functions:
+- RuleSetError: Raised when a rule-set file is missing or invalid.
+- RuleSet: The compiled, immutable rules of one version.
+- parse_rule_set: Validates a rule-set object and compiles it.
+- find_rule_set: The rule-set file of a benefit year (the latest by default).
+- load_rule_set: Reads and compiles a rule-set file.
+"""
+
+import json
+import os
+from types import MappingProxyType
+
+from records import FAMILY_COMPOSITIONS, SupplementResult
+
+# Rule-set fields and the RuleSet attribute each one sets
+AMOUNT_FIELDS = {
+    "baseAmountSingleNoChildren": "base_amount_single",
+    "baseAmountCoupleNoChildren": "base_amount_couple",
+    "baseAmountWithChildren": "base_amount_with_children",
+    "childSupplement": "child_supplement",
+}
+
+
+class RuleSetError(ValueError):
+    """Raised when a rule-set file is missing or does not match the rule-set format."""
+
+
+class RuleSet:
+    """
+    The compiled rules of one version.
+
+    Results for up to `max_children` children are precomputed into a lookup table of
+    shared `SupplementResult` objects tagged with the version; larger families use
+    the formulas. Attributes cannot be changed after construction.
+    """
+
+    __slots__ = ("version", "benefit_year", "base_amount_single", "base_amount_couple",
+                 "base_amount_with_children", "child_supplement", "table", "ineligible", "_arrays")
+
+    def __init__(self, version, benefit_year, base_amount_single, base_amount_couple,
+                 base_amount_with_children, child_supplement, max_children=20):
+        """
+        :param version: str
+            Version tag copied into every result.
+        :param benefit_year: int or None
+        :param base_amount_single: float
+            Single person with no children.
+        :param base_amount_couple: float
+            Childless couple.
+        :param base_amount_with_children: float
+            Base amount for families with dependent children.
+        :param child_supplement: float
+            Supplement amount per dependent child.
+        :param max_children: int
+            The largest number of children in the lookup table; -1 disables the table.
+        """
+        for name, value in (
+            ("version", version),
+            ("benefit_year", benefit_year),
+            ("base_amount_single", float(base_amount_single)),
+            ("base_amount_couple", float(base_amount_couple)),
+            ("base_amount_with_children", float(base_amount_with_children)),
+            ("child_supplement", float(child_supplement)),
+            ("ineligible", SupplementResult(False, 0.0, 0.0, 0.0, version)),
+            ("_arrays", None),
+        ):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "table", MappingProxyType({
+            (family_composition, number_of_children): SupplementResult(
+                True, *self.amounts(family_composition, number_of_children), version
+            )
+            for family_composition in FAMILY_COMPOSITIONS
+            for number_of_children in range(max_children + 1)
+        }))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("RuleSet is immutable")
+
+    def __repr__(self):
+        return f"RuleSet(version={self.version!r}, benefit_year={self.benefit_year!r})"
+
+    def base_amount(self, family_composition, number_of_children):
+        """
+        Calculate the base amount based on family composition and number of children.
+
+        :param family_composition: str
+        :param number_of_children: int
+        :return: float
+        :raises ValueError:
+            If the family composition is invalid.
+        """
+        if number_of_children == 0:
+            if family_composition == "single":
+                return self.base_amount_single
+            elif family_composition == "couple":
+                return self.base_amount_couple
+            else:
+                raise ValueError("Invalid family composition")
+        return self.base_amount_with_children
+
+    def amounts(self, family_composition, number_of_children):
+        """
+        Calculate the amounts for an eligible family using the formulas.
+
+        :param family_composition: str
+        :param number_of_children: int
+        :return: tuple
+            (base amount, children amount, total amount).
+        :raises ValueError:
+            If the family composition is invalid.
+        """
+        base_amount = self.base_amount(family_composition, number_of_children)
+        children_amount = number_of_children * self.child_supplement if number_of_children > 0 else 0.0
+        return base_amount, children_amount, base_amount + children_amount
+
+    def result(self, family_composition, number_of_children):
+        """
+        Look up (or calculate) the result of an eligible family.
+
+        :param family_composition: str
+        :param number_of_children: int
+        :return: SupplementResult
+        """
+        result = self.table.get((family_composition, number_of_children))
+        if result is None:
+            result = SupplementResult(True, *self.amounts(family_composition, number_of_children), self.version)
+        return result
+
+    def arrays(self):
+        """
+        Return the lookup table as NumPy arrays for the batch calculator (built on first use).
+
+        :return: tuple
+            (base amounts, children amounts), each indexed by
+            [index in FAMILY_COMPOSITIONS, number of children].
+        """
+        if self._arrays is None:
+            import numpy as np
+
+            max_children = max((key[1] for key in self.table), default=-1)
+            base_table = np.zeros((len(FAMILY_COMPOSITIONS), max_children + 1))
+            children_table = np.zeros_like(base_table)
+            for (family_composition, number_of_children), result in self.table.items():
+                row = FAMILY_COMPOSITIONS.index(family_composition)
+                base_table[row, number_of_children] = result.base_amount
+                children_table[row, number_of_children] = result.children_amount
+            base_table.flags.writeable = False
+            children_table.flags.writeable = False
+            object.__setattr__(self, "_arrays", (base_table, children_table))
+        return self._arrays
+
+    def to_dict(self):
+        """
+        Convert the rules to the rule-set file format.
+
+        :return: dict
+        """
+        data = {"version": self.version, "benefitYear": self.benefit_year}
+        for field, attribute in AMOUNT_FIELDS.items():
+            data[field] = getattr(self, attribute)
+        return data
+
+
+def _is_amount(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+
+def parse_rule_set(data, max_children=20):
+    """
+    Validate a rule-set object and compile it.
+
+    :param data: dict
+        A parsed rule-set file.
+    :param max_children: int
+        The largest number of children in the lookup table.
+    :return: RuleSet
+    :raises RuleSetError:
+        If a field is missing or invalid.
+    """
+    if not isinstance(data, dict):
+        raise RuleSetError("A rule set must be a JSON object")
+    version = data.get("version")
+    if not isinstance(version, str) or not version:
+        raise RuleSetError("Invalid version")
+    benefit_year = data.get("benefitYear")
+    if not isinstance(benefit_year, int) or isinstance(benefit_year, bool):
+        raise RuleSetError("Invalid benefitYear")
+    amounts = {}
+    for field, attribute in AMOUNT_FIELDS.items():
+        if not _is_amount(data.get(field)):
+            raise RuleSetError(f"Invalid {field}")
+        amounts[attribute] = data[field]
+    return RuleSet(version, benefit_year, max_children=max_children, **amounts)
+
+
+def find_rule_set(directory, benefit_year=None):
+    """
+    Find the rule-set file of a benefit year.
+
+    :param directory: str
+        Directory of `<benefit year>.json` files.
+    :param benefit_year: int or None
+        The benefit year; None selects the latest year in the directory.
+    :return: str
+        Path of the rule-set file.
+    :raises RuleSetError:
+        If there is no file for the year.
+    """
+    if benefit_year is not None:
+        path = os.path.join(directory, f"{benefit_year}.json")
+        if not os.path.isfile(path):
+            raise RuleSetError(f"No rule set for benefit year {benefit_year} in {directory}")
+        return path
+    try:
+        years = [int(name[:-5]) for name in os.listdir(directory) if name.endswith(".json") and name[:-5].isdigit()]
+    except FileNotFoundError:
+        years = []
+    if not years:
+        raise RuleSetError(f"No rule sets in {directory}")
+    return os.path.join(directory, f"{max(years)}.json")
+
+
+def load_rule_set(path, max_children=20):
+    """
+    Read and compile a rule-set file.
+
+    :param path: str
+    :param max_children: int
+        The largest number of children in the lookup table.
+    :return: RuleSet
+    :raises RuleSetError:
+        If the file cannot be read or is invalid.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RuleSetError(f"Cannot read rule set {path}: {e}") from e
+    return parse_rule_set(data, max_children)
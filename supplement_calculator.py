@@ -10,17 +10,166 @@ Key Rules:
 2. Childless couples get $120 per year.
 3. Families with children get $120 base plus $20 per child.
 
+The amounts come from the active `RuleSet`, loaded on first use from the rule-set file
+of RULE_SET_BENEFIT_YEAR (see `rule_sets.py`), or compiled from the constants below when
+there is none. `reload_rules` compiles a new rule set and swaps it in with a single
+assignment: calculations never wait for a reload, and each one uses the rule set it
+started with. Every result carries the `ruleVersion` that calculated it.
+
 Main Functions:
 - calculate_base_amount: Determines the base amount.
 - calculate_children_amount: Calculates the child supplement.
+- calculate: Computes the result for a validated `FamilyInput` record.
 - calculate_supplement: Computes the total amount.
+- calculate_supplement_batch: Computes the total amounts for columnar (NumPy) inputs.
+- current_rules / install_rules / reload_rules: Read, swap and reload the active rule set.
+- rebuild_rule_table: Recompiles the active rules with another table size, or after the constants change.
+- validate_input: Checks a submitted family record before it is calculated.
 """
 
-# Business Logic Constants
+import os
+import threading
+
+from records import FAMILY_COMPOSITIONS, ValidationError, decode_family
+from rule_sets import RuleSet, RuleSetError, find_rule_set, load_rule_set, parse_rule_set
+from config import RULE_SET_DIRECTORY, RULE_SET_BENEFIT_YEAR
+
+# Business Logic Constants, used when no rule-set file exists
 BASE_AMOUNT_SINGLE_NO_CHILDREN = 60.0  # Single person with no children
 BASE_AMOUNT_COUPLE_NO_CHILDREN = 120.0  # Childless couple
 BASE_AMOUNT_WITH_CHILDREN = 120.0  # Base amount for families with dependent children
 CHILD_SUPPLEMENT = 20.0  # Supplement amount per dependent child
+BUILTIN_RULE_VERSION = "builtin"  # Version of the rules compiled from the constants above
+
+# Rule table configuration
+RULE_TABLE_MAX_CHILDREN = 20  # Families with more children fall back to the formula
+
+def validate_input(data):
+    """
+    Validate a submitted family record.
+
+    :param data: dict
+        The submitted record containing id, familyComposition, numberOfChildren
+        and familyUnitInPayForDecember.
+    :return: str or None
+        The error message for the first invalid field, or None if the record is valid.
+    """
+    try:
+        decode_family(data)
+    except ValidationError as e:
+        return str(e)
+    return None
+
+def rule_set_directory():
+    """
+    Resolve RULE_SET_DIRECTORY, relative to this module unless it is absolute.
+
+    :return: str
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), RULE_SET_DIRECTORY)
+
+def builtin_rules(max_children=RULE_TABLE_MAX_CHILDREN):
+    """
+    Compile the rules from the business logic constants.
+
+    :param max_children: int
+        The largest number of children in the lookup table; -1 disables the table.
+    :return: RuleSet
+    """
+    return RuleSet(
+        BUILTIN_RULE_VERSION, None, BASE_AMOUNT_SINGLE_NO_CHILDREN, BASE_AMOUNT_COUPLE_NO_CHILDREN,
+        BASE_AMOUNT_WITH_CHILDREN, CHILD_SUPPLEMENT, max_children,
+    )
+
+def load_configured_rules():
+    """
+    Compile the rule-set file of RULE_SET_BENEFIT_YEAR, or the built-in rules if the
+    rule-set directory has none.
+
+    :return: RuleSet
+    :raises RuleSetError:
+        If the file is invalid, or the configured benefit year has no file.
+    """
+    directory = rule_set_directory()
+    try:
+        path = find_rule_set(directory, RULE_SET_BENEFIT_YEAR)
+    except RuleSetError:
+        if RULE_SET_BENEFIT_YEAR is not None:
+            raise
+        return builtin_rules()
+    return load_rule_set(path, RULE_TABLE_MAX_CHILDREN)
+
+# The active rule set, loaded on first use; replaced as a whole, never modified
+_rules = None
+_reload_lock = threading.Lock()  # Serializes loads and reloads; calculations only take it before the first load
+
+def current_rules():
+    """
+    Return the active rule set, loading the configured one on first use (importing
+    this module reads no files).
+
+    Hold on to the returned object to calculate several records with the same version.
+
+    :return: RuleSet
+    :raises RuleSetError:
+        If the rules are loaded by this call and the configured file is invalid.
+    """
+    global _rules
+    rules = _rules
+    if rules is None:
+        with _reload_lock:
+            if _rules is None:
+                _rules = load_configured_rules()
+            rules = _rules
+    return rules
+
+def install_rules(rule_set):
+    """
+    Make a compiled rule set the active one.
+
+    :param rule_set: RuleSet
+    :return: RuleSet or None
+        The previously active rule set (None if no rules were loaded yet).
+    """
+    global _rules
+    with _reload_lock:
+        previous, _rules = _rules, rule_set
+    return previous
+
+def reload_rules(path=None):
+    """
+    Load and compile a rule set, then swap it in.
+
+    The new rules are compiled before the swap, so calculations keep using the
+    previous rules until then. An invalid file leaves the active rules unchanged.
+
+    :param path: str or None
+        Rule-set file; defaults to the configured benefit year.
+    :return: RuleSet
+        The new active rule set.
+    :raises RuleSetError:
+        If the file is missing or invalid.
+    """
+    rule_set = load_configured_rules() if path is None else load_rule_set(path, RULE_TABLE_MAX_CHILDREN)
+    install_rules(rule_set)
+    return rule_set
+
+def rebuild_rule_table(max_children=RULE_TABLE_MAX_CHILDREN):
+    """
+    Recompile the active rule set with a lookup table of a different size and make it
+    the active rule set. The built-in rules are recompiled from the business logic
+    constants (e.g. after changing them); rules loaded from a file keep their amounts
+    and version.
+
+    :param max_children: int
+        The largest number of children included in the table; -1 disables the table.
+    :return: None
+    """
+    rules = current_rules()
+    if rules.version == BUILTIN_RULE_VERSION:
+        install_rules(builtin_rules(max_children))
+    else:
+        install_rules(parse_rule_set(rules.to_dict(), max_children=max_children))
 
 def calculate_base_amount(family_composition, number_of_children):
     """
@@ -35,15 +184,7 @@ def calculate_base_amount(family_composition, number_of_children):
     :raises ValueError:
         If the family composition is invalid.
     """
-    if number_of_children == 0:
-        if family_composition == "single":
-            return BASE_AMOUNT_SINGLE_NO_CHILDREN
-        elif family_composition == "couple":
-            return BASE_AMOUNT_COUPLE_NO_CHILDREN
-        else:
-            raise ValueError("Invalid family composition")
-    else:
-        return BASE_AMOUNT_WITH_CHILDREN
+    return current_rules().base_amount(family_composition, number_of_children)
 
 def calculate_children_amount(number_of_children):
     """
@@ -54,7 +195,40 @@ def calculate_children_amount(number_of_children):
     :return: float
         The supplement amount calculated based on the number of dependent children.
     """
-    return number_of_children * CHILD_SUPPLEMENT
+    return number_of_children * current_rules().child_supplement
+
+def calculate_amounts(family_composition, number_of_children):
+    """
+    Calculate the amounts for an eligible family using the rule formulas.
+
+    :param family_composition: str
+        The family composition, either "single" or "couple".
+    :param number_of_children: int
+        The number of dependent children.
+    :return: tuple
+        (base amount, children amount, total amount).
+    :raises ValueError:
+        If the family composition is invalid.
+    """
+    return current_rules().amounts(family_composition, number_of_children)
+
+def calculate(family, rules=None):
+    """
+    Calculate the supplement for a validated family record.
+
+    Results come from the rule table where possible, so no new objects are created;
+    the returned result is immutable and may be shared between callers.
+
+    :param family: FamilyInput
+        A record returned by `records.decode_family`.
+    :param rules: RuleSet or None
+        The rules to apply; defaults to the active rule set.
+    :return: SupplementResult
+    """
+    rules = rules or current_rules()
+    if not family.family_unit_in_pay:
+        return rules.ineligible
+    return rules.result(family.family_composition, family.number_of_children)
 
 def calculate_supplement(data):
     """
@@ -71,25 +245,76 @@ def calculate_supplement(data):
         - baseAmount (float): The base amount calculated.
         - childrenAmount (float): The supplement amount for dependent children.
         - supplementAmount (float): The total supplement amount (base + children).
+        - ruleVersion (str): The version of the rules applied.
     """
+    rules = current_rules()
     if data.get("familyUnitInPayForDecember"):
-        number_of_children = data.get("numberOfChildren", 0)
-        family_composition = data.get("familyComposition")
-
-        base_amount = calculate_base_amount(family_composition, number_of_children)
-        children_amount = calculate_children_amount(number_of_children) if number_of_children > 0 else 0.0
-        total_amount = base_amount + children_amount
-
-        return {
-            "isEligible": True,
-            "baseAmount": base_amount,
-            "childrenAmount": children_amount,
-            "supplementAmount": total_amount,
-        }
+        return rules.result(data.get("familyComposition"), data.get("numberOfChildren", 0)).to_dict()
     else:
-        return {
-            "isEligible": False,
-            "baseAmount": 0.0,
-            "childrenAmount": 0.0,
-            "supplementAmount": 0.0,
-        }
+        return rules.ineligible.to_dict()
+
+def calculate_supplement_batch(columns):
+    """
+    Calculate supplements for many families at once using masked vector operations.
+
+    The rules are identical to `calculate_supplement`; each element of the returned
+    arrays matches the scalar result for the corresponding family. The whole batch is
+    calculated with one rule set.
+
+    :param columns: dict
+        Mapping of column name to a NumPy array or array-like of equal length:
+        - familyComposition: "single" or "couple".
+        - numberOfChildren: Number of dependent children (default is 0 when the column is missing).
+        - familyUnitInPayForDecember: Whether the family unit is eligible for payment in December.
+    :return: dict
+        A dictionary of NumPy arrays:
+        - isEligible (bool array)
+        - baseAmount (float array)
+        - childrenAmount (float array)
+        - supplementAmount (float array)
+        and ruleVersion (str), the version of the rules applied.
+    :raises ValueError:
+        If an eligible family without children has an invalid family composition.
+    """
+    import numpy as np
+
+    rules = current_rules()
+    family_composition = np.asarray(columns["familyComposition"])
+    size = family_composition.shape[0]
+    number_of_children = np.asarray(columns.get("numberOfChildren", np.zeros(size, dtype=np.int64)))
+    is_eligible = np.asarray(columns["familyUnitInPayForDecember"]).astype(bool)
+    base_table, children_table = rules.arrays()
+
+    composition_index = np.full(size, -1)
+    for index, composition in enumerate(FAMILY_COMPOSITIONS):
+        composition_index[family_composition == composition] = index
+
+    # Families covered by the rule table are looked up; the rest use the formulas
+    in_table = (
+        is_eligible
+        & (composition_index >= 0)
+        & (number_of_children >= 0)
+        & (number_of_children < base_table.shape[1])
+        & (np.mod(number_of_children, 1) == 0)
+    )
+    rows = composition_index[in_table]
+    cols = number_of_children[in_table].astype(np.intp)
+    base_amount = np.zeros(size)
+    children_amount = np.zeros(size)
+    base_amount[in_table] = base_table[rows, cols]
+    children_amount[in_table] = children_table[rows, cols]
+
+    by_formula = is_eligible & ~in_table
+    if np.any(by_formula & (number_of_children == 0)):
+        raise ValueError("Invalid family composition")
+    base_amount[by_formula] = rules.base_amount_with_children
+    with_children = by_formula & (number_of_children > 0)
+    children_amount[with_children] = number_of_children[with_children] * rules.child_supplement
+
+    return {
+        "isEligible": is_eligible,
+        "baseAmount": base_amount,
+        "childrenAmount": children_amount,
+        "supplementAmount": base_amount + children_amount,
+        "ruleVersion": rules.version,
+    }
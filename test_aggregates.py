@@ -0,0 +1,184 @@
+"""
+Aggregate Statistics Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the running payout totals and the `/stats` endpoint.
+
+Key Features:
+1. Verifies totals, eligibility rates and children buckets of the aggregator.
+2. Verifies a bulk file is aggregated in one pass, skipping invalid records, and that the
+   topic IDs remembered by the aggregator are bounded.
+3. Verifies results stored by the MQTT pipeline, the memo cache, coalesced requests and consumer
+   workers are counted once per topic ID, and replaced when the result is stored again.
+4. Verifies the command line writes the aggregates of a file.
+"""
+
+from unittest.mock import MagicMock, patch
+import json
+import os
+import tempfile
+import unittest
+
+import app as app_module
+from aggregates import SupplementAggregator, aggregate_file, main
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from records import decode_family
+from supplement_calculator import calculate, current_rules
+from test_helpers import FakeClock, make_client
+
+FAMILIES = [
+    {"id": "a1", "familyComposition": "single", "numberOfChildren": 0, "familyUnitInPayForDecember": True},
+    {"id": "a2", "familyComposition": "couple", "numberOfChildren": 2, "familyUnitInPayForDecember": True},
+    {"id": "a3", "familyComposition": "couple", "numberOfChildren": 6, "familyUnitInPayForDecember": True},
+    {"id": "a4", "familyComposition": "single", "numberOfChildren": 1, "familyUnitInPayForDecember": False},
+]
+
+
+def result_of(record):
+    return calculate(decode_family(record, require_id=False)).to_dict()
+
+
+class TestSupplementAggregator(unittest.TestCase):
+    def test_totals_and_buckets(self):
+        # Test Case: Each result is counted in its composition, children bucket and rule version
+        aggregator = SupplementAggregator(max_children_bucket=4)
+        for record in FAMILIES:
+            aggregator.add(record["id"], record["familyComposition"], record["numberOfChildren"], result_of(record))
+        stats = aggregator.snapshot()
+
+        expected_total = sum(result_of(record)["supplementAmount"] for record in FAMILIES)
+        self.assertEqual(stats["total"]["count"], 4)
+        self.assertEqual(stats["total"]["eligibilityRate"], 0.75)
+        self.assertEqual(stats["total"]["supplementAmountTotal"], expected_total)
+        self.assertEqual(stats["total"]["averageSupplementAmount"], expected_total / 3)
+        self.assertEqual(list(stats["byChildren"]), ["0", "1", "2", "4+"])
+        self.assertEqual(stats["byComposition"]["single"]["eligibilityRate"], 0.5)
+        self.assertEqual(stats["byCompositionAndChildren"]["couple"]["4+"]["supplementAmountTotal"],
+                         result_of(FAMILIES[2])["supplementAmount"])
+        self.assertEqual(stats["byRuleVersion"][current_rules().version]["count"], 4)
+
+        aggregator.reset()
+        self.assertEqual(aggregator.snapshot()["total"]["count"], 0)
+
+    def test_results_are_keyed_by_topic_id(self):
+        # Test Case: A result added again for a topic ID replaces its earlier contribution
+        aggregator = SupplementAggregator()
+        single, couple = FAMILIES[0], FAMILIES[2]
+        aggregator.add("r1", single["familyComposition"], single["numberOfChildren"], result_of(single))
+        aggregator.add("r1", single["familyComposition"], single["numberOfChildren"], result_of(single))
+        self.assertEqual(aggregator.snapshot()["total"]["count"], 1)
+
+        aggregator.add("r1", couple["familyComposition"], couple["numberOfChildren"], result_of(couple))
+        stats = aggregator.snapshot()
+        self.assertEqual(stats["total"]["supplementAmountTotal"], result_of(couple)["supplementAmount"])
+        self.assertEqual(list(stats["byComposition"]), ["couple"])
+
+        aggregator.discard("r1")
+        aggregator.discard("r2")
+        self.assertEqual(aggregator.snapshot()["total"], SupplementAggregator().snapshot()["total"])
+
+    def test_topic_ids_are_bounded(self):
+        # Test Case: IDs are forgotten beyond the entry bound and after the time-to-live; totals are kept
+        clock = FakeClock()
+        aggregator = SupplementAggregator(max_entries=2, ttl_seconds=10, clock=clock)
+        single = FAMILIES[0]
+        for topic_id in ("r1", "r2", "r3"):
+            aggregator.add(topic_id, single["familyComposition"], single["numberOfChildren"], result_of(single))
+        self.assertEqual(list(aggregator._contributions), ["r2", "r3"])
+        clock.now = 10
+        aggregator.add("r4", single["familyComposition"], single["numberOfChildren"], result_of(single))
+        self.assertEqual(list(aggregator._contributions), ["r4"])
+        self.assertEqual(aggregator.snapshot()["total"]["count"], 4)
+
+    def test_aggregate_file(self):
+        # Test Case: A JSONL file is aggregated like results added one by one
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "in.jsonl")
+            with open(path, "w") as f:
+                for record in FAMILIES:
+                    f.write(json.dumps(record) + "\n")
+                f.write(json.dumps(FAMILIES[0]) + "\n")  # Every record is counted, without per-ID state
+                f.write('{"id": "bad", "numberOfChildren": -1}\n')
+            stats = aggregate_file(path)
+
+            output = os.path.join(directory, "stats.json")
+            self.assertEqual(main([path, "--output", output]), 0)
+            with open(output) as f:
+                self.assertEqual(json.load(f), stats)
+
+        aggregator = SupplementAggregator()
+        for record in FAMILIES + FAMILIES[:1]:
+            aggregator.add(None, record["familyComposition"], record["numberOfChildren"], result_of(record))
+        self.assertEqual(stats, dict(aggregator.snapshot(), rejected=1))
+
+
+class TestStatsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = make_client()
+        self.aggregator = SupplementAggregator()
+        for name, value in (("client", self.mock_client), ("aggregator", self.aggregator)):
+            patcher = patch.object(app_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app_module.deduplicator.clear()
+        self.addCleanup(app_module.deduplicator.clear)
+
+    def deliver(self, topic_id, record, base=MQTT_INPUT_TOPIC_BASE):
+        msg = MagicMock()
+        msg.topic = f"{base}/{topic_id}"
+        msg.properties = None
+        msg.payload = json.dumps(record).encode()
+        app_module.process_message(self.mock_client, msg)
+
+    def test_pipeline_results_are_counted(self):
+        # Test Case: A calculated, a coalesced and a memoized submission are each counted once
+        record = {"numberOfChildren": 3, "familyComposition": "couple", "familyUnitInPayForDecember": True}
+        self.app.post("/submit", json=dict(record, id="s1"))
+        self.app.post("/submit", json=dict(record, id="s2"))  # Coalesced onto s1
+        self.deliver("s1", record)
+        self.app.post("/submit", json=dict(record, id="s3"))  # Answered from the memo cache
+        self.app.post("/submit", json=dict(record, id="s3"))  # Duplicate: not counted again
+        self.deliver("s1", record)  # Redelivered: replaces the earlier result
+
+        stats = self.app.get("/stats").json
+        amount = result_of(record)["supplementAmount"]
+        self.assertEqual(stats["total"]["count"], 3)
+        self.assertEqual(stats["byCompositionAndChildren"]["couple"]["3"]["supplementAmountTotal"], 3 * amount)
+
+    def test_followers_are_counted_with_their_own_input(self):
+        # Test Case: An ineligible family coalesced onto another ineligible family keeps its composition
+        leader = {"numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": False}
+        follower = {"numberOfChildren": 3, "familyComposition": "couple", "familyUnitInPayForDecember": False}
+        self.app.post("/submit", json=dict(leader, id="f1"))
+        self.app.post("/submit", json=dict(follower, id="f2"))  # Coalesced onto f1
+        self.deliver("f1", leader)
+
+        stats = self.app.get("/stats").json
+        self.assertEqual(stats["byCompositionAndChildren"]["single"]["0"]["count"], 1)
+        self.assertEqual(stats["byCompositionAndChildren"]["couple"]["3"]["count"], 1)
+        self.assertEqual(stats["byComposition"]["couple"]["eligibilityRate"], 0.0)
+
+    def test_worker_results_are_counted(self):
+        # Test Case: Results published by consumer workers are aggregated once, with the submitted input
+        record = {"numberOfChildren": 2, "familyComposition": "single", "familyUnitInPayForDecember": True}
+        self.app.post("/submit", json=dict(record, id="w1"))
+        for _ in range(2):  # The worker's result, then its redelivery
+            self.deliver("w1", result_of(record), MQTT_OUTPUT_TOPIC_BASE)
+        self.assertEqual(app_module.results["w1"], result_of(record))
+        stats = self.app.get("/stats").json
+        self.assertEqual(stats["byCompositionAndChildren"]["single"]["2"]["count"], 1)
+
+        self.deliver("w1", {"status": "error", "error": "Invalid numberOfChildren"}, MQTT_OUTPUT_TOPIC_BASE)
+        self.assertEqual(self.app.get("/stats").json["total"]["count"], 0)
+
+    def test_invalid_records_are_not_counted(self):
+        # Test Case: Records failing validation on the MQTT path are not aggregated
+        with self.assertRaises(ValueError):
+            self.deliver("bad1", {"numberOfChildren": -1, "familyComposition": "single",
+                                  "familyUnitInPayForDecember": True})
+        self.assertEqual(self.app.get("/stats").json["total"]["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Asyncio Service Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the asyncio service mode against the same `/submit` and
+`/result/<topic_id>` contract as the Flask API.
+
+Key Features:
+1. Verifies a submission flows through MQTT to a stored result.
+2. Verifies long-polling waits for a result without blocking other requests.
+3. Tests error responses for invalid inputs, and that invalid records of a batch message do
+   not abort the others.
+"""
+
+import asyncio
+import json
+import unittest
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import codec
+from async_app import SupplementService, create_app
+from config import MQTT_INPUT_BATCH_TOPIC, MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from supplement_calculator import current_rules
+
+
+class LoopbackMQTTClient:
+    """Delivers input topic publishes back to the service, like a broker with one subscriber."""
+
+    def __init__(self, deliver=True):
+        self.service = None
+        self.deliver = deliver
+        self.published = []
+
+    async def publish(self, topic, payload):
+        self.published.append((topic, payload))
+        if self.deliver and topic.startswith(MQTT_INPUT_TOPIC_BASE):
+            asyncio.get_running_loop().call_soon(
+                lambda: asyncio.ensure_future(self.service.handle_message(topic, payload))
+            )
+
+
+class TestAsyncApp(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.mqtt = LoopbackMQTTClient()
+        self.service = SupplementService(mqtt_client=self.mqtt)
+        self.mqtt.service = self.service
+        self.client = TestClient(TestServer(create_app(self.service, connect_mqtt=False)))
+        await self.client.start_server()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_submit_and_wait_for_result(self):
+        # Test Case: Submission is calculated and returned to a long-polling client
+        data = {"id": "async1", "numberOfChildren": 2, "familyComposition": "couple",
+                "familyUnitInPayForDecember": True}
+        response = await self.client.post("/submit", json=data)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(await response.json(), {"id": "async1"})
+
+        response = await self.client.get("/result/async1?wait=5")
+        self.assertEqual(await response.json(), {
+            "isEligible": True, "baseAmount": 120.0, "childrenAmount": 40.0, "supplementAmount": 160.0,
+            "ruleVersion": current_rules().version,
+        })
+        self.assertIn((f"{MQTT_OUTPUT_TOPIC_BASE}/async1", codec.dumps(self.service.store.lookup("async1"))),
+                      self.mqtt.published)
+
+    async def test_concurrent_waiters(self):
+        # Test Case: Many waiting clients are woken by one result
+        self.mqtt.deliver = False
+        self.service.store.set("async2", {"status": "pending"})
+        waiters = [asyncio.ensure_future(self.client.get("/result/async2?wait=5")) for _ in range(20)]
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if self.service.store.stats()["waiters"] == 20:
+                break
+        self.assertEqual(self.service.store.stats()["waiters"], 20)
+
+        await self.service.handle_message(f"{MQTT_INPUT_TOPIC_BASE}/async2", json.dumps({
+            "numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": True,
+        }))
+        for response in await asyncio.gather(*waiters):
+            self.assertEqual((await response.json())["supplementAmount"], 60.0)
+
+    async def test_wait_timeout_returns_pending(self):
+        # Test Case: Pending Result after the wait expires
+        response = await self.client.get("/result/async3?wait=0.05")
+        self.assertEqual(await response.json(), {"status": "pending"})
+
+    async def test_invalid_submission(self):
+        # Test Case: Invalid Family Composition
+        response = await self.client.post("/submit", json={
+            "id": "async4", "numberOfChildren": 1, "familyComposition": "invalid",
+            "familyUnitInPayForDecember": True,
+        })
+        self.assertEqual(response.status, 400)
+
+    async def test_batch_with_invalid_records(self):
+        # Test Case: Records without an id or failing validation do not abort the rest of the batch
+        record = {"numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": True}
+        await self.service.handle_message(MQTT_INPUT_BATCH_TOPIC, json.dumps([
+            record, dict(record, id=""), "not a record", dict(record, id="async6", numberOfChildren=-1),
+            dict(record, id="async7"),
+        ]))
+        self.assertEqual(self.service.store.lookup("async6")["status"], "error")
+        self.assertEqual(self.service.store.lookup("async7")["supplementAmount"], 60.0)
+
+    async def test_invalid_wait(self):
+        # Test Case: Non-numeric wait parameter
+        response = await self.client.get("/result/async5?wait=soon")
+        self.assertEqual(response.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Batch Submission Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the `/submit/batch` endpoint and the handling of batched
+MQTT input messages.
+
+Key Features:
+1. Verifies per-item ids and errors for mixed valid/invalid batches, including ids of the wrong type.
+2. Verifies valid records are grouped into batch messages on the batch input topic, and that records
+   that could not be published are reported as errors.
+3. Simulates a batched MQTT message being processed by `process_message`.
+"""
+
+from unittest.mock import MagicMock
+import json
+import unittest
+import paho.mqtt.client as mqtt
+import codec
+import app as app_module
+from app import app, results, process_message
+from config import MQTT_INPUT_BATCH_TOPIC, MQTT_OUTPUT_TOPIC_BASE, MQTT_QOS
+from test_helpers import make_client, make_record
+
+
+class TestSubmitBatch(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.mock_client = make_client()
+        app_module.client.publish = self.mock_client.publish
+        app_module.deduplicator.clear()
+
+    def test_mixed_batch(self):
+        # Test Case: Batch with valid, invalid and duplicate records
+        records = [
+            make_record("batch1"),
+            make_record("batch2", children=-1),
+            make_record("batch1"),
+            make_record("batch3", composition="single", children=0),
+        ]
+        response = self.app.post('/submit/batch', data=json.dumps(records), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["accepted"], 2)
+        self.assertEqual(response.json["rejected"], 2)
+        self.assertEqual(response.json["items"], [
+            {"id": "batch1"},
+            {"index": 1, "id": "batch2", "error": "Invalid numberOfChildren"},
+            {"index": 2, "id": "batch1", "error": "Duplicate id in batch"},
+            {"id": "batch3"},
+        ])
+        self.mock_client.publish.assert_called_once_with(
+            MQTT_INPUT_BATCH_TOPIC, codec.dumps([records[0], records[3]]), qos=MQTT_QOS
+        )
+        self.assertEqual(results["batch1"], {"status": "pending"})
+
+    def test_ndjson_batch(self):
+        # Test Case: NDJSON body with an unparseable line
+        body = json.dumps(make_record("batch4")) + "\n{not json\n"
+        response = self.app.post('/submit/batch', data=body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["items"], [{"id": "batch4"}, {"index": 1, "error": "Invalid JSON"}])
+
+    def test_batch_groups_messages(self):
+        # Test Case: Valid records are split into groups of MQTT_BATCH_MAX_ITEMS
+        records = [make_record(f"group{i}", children=i) for i in range(app_module.MQTT_BATCH_MAX_ITEMS + 1)]
+        self.app.post('/submit/batch', data=json.dumps(records), content_type='application/json')
+        self.assertEqual(self.mock_client.publish.call_count, 2)
+
+    def test_batch_with_unhashable_ids(self):
+        # Test Case: Dict and list ids are per-item validation errors, not a failed batch
+        records = [make_record({"a": 1}), make_record(["batch7"]), make_record("batch7")]
+        response = self.app.post('/submit/batch', data=json.dumps(records), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["items"], [
+            {"index": 0, "error": "Topic ID is required"},
+            {"index": 1, "error": "Topic ID is required"},
+            {"id": "batch7"},
+        ])
+        self.assertEqual((response.json["accepted"], response.json["rejected"]), (1, 2))
+
+    def test_failed_publish_is_reported(self):
+        # Test Case: Records of a group that could not be published are reported as errors
+        self.mock_client.publish.return_value.rc = mqtt.MQTT_ERR_NO_CONN
+        records = [make_record("batch8"), make_record("batch9", children=-1)]
+        response = self.app.post('/submit/batch', data=json.dumps(records), content_type='application/json')
+
+        self.assertEqual(response.json["items"], [
+            {"index": 0, "id": "batch8", "error": "MQTT broker unavailable"},
+            {"index": 1, "id": "batch9", "error": "Invalid numberOfChildren"},
+        ])
+        self.assertEqual((response.json["accepted"], response.json["rejected"]), (0, 2))
+        self.assertEqual(results["batch8"]["status"], "error")
+
+    def test_batch_not_a_list(self):
+        # Test Case: Body that is not a list of records
+        response = self.app.post('/submit/batch', data=json.dumps({"id": "x"}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class TestOnMessageBatch(unittest.TestCase):
+    def test_batch_message(self):
+        # Test Case: Batched MQTT message stores and publishes a result per record
+        mock_client = MagicMock()
+        msg = MagicMock()
+        msg.topic = MQTT_INPUT_BATCH_TOPIC
+        msg.payload = json.dumps([make_record("batch5", children=2), make_record("batch6", eligible=False)])
+
+        process_message(mock_client, msg)
+
+        self.assertEqual(results["batch5"]["supplementAmount"], 160.0)
+        self.assertFalse(results["batch6"]["isEligible"])
+        mock_client.publish.assert_any_call(f"{MQTT_OUTPUT_TOPIC_BASE}/batch5", codec.dumps(results["batch5"]), qos=MQTT_QOS)
+
+
+if __name__ == "__main__":
+    unittest.main()
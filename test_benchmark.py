@@ -0,0 +1,33 @@
+"""
+Benchmark Suite Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the regression detection of the benchmark suite.
+"""
+
+import unittest
+
+from benchmark import compare_results, percentiles
+
+
+class TestBenchmarkCompare(unittest.TestCase):
+    def test_regressions(self):
+        # Test Case: Lower throughput and higher latency beyond the threshold are flagged
+        baseline = {"results": {"http": {"submitP50Ms": 1.0, "callsPerSecond": 1000.0, "speedup": 2.0}}}
+        current = {"results": {"http": {"submitP50Ms": 1.5, "callsPerSecond": 950.0, "speedup": 1.0}}}
+
+        regressions = compare_results(baseline, current, threshold=0.10)
+
+        self.assertEqual([r["metric"] for r in regressions], ["submitP50Ms"])
+
+    def test_missing_baseline_metric_is_ignored(self):
+        self.assertEqual(compare_results({"results": {}}, {"results": {"http": {"p50Ms": 1.0}}}), [])
+
+    def test_percentiles(self):
+        summary = percentiles([i / 1000 for i in range(1, 101)])
+        self.assertAlmostEqual(summary["p50Ms"], 50.0)
+        self.assertAlmostEqual(summary["p99Ms"], 99.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
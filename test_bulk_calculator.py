@@ -0,0 +1,112 @@
+"""
+Bulk Calculator Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the streaming bulk calculator used for offline reprocessing.
+
+Key Features:
+1. Verifies JSONL and CSV inputs produce the same results as `calculate_supplement`.
+2. Verifies invalid rows, including lines that are not valid UTF-8, are written to the reject
+   file without aborting the run.
+3. Verifies the parallel worker pool produces byte-identical output to the serial path.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from bulk_calculator import run
+from supplement_calculator import calculate_supplement, current_rules
+
+RECORDS = [
+    {"id": "bulk1", "numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": True},
+    {"id": "bulk2", "numberOfChildren": 3, "familyComposition": "couple", "familyUnitInPayForDecember": True},
+    {"id": "bulk3", "numberOfChildren": -1, "familyComposition": "couple", "familyUnitInPayForDecember": True},
+    {"id": "bulk4", "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": False},
+]
+
+
+class TestBulkCalculator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_jsonl_to_jsonl(self):
+        # Test Case: JSONL input with an invalid record and an unparseable line
+        with open(self.path("in.jsonl"), "w") as f:
+            for record in RECORDS:
+                f.write(json.dumps(record) + "\n")
+            f.write("{broken\n")
+
+        stats = run(self.path("in.jsonl"), self.path("out.jsonl"), self.path("rejects.jsonl"),
+                    chunk_size=2, log=None)
+
+        self.assertEqual((stats["accepted"], stats["rejected"]), (3, 2))
+        with open(self.path("out.jsonl")) as f:
+            output = [json.loads(line) for line in f]
+        expected = [{"id": r["id"], **calculate_supplement(r)} for r in RECORDS if r["numberOfChildren"] >= 0]
+        self.assertEqual(output, expected)
+        with open(self.path("rejects.jsonl")) as f:
+            rejects = [json.loads(line) for line in f]
+        self.assertEqual([r["record"] for r in rejects], [3, 5])
+        self.assertEqual(rejects[0]["error"], "Invalid numberOfChildren")
+
+    def test_csv_to_csv(self):
+        # Test Case: CSV input converts text cells before validation
+        with open(self.path("in.csv"), "w") as f:
+            f.write("id,numberOfChildren,familyComposition,familyUnitInPayForDecember\n")
+            f.write("csv1,2,couple,true\n")
+            f.write("csv2,two,single,true\n")
+
+        stats = run(self.path("in.csv"), self.path("out.csv"), self.path("rejects.jsonl"), log=None)
+
+        self.assertEqual((stats["accepted"], stats["rejected"]), (1, 1))
+        with open(self.path("out.csv")) as f:
+            self.assertEqual(f.read(), "id,isEligible,baseAmount,childrenAmount,supplementAmount,ruleVersion\n"
+                                       f"csv1,True,120.0,40.0,160.0,{current_rules().version}\n")
+
+    def test_undecodable_lines_are_rejected(self):
+        # Test Case: Lines that are not valid UTF-8 are rejected; the rest of the file is still calculated
+        with open(self.path("in.jsonl"), "wb") as f:
+            f.write(json.dumps(RECORDS[0]).encode() + b"\n")
+            f.write(b'{"id": "bulk\xff", "numberOfChildren": 1}\n')
+            f.write(json.dumps(RECORDS[1]).encode() + b"\n")
+        with open(self.path("in.csv"), "wb") as f:
+            f.write(b"id,numberOfChildren,familyComposition,familyUnitInPayForDecember\n")
+            f.write(b"csv\xe9,2,couple,true\n")
+            f.write(b"csv2,2,couple,true\n")
+
+        stats = run(self.path("in.jsonl"), self.path("out.jsonl"), self.path("rejects.jsonl"), log=None)
+        csv_stats = run(self.path("in.csv"), self.path("out.csv"), self.path("csv-rejects.jsonl"), log=None)
+
+        self.assertEqual((stats["accepted"], stats["rejected"]), (2, 1))
+        self.assertEqual((csv_stats["accepted"], csv_stats["rejected"]), (1, 1))
+        with open(self.path("out.jsonl")) as f:
+            self.assertEqual([json.loads(line)["id"] for line in f], ["bulk1", "bulk2"])
+        with open(self.path("rejects.jsonl")) as f:
+            reject = json.loads(f.read())
+        self.assertEqual((reject["record"], reject["error"]), (2, "Invalid UTF-8"))
+        self.assertEqual(reject["input"], '{"id": "bulk\udcff", "numberOfChildren": 1}')
+
+    def test_parallel_matches_serial(self):
+        # Test Case: Worker pool output is byte-identical to the serial path
+        with open(self.path("in.jsonl"), "w") as f:
+            for i in range(500):
+                record = dict(RECORDS[i % len(RECORDS)], id=f"parallel{i}")
+                f.write(json.dumps(record) + "\n")
+
+        for workers, name in ((1, "serial"), (3, "parallel")):
+            run(self.path("in.jsonl"), self.path(f"{name}.jsonl"), self.path(f"{name}-rejects.jsonl"),
+                chunk_size=7, log=None, workers=workers)
+
+        for suffix in (".jsonl", "-rejects.jsonl"):
+            with open(self.path("serial" + suffix), "rb") as serial, open(self.path("parallel" + suffix), "rb") as parallel:
+                self.assertEqual(serial.read(), parallel.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
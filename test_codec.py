@@ -0,0 +1,79 @@
+"""
+Codec Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the serialization layer for MQTT payloads and HTTP responses.
+
+Key Features:
+1. Verifies JSON encoding with and without orjson.
+2. Verifies MessagePack payloads negotiated through the topic suffix.
+3. Simulates a MessagePack MQTT message being answered in MessagePack.
+"""
+
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+import codec
+from app import process_message, results
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, MQTT_QOS
+from supplement_calculator import current_rules
+
+RESULT = {"isEligible": True, "baseAmount": 120.0, "childrenAmount": 40.0, "supplementAmount": 160.0}
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_round_trip(self):
+        self.assertEqual(codec.loads(codec.dumps(RESULT)), RESULT)
+        self.assertIsInstance(codec.dumps(RESULT), bytes)
+
+    def test_stdlib_fallback(self):
+        # Test Case: Output is identical when orjson is not installed
+        fast = codec.dumps(RESULT)
+        with mock.patch.object(codec, "orjson", None):
+            self.assertEqual(codec.dumps(RESULT), fast)
+            self.assertEqual(codec.loads(fast), RESULT)
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            codec.decode(b"{not json")
+
+
+class TestTopicFormat(unittest.TestCase):
+    def test_split_format(self):
+        self.assertEqual(codec.split_format("BRE/in/abc/msgpack"), ("BRE/in/abc", codec.MSGPACK))
+        self.assertEqual(codec.split_format("BRE/in/abc"), ("BRE/in/abc", codec.JSON))
+        self.assertEqual(codec.with_format("BRE/out/abc", codec.MSGPACK), "BRE/out/abc/msgpack")
+        self.assertEqual(codec.with_format("BRE/out/abc", codec.JSON), "BRE/out/abc")
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            codec.encode(RESULT, "xml")
+
+
+@unittest.skipUnless(codec.msgpack, "msgpack is not installed")
+class TestMessagePack(unittest.TestCase):
+    def test_round_trip(self):
+        self.assertEqual(codec.decode(codec.encode(RESULT, codec.MSGPACK), codec.MSGPACK), RESULT)
+
+    def test_msgpack_message(self):
+        # Test Case: A MessagePack input message is answered on the MessagePack output topic
+        mock_client = MagicMock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}/codec1/msgpack"
+        msg.properties = None
+        msg.payload = codec.encode({
+            "numberOfChildren": 2, "familyComposition": "couple", "familyUnitInPayForDecember": True,
+        }, codec.MSGPACK)
+
+        process_message(mock_client, msg)
+
+        expected = dict(RESULT, ruleVersion=current_rules().version)
+        self.assertEqual(results["codec1"], expected)
+        mock_client.publish.assert_called_once_with(
+            f"{MQTT_OUTPUT_TOPIC_BASE}/codec1/msgpack", codec.encode(expected, codec.MSGPACK), qos=MQTT_QOS
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
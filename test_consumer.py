@@ -0,0 +1,120 @@
+"""
+Consumer Worker Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the standalone consumer workers against the in-process
+`LocalBroker`.
+
+Key Features:
+1. Verifies shared-subscription workers split the input stream, each message once.
+2. Verifies shard workers split single and batched inputs by topic ID.
+3. Verifies validation errors are published as error results, and batch records without a valid
+   topic ID are counted as rejected.
+4. Verifies the API stores results calculated by a worker.
+"""
+
+import json
+import unittest
+import app as app_module
+from consumer import Consumer, SHARD, shard_of
+from local_broker import LocalBroker, LocalClient
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_INPUT_BATCH_TOPIC, MQTT_OUTPUT_TOPIC_BASE
+from test_helpers import make_record
+
+
+class TestConsumers(unittest.TestCase):
+    def setUp(self):
+        self.broker = LocalBroker()
+        self.outputs = []
+        listener = LocalClient(self.broker)
+        listener.on_message = lambda c, userdata, msg: self.outputs.append((msg.topic, json.loads(msg.payload)))
+        listener.connect()
+        listener.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
+        self.publisher = LocalClient(self.broker)
+        self.publisher.connect()
+        self.consumers = []
+
+    def tearDown(self):
+        self.broker.stop()
+        for consumer in self.consumers:
+            consumer.dispatcher.shutdown(drain=False)
+
+    def start_consumers(self, count, **kwargs):
+        for index in range(count):
+            options = dict(kwargs, shard_index=index, shard_count=count) if kwargs.get("mode") == SHARD else kwargs
+            consumer = Consumer(LocalClient(self.broker), workers=1, **options)
+            consumer.start()
+            self.consumers.append(consumer)
+
+    def drain(self):
+        self.broker.flush()
+        for consumer in self.consumers:
+            consumer.dispatcher.shutdown(drain=True)
+        self.broker.flush()
+
+    def test_shared_subscription(self):
+        # Test Case: Three workers in a group calculate each message exactly once
+        self.start_consumers(3)
+        for index in range(30):
+            self.publisher.publish(f"{MQTT_INPUT_TOPIC_BASE}/shared{index}", json.dumps(make_record(None)))
+        self.drain()
+
+        topics = sorted(topic for topic, _ in self.outputs)
+        self.assertEqual(topics, sorted(f"{MQTT_OUTPUT_TOPIC_BASE}/shared{index}" for index in range(30)))
+        self.assertEqual([consumer.stats()["processed"] for consumer in self.consumers], [10, 10, 10])
+
+    def test_shards(self):
+        # Test Case: Shard workers split single and batched inputs by topic ID
+        self.start_consumers(3, mode=SHARD)
+        for index in range(10):
+            self.publisher.publish(f"{MQTT_INPUT_TOPIC_BASE}/shard{index}", json.dumps(make_record(None)))
+        batch = [make_record(f"batch{index}") for index in range(10)]
+        self.publisher.publish(MQTT_INPUT_BATCH_TOPIC, json.dumps(batch))
+        self.drain()
+
+        self.assertEqual(len(self.outputs), 20)
+        self.assertEqual(len({topic for topic, _ in self.outputs}), 20)
+        for consumer in self.consumers:
+            stats = consumer.stats()
+            expected = sum(
+                shard_of(topic_id, 3) == consumer.shard_index
+                for topic_id in [f"shard{index}" for index in range(10)] + [f"batch{index}" for index in range(10)]
+            )
+            self.assertEqual(stats["processed"], expected)
+            self.assertEqual(stats["skipped"], 20 - expected)
+
+    def test_error_result(self):
+        # Test Case: Invalid input is published as an error result
+        self.start_consumers(1)
+        self.publisher.publish(f"{MQTT_INPUT_TOPIC_BASE}/bad1", json.dumps(make_record(None, children=-1)))
+        self.drain()
+        self.assertEqual(self.outputs, [
+            (f"{MQTT_OUTPUT_TOPIC_BASE}/bad1", {"status": "error", "error": "Invalid numberOfChildren"}),
+        ])
+
+    def test_invalid_batch_ids_are_rejected(self):
+        # Test Case: Batch records without a valid topic ID are counted as rejected, not calculated
+        self.start_consumers(1)
+        batch = [make_record(None), make_record(""), make_record(["x"]), make_record("a/b"), "x", make_record("ok1")]
+        self.publisher.publish(MQTT_INPUT_BATCH_TOPIC, json.dumps(batch))
+        self.drain()
+        self.assertEqual([topic for topic, _ in self.outputs], [f"{MQTT_OUTPUT_TOPIC_BASE}/ok1"])
+        stats = self.consumers[0].stats()
+        self.assertEqual((stats["processed"], stats["rejected"]), (1, 5))
+
+    def test_api_stores_worker_results(self):
+        # Test Case: The API stores a result calculated by a worker from the output topic
+        self.start_consumers(1)
+        api_client = LocalClient(self.broker)
+        api_client.on_message = app_module.on_message
+        api_client.connect()
+        api_client.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/#")
+        app_module.dispatcher.start()
+
+        self.publisher.publish(f"{MQTT_INPUT_TOPIC_BASE}/worker1", json.dumps(make_record(None, children=2)))
+        self.drain()
+        self.assertEqual(app_module.results.wait_for("worker1", 5)["supplementAmount"], 160.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+"""
+Request Deduplication Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the idempotency layer and memo cache in front of the MQTT pipeline.
+
+Key Features:
+1. Verifies completed topic IDs re-submitted with the same input are not published again.
+2. Verifies identical in-flight requests are coalesced and receive the leader's result.
+3. Verifies memo cache hits, hit-rate counters, the in-flight timeout and that store lookups
+   run outside the lock.
+4. Verifies a flight whose record could not be published is dropped with its followers.
+5. Verifies `/submit` only publishes new work, and answers 503 when the publish fails.
+"""
+
+from unittest.mock import ANY
+import unittest
+import app as app_module
+import paho.mqtt.client as mqtt
+from dedup import RequestDeduplicator, fingerprint, SUBMIT, DUPLICATE, COALESCED, MEMO
+from records import decode_family
+from result_store import InMemoryResultStore
+from test_helpers import FakeClock, make_client, make_record
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE, MQTT_QOS
+
+RESULT = {"isEligible": True, "baseAmount": 120.0, "childrenAmount": 40.0, "supplementAmount": 160.0}
+
+
+def make_family(topic_id, children=2, composition="couple", eligible=True):
+    return decode_family(make_record(topic_id, children, composition, eligible))
+
+
+class TestRequestDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryResultStore()
+        self.clock = FakeClock()
+        self.dedup = RequestDeduplicator(self.store, max_entries=4, inflight_timeout=30, clock=self.clock)
+
+    def test_completed_resubmission(self):
+        # Test Case: A completed topic ID re-submitted with the same input is a duplicate
+        self.assertEqual(self.dedup.admit("d1", make_family("d1")), (SUBMIT, None))
+        self.assertEqual(self.store["d1"], {"status": "pending"})
+        self.store["d1"] = RESULT
+        self.assertEqual(self.dedup.complete("d1", RESULT), (make_family("d1"), []))
+
+        self.assertEqual(self.dedup.admit("d1", make_family("d1")), (DUPLICATE, RESULT))
+        self.assertEqual(self.dedup.stats()["duplicates"], 1)
+
+    def test_lookup_runs_outside_the_lock(self):
+        # Test Case: A slow store lookup does not block other submissions
+        self.dedup.admit("d9", make_family("d9"))
+        self.store["d9"] = RESULT
+        self.dedup.complete("d9", RESULT)
+        lookup = self.store.lookup
+
+        def unlocked_lookup(key):
+            self.assertFalse(self.dedup._lock.locked())
+            # A resubmission with another input while the lookup is in progress
+            self.assertEqual(self.dedup.admit(key, make_family(key, children=5))[0], SUBMIT)
+            return lookup(key)
+
+        self.store.lookup = unlocked_lookup
+        # The stored result now belongs to the other input: answered from the memo cache instead
+        self.assertEqual(self.dedup.admit("d9", make_family("d9")), (MEMO, RESULT))
+        self.assertEqual(self.dedup.stats()["duplicates"], 0)
+
+    def test_changed_input_is_not_a_duplicate(self):
+        # Test Case: The same topic ID with another input is calculated again
+        self.dedup.admit("d2", make_family("d2"))
+        self.store["d2"] = RESULT
+        self.dedup.complete("d2", RESULT)
+        self.assertEqual(self.dedup.admit("d2", make_family("d2", children=3))[0], SUBMIT)
+
+    def test_coalesce_in_flight(self):
+        # Test Case: Identical in-flight requests are coalesced onto the first
+        self.assertEqual(self.dedup.admit("d3", make_family("d3"))[0], SUBMIT)
+        self.assertEqual(self.dedup.admit("d3", make_family("d3"))[0], COALESCED)
+        self.assertEqual(self.dedup.admit("d4", make_family("d4"))[0], COALESCED)
+        self.assertEqual(self.store["d4"], {"status": "pending"})
+
+        self.assertEqual(self.dedup.complete("d3", RESULT), (make_family("d3"), [("d4", make_family("d4"))]))
+        self.assertEqual(self.dedup.stats()["inflight"], 0)
+
+    def test_memo_hit(self):
+        # Test Case: A calculated input is answered from the memo cache
+        self.dedup.admit("d5", make_family("d5"))
+        self.dedup.complete("d5", RESULT)
+
+        self.assertEqual(self.dedup.admit("d6", make_family("d6")), (MEMO, RESULT))
+        stats = self.dedup.stats()
+        self.assertEqual((stats["memoHits"], stats["memoMisses"]), (1, 1))
+        self.assertAlmostEqual(stats["memoHitRate"], 0.5)
+
+    def test_error_results_are_not_memoized(self):
+        self.dedup.admit("d7", make_family("d7"))
+        self.assertEqual(self.dedup.complete("d7", {"status": "error", "error": "x"}), (None, []))
+        self.assertEqual(self.dedup.stats()["memoSize"], 0)
+
+    def test_stale_rule_version_is_not_memoized(self):
+        # Test Case: After the rules change, late results of the previous version are not memoized
+        self.dedup.clear(rule_version="2")
+        self.dedup.admit("v1", make_family("v1"))
+        self.dedup.complete("v1", dict(RESULT, ruleVersion="1"))
+        self.assertEqual(self.dedup.stats()["memoSize"], 0)
+        self.dedup.admit("v2", make_family("v2", children=3))
+        self.dedup.complete("v2", dict(RESULT, ruleVersion="2"))
+        self.assertEqual(self.dedup.stats()["memoSize"], 1)
+
+    def test_inflight_timeout(self):
+        # Test Case: A lost calculation is published again after the timeout
+        self.dedup.admit("d8", make_family("d8"))
+        self.clock.now = 31
+        self.assertEqual(self.dedup.admit("d9", make_family("d9"))[0], SUBMIT)
+
+    def test_ineligible_inputs_share_a_fingerprint(self):
+        # Test Case: Ineligible families coalesce, but each follower keeps its own input
+        self.assertEqual(
+            fingerprint(make_family("a", eligible=False)),
+            fingerprint(make_family("b", children=0, composition="single", eligible=False)),
+        )
+        self.dedup.admit("a", make_family("a", children=0, composition="single", eligible=False))
+        follower = make_family("b", children=3, composition="couple", eligible=False)
+        self.assertEqual(self.dedup.admit("b", follower)[0], COALESCED)
+        self.assertEqual(self.dedup.complete("a", RESULT)[1], [("b", follower)])
+
+    def test_abort(self):
+        # Test Case: An aborted flight gives its followers an error result and forgets them
+        self.dedup.admit("e1", make_family("e1"))
+        self.dedup.admit("e2", make_family("e2"))
+        self.assertEqual(self.dedup.abort("e1"), ["e1", "e2"])
+        self.assertEqual(self.store["e2"], {"status": "error", "error": "MQTT broker unavailable"})
+        self.assertEqual(self.dedup.stats()["inflight"], 0)
+        self.assertEqual(self.dedup.admit("e2", make_family("e2")), (SUBMIT, None))
+        self.assertEqual(self.dedup.abort("unknown"), [])
+
+    def test_bounded(self):
+        # Test Case: Topic IDs and memoized inputs are bounded LRUs
+        for children in range(10):
+            topic_id = f"b{children}"
+            self.dedup.admit(topic_id, make_family(topic_id, children=children))
+            self.dedup.complete(topic_id, dict(RESULT, childrenAmount=children))
+        self.assertEqual(self.dedup.stats()["memoSize"], 4)
+        self.assertEqual(len(self.dedup._ids), 4)
+
+
+class TestSubmitDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = make_client()
+        app_module.client.publish = self.mock_client.publish
+        app_module.deduplicator.clear()
+
+    def submit(self, topic_id, children=1):
+        return self.app.post('/submit', json={
+            "id": topic_id, "numberOfChildren": children, "familyComposition": "single",
+            "familyUnitInPayForDecember": True,
+        })
+
+    def test_duplicate_submission_is_not_published(self):
+        # Test Case: Retried and identical submissions publish once
+        self.submit("dup1")
+        self.submit("dup1")
+        self.submit("dup2")
+        self.mock_client.publish.assert_called_once()
+        self.assertEqual(self.mock_client.publish.call_args.args[0], f"{MQTT_INPUT_TOPIC_BASE}/dup1")
+
+        # The calculation for dup1 completes and is shared with dup2
+        app_module.process_record(self.mock_client, "dup1", {
+            "numberOfChildren": 1, "familyComposition": "single", "familyUnitInPayForDecember": True,
+        })
+        self.assertEqual(app_module.results["dup2"]["supplementAmount"], 140.0)
+        self.mock_client.publish.assert_any_call(f"{MQTT_OUTPUT_TOPIC_BASE}/dup2", ANY, qos=MQTT_QOS)
+
+        # A retry of the completed id and a new id with a known input skip the input topic
+        self.mock_client.publish.reset_mock()
+        self.submit("dup1")
+        self.submit("dup3")
+        topics = [call.args[0] for call in self.mock_client.publish.call_args_list]
+        self.assertEqual(topics, [f"{MQTT_OUTPUT_TOPIC_BASE}/dup3"])
+        self.assertEqual(app_module.results["dup3"]["supplementAmount"], 140.0)
+
+    def test_failed_publish_aborts(self):
+        # Test Case: A publish failing while disconnected or rejected by paho is answered with 503
+        self.mock_client.publish.return_value.rc = mqtt.MQTT_ERR_NO_CONN
+        response = self.submit("fail1", children=4)
+        self.assertEqual((response.status_code, response.json), (503, {"error": "MQTT broker unavailable"}))
+        self.assertEqual(app_module.results["fail1"]["status"], "error")
+        self.assertEqual(app_module.deduplicator.stats()["inflight"], 0)
+
+        self.mock_client.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+        self.mock_client.publish.side_effect = ValueError("Invalid topic")
+        self.assertEqual(self.submit("fail1", children=4).status_code, 503)
+
+        # The retry is published again once the broker accepts it
+        self.mock_client.publish.side_effect = None
+        self.mock_client.publish.reset_mock()
+        self.assertEqual(self.submit("fail1", children=4).status_code, 200)
+        self.assertEqual(self.mock_client.publish.call_args.args[0], f"{MQTT_INPUT_TOPIC_BASE}/fail1")
+        self.assertEqual(app_module.results["fail1"], {"status": "pending"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Message Dispatcher Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the worker pool that processes MQTT messages off the
+paho network thread.
+
+Key Features:
+1. Verifies queued items are processed and drained on shutdown.
+2. Verifies the drop policy and its backpressure metrics.
+3. Verifies `on_message` only enqueues messages.
+"""
+
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+import app as app_module
+from dispatcher import MessageDispatcher, BLOCK, DROP
+
+
+class TestMessageDispatcher(unittest.TestCase):
+    def test_drain_on_shutdown(self):
+        # Test Case: Every queued item is processed before shutdown returns
+        handled = []
+        dispatcher = MessageDispatcher(handled.append, workers=2, max_queue=100, policy=BLOCK)
+        dispatcher.start()
+        for i in range(50):
+            self.assertTrue(dispatcher.submit(i))
+        dispatcher.shutdown(drain=True)
+
+        self.assertEqual(sorted(handled), list(range(50)))
+        stats = dispatcher.stats()
+        self.assertEqual((stats["enqueued"], stats["processed"], stats["queueDepth"]), (50, 50, 0))
+
+    def test_drop_policy(self):
+        # Test Case: Items are dropped when the queue is full
+        release = threading.Event()
+        dispatcher = MessageDispatcher(lambda item: release.wait(), workers=1, max_queue=1, policy=DROP)
+        dispatcher.start()
+        accepted = [dispatcher.submit(i) for i in range(5)]
+        release.set()
+        dispatcher.shutdown()
+
+        self.assertIn(False, accepted)
+        self.assertEqual(dispatcher.stats()["dropped"], accepted.count(False))
+
+    def test_failures_are_counted(self):
+        # Test Case: Handler errors do not stop the worker
+        def handler(item):
+            if item == "bad":
+                raise ValueError("bad item")
+
+        dispatcher = MessageDispatcher(handler, workers=1)
+        dispatcher.start()
+        dispatcher.submit("bad")
+        dispatcher.submit("good")
+        dispatcher.shutdown()
+
+        stats = dispatcher.stats()
+        self.assertEqual((stats["failed"], stats["processed"]), (1, 1))
+
+    def test_submit_after_shutdown(self):
+        # Test Case: Items submitted after shutdown are dropped
+        dispatcher = MessageDispatcher(lambda item: None, workers=1)
+        dispatcher.start()
+        dispatcher.shutdown()
+        self.assertFalse(dispatcher.submit("late"))
+
+
+class TestOnMessageEnqueues(unittest.TestCase):
+    def test_on_message_enqueues(self):
+        # Test Case: on_message hands the message to the dispatcher
+        original = app_module.dispatcher
+        app_module.dispatcher = MagicMock()
+        try:
+            msg = MagicMock()
+            app_module.on_message("client", None, msg)
+            app_module.dispatcher.submit.assert_called_once_with(("client", msg))
+        finally:
+            app_module.dispatcher = original
+
+
+if __name__ == "__main__":
+    unittest.main()
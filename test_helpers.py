@@ -0,0 +1,56 @@
+"""
+Shared Test Helpers
+Author: Liliya
+----------------------------
+This module holds the fixtures shared by the test suites, so each suite builds its
+records and clocks the same way.
+
+Main Classes and Functions:
+- make_record: Builds a submitted family record.
+- make_client: Builds a mock MQTT client whose publishes succeed.
+- FakeClock: A clock the tests advance by hand.
+"""
+
+from unittest.mock import MagicMock
+
+import paho.mqtt.client as mqtt
+
+
+def make_record(topic_id, children=1, composition="couple", eligible=True):
+    """
+    Build a submitted family record.
+
+    :param topic_id: object
+        The `id` of the record (None for MQTT inputs, or an invalid value to test validation).
+    :param children: object
+    :param composition: object
+    :param eligible: object
+    :return: dict
+    """
+    return {
+        "id": topic_id,
+        "numberOfChildren": children,
+        "familyComposition": composition,
+        "familyUnitInPayForDecember": eligible,
+    }
+
+
+def make_client():
+    """
+    Build a mock MQTT client whose publishes report success, like a connected client.
+
+    :return: MagicMock
+    """
+    client = MagicMock()
+    client.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+    return client
+
+
+class FakeClock:
+    """A clock returning `now`, which the tests set by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
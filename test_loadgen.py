@@ -0,0 +1,66 @@
+"""
+Load Generator Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the offline load generator against the in-process broker.
+
+Key Features:
+1. Verifies HTTP and MQTT submissions are followed to their published results.
+2. Verifies results that are never published are reported as lost.
+3. Verifies a rate sweep paces requests and marks saturated steps.
+4. Verifies fractional percentiles such as p99.9 are reported.
+"""
+
+from unittest.mock import patch
+import unittest
+
+import app as app_module
+import loadgen
+from benchmark import percentiles
+
+SUMMARY_KEYS = {"sent", "rejected", "failed", "completed", "lost", "lossRate", "seconds",
+                "offeredPerSecond", "throughputPerSecond", "p50Ms", "p99Ms", "p999Ms"}
+
+
+class TestLoadGenerator(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(app_module.deduplicator.clear)
+
+    def test_http_and_mqtt_modes(self):
+        # Test Case: Every request completes with no loss, through /submit and the input topics
+        for mode in loadgen.MODES:
+            summary = loadgen.run_load(mode, requests=200, concurrency=4)
+            self.assertEqual(set(summary), SUMMARY_KEYS)
+            self.assertEqual((summary["completed"], summary["lost"], summary["lossRate"]), (200, 0, 0.0))
+            self.assertLessEqual(summary["p50Ms"], summary["p999Ms"])
+
+    def test_repeated_inputs_complete(self):
+        # Test Case: Inputs answered from the memo cache still publish a result
+        summary = loadgen.run_load("http", requests=100, concurrency=2, repeat_inputs=True)
+        self.assertEqual(summary["completed"], 100)
+
+    def test_unpublished_results_are_lost(self):
+        # Test Case: Requests whose result never reaches the output topic count as lost
+        with patch.object(app_module, "publish_result", lambda *args, **kwargs: None):
+            summary = loadgen.run_load("mqtt", requests=20, concurrency=2, timeout=0.2)
+        self.assertEqual((summary["completed"], summary["lost"], summary["lossRate"]), (0, 20, 1.0))
+        self.assertNotIn("p50Ms", summary)
+
+    def test_sweep(self):
+        # Test Case: Each step sends rate * duration requests at about the target rate
+        steps = loadgen.sweep([200, 400], duration=0.25, mode="mqtt", concurrency=2)
+        self.assertEqual([step["sent"] for step in steps], [50, 100])
+        for step in steps:
+            self.assertGreaterEqual(step["seconds"], 0.2)
+            self.assertIn("saturated", step)
+        with patch.object(app_module, "publish_result", lambda *args, **kwargs: None):
+            self.assertTrue(loadgen.sweep([100], duration=0.1, mode="mqtt", timeout=0.1)[0]["saturated"])
+
+    def test_fractional_percentiles(self):
+        # Test Case: p99.9 is reported as p999Ms
+        samples = [index / 1000 for index in range(1, 1001)]
+        self.assertEqual(percentiles(samples, (50, 99.9)), {"p50Ms": 500.0, "p999Ms": 999.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Local Broker Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the in-process MQTT broker stand-in and uses it to exercise
+the real submit -> MQTT -> on_message -> result flow of the Flask application.
+
+Key Features:
+1. Verifies topic filters with wildcards route messages to subscribers.
+2. Verifies an end-to-end submission through `app.on_message` without MagicMock.
+"""
+
+import unittest
+
+import app as app_module
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_OUTPUT_TOPIC_BASE
+from local_broker import LocalBroker, LocalClient
+
+
+class TestLocalBroker(unittest.TestCase):
+    def setUp(self):
+        self.broker = LocalBroker()
+        self.addCleanup(self.broker.stop)
+
+    def subscriber(self, topic_filter):
+        received = []
+        client = LocalClient(self.broker)
+        client.on_message = lambda c, userdata, msg: received.append((msg.topic, msg.payload))
+        client.connect()
+        client.subscribe(topic_filter)
+        return received
+
+    def test_wildcard_routing(self):
+        # Test Case: Messages reach only the subscriptions whose filter matches
+        single_level = self.subscriber("BRE/input/+")
+        multi_level = self.subscriber("BRE/#")
+        other = self.subscriber("OTHER/#")
+        publisher = LocalClient(self.broker)
+        publisher.connect()
+
+        publisher.publish("BRE/input/abc", "payload")
+        publisher.publish("BRE/input/abc/extra", b"raw")
+        self.broker.flush()
+
+        self.assertEqual(single_level, [("BRE/input/abc", b"payload")])
+        self.assertEqual(len(multi_level), 2)
+        self.assertEqual(other, [])
+
+    def test_publish_while_disconnected(self):
+        # Test Case: Publishing before connect reports MQTT_ERR_NO_CONN
+        client = LocalClient(self.broker)
+        self.assertNotEqual(client.publish("BRE/input/abc", "x").rc, 0)
+
+
+class TestEndToEndWithLocalBroker(unittest.TestCase):
+    def test_submit_to_result(self):
+        # Test Case: Submission flows through the broker, on_message and the result store
+        broker = LocalBroker()
+        client = LocalClient(broker)
+        client.on_message = app_module.on_message
+        client.connect()
+        client.subscribe(f"{MQTT_INPUT_TOPIC_BASE}/+")
+        outputs = []
+        listener = LocalClient(broker)
+        listener.on_message = lambda c, userdata, msg: outputs.append(msg.topic)
+        listener.connect()
+        listener.subscribe(f"{MQTT_OUTPUT_TOPIC_BASE}/+")
+
+        original_client = app_module.client
+        app_module.client = client
+        app_module.dispatcher.start()
+        try:
+            test_client = app_module.app.test_client()
+            test_client.post('/submit', json={
+                "id": "local1", "numberOfChildren": 1, "familyComposition": "single",
+                "familyUnitInPayForDecember": True,
+            })
+            response = test_client.get('/result/local1?wait=5')
+        finally:
+            app_module.client = original_client
+            broker.flush()
+            broker.stop()
+
+        self.assertEqual(response.json["supplementAmount"], 140.0)
+        self.assertEqual(outputs, [f"{MQTT_OUTPUT_TOPIC_BASE}/local1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
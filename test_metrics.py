@@ -0,0 +1,138 @@
+"""
+Metrics Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the metrics registry and the `/metrics` endpoint.
+
+Key Features:
+1. Verifies counters, histograms and callbacks render in the Prometheus text format, and that
+   callbacks sharing a stats function read it once per scrape.
+2. Verifies HTTP requests, MQTT publishes and calculations are recorded.
+3. Verifies errors are counted by stage and type.
+"""
+
+from unittest.mock import MagicMock, patch
+import json
+import unittest
+import app as app_module
+from metrics import Registry
+from config import MQTT_INPUT_TOPIC_BASE
+from test_helpers import make_client
+
+
+def sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        # Test Case: Labelled counters, histograms and callbacks
+        registry = Registry()
+        requests = registry.counter("requests_total", "Requests.", ("route",))
+        latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        registry.callback("queue_depth", "Depth.", lambda: {"a": 3}, labelnames=("queue",))
+        requests.labels('/say "hi"').inc()
+        requests.labels('/say "hi"').inc(2)
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+
+        text = registry.render()
+
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{route="/say \\"hi\\""} 3', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("latency_seconds_count 3", text)
+        self.assertIn("latency_seconds_sum 5.55", text)
+        self.assertIn('queue_depth{queue="a"} 3', text)
+
+    def test_shared_callbacks_read_once(self):
+        # Test Case: Metrics sharing a stats function read it once per render
+        registry = Registry()
+        stats = MagicMock(return_value={"size": 4, "hits": 7})
+        registry.callbacks(stats, (
+            ("store_entries", "gauge", "size", "Entries."),
+            ("store_hits_total", "counter", "hits", "Hits."),
+        ))
+
+        text = registry.render()
+
+        self.assertEqual(stats.call_count, 1)
+        self.assertIn("# TYPE store_hits_total counter", text)
+        self.assertEqual((sample(text, "store_entries"), sample(text, "store_hits_total")), (4, 7))
+
+    def test_duplicate_and_label_errors(self):
+        registry = Registry()
+        counter = registry.counter("x_total", "X.", ("a",))
+        with self.assertRaises(ValueError):
+            registry.counter("x_total", "X.")
+        with self.assertRaises(ValueError):
+            counter.labels("1", "2")
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = make_client()
+        app_module.client.publish = self.mock_client.publish
+        app_module.deduplicator.clear()
+
+    def metrics(self):
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        return response.get_data(as_text=True)
+
+    def test_request_and_publish_counters(self):
+        # Test Case: A submission is counted per route and published to the input topic
+        before = self.metrics()
+        self.app.post('/submit', json={
+            "id": "metrics1", "numberOfChildren": 3, "familyComposition": "couple",
+            "familyUnitInPayForDecember": True,
+        })
+        after = self.metrics()
+
+        route = 'supplement_http_requests_total{route="/submit",method="POST",status="200"}'
+        self.assertEqual(sample(after, route) - sample(before, route), 1)
+        published = 'supplement_mqtt_published_total{topic="input"}'
+        self.assertEqual(sample(after, published) - sample(before, published), 1)
+        self.assertIn('supplement_http_request_duration_seconds_count{route="/submit"}', after)
+
+    def test_result_store_read_once_per_scrape(self):
+        # Test Case: The result store statistics are read once for all of its metrics
+        store = MagicMock()
+        store.stats.return_value = {"size": 2, "hits": 1, "misses": 0, "evictions": 0, "waiters": 0, "pending": 1}
+        with patch.object(app_module, "results", store):
+            text = self.metrics()
+        store.stats.assert_called_once_with()
+        self.assertEqual(sample(text, "supplement_result_store_entries"), 2)
+
+    def test_message_processing_and_errors(self):
+        # Test Case: Worker processing is timed and failures are counted by type
+        before = self.metrics()
+        good = MagicMock(topic=f"{MQTT_INPUT_TOPIC_BASE}/metrics2", payload=json.dumps({
+            "numberOfChildren": 0, "familyComposition": "single", "familyUnitInPayForDecember": True,
+        }))
+        bad = MagicMock(topic=f"{MQTT_INPUT_TOPIC_BASE}/metrics3", payload=json.dumps({
+            "numberOfChildren": -1, "familyComposition": "single", "familyUnitInPayForDecember": True,
+        }))
+        app_module.handle_message((self.mock_client, good))
+        with self.assertRaises(ValueError):
+            app_module.handle_message((self.mock_client, bad))
+        after = self.metrics()
+
+        calculations = "supplement_calculation_duration_seconds_count"
+        self.assertEqual(sample(after, calculations) - sample(before, calculations), 1)
+        processed = 'supplement_mqtt_message_duration_seconds_count{topic="input"}'
+        self.assertEqual(sample(after, processed) - sample(before, processed), 2)
+        errors = 'supplement_errors_total{stage="record",type="ValidationError"}'
+        self.assertEqual(sample(after, errors) - sample(before, errors), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Offline Queue Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the on-disk queue of messages published while the MQTT
+client is disconnected.
+
+Key Features:
+1. Verifies messages are replayed in order and survive reopening the queue.
+2. Verifies the oldest messages are dropped once the queue is full.
+3. Verifies a replay stops, keeping the message, when the connection drops again.
+4. Verifies messages published during a replay are queued behind the backlog, and that opening
+   the queue reports the backlog of a previous run.
+5. Verifies the application queues publishes while disconnected and replays them on reconnect.
+"""
+
+from unittest.mock import patch
+import os
+import tempfile
+import time
+import unittest
+
+import app as app_module
+from offline_queue import OfflineQueue
+from local_broker import LocalBroker, LocalClient
+
+
+class TestOfflineQueue(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "offline.db")
+
+    def make_queue(self, **kwargs):
+        queue = OfflineQueue(self.path, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_replay_in_order(self):
+        # Test Case: Messages are replayed in publish order and removed from the queue
+        queue = self.make_queue()
+        queue.put("a", b"1", 1)
+        queue.put("b", "2", 0)
+        sent = []
+        replayed = queue.replay(lambda *message: sent.append(message) or True)
+
+        self.assertEqual(replayed, 2)
+        self.assertEqual(sent, [("a", b"1", 1), ("b", b"2", 0)])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.stats()["replayed"], 2)
+
+    def test_persistence(self):
+        # Test Case: Queued messages survive closing and reopening the database
+        queue = self.make_queue()
+        queue.put("a", b"1")
+        queue.close()
+
+        reopened = self.make_queue()
+        self.assertEqual(len(reopened), 1)
+        sent = []
+        reopened.replay(lambda *message: sent.append(message) or True)
+        self.assertEqual(sent, [("a", b"1", 0)])
+
+    def test_defer_behind_backlog(self):
+        # Test Case: Messages deferred during a replay are sent after the backlog, by the same replay
+        queue = self.make_queue()
+        self.assertFalse(queue.defer("t", b"direct"))
+        queue.put("t", b"0")
+        sent = []
+
+        def publish(topic, payload, qos):
+            if payload == b"0":
+                self.assertTrue(queue.defer("t", b"1"))  # A live publish while the replay runs
+            sent.append(payload)
+            return True
+
+        self.assertEqual(queue.replay(publish), 2)
+        self.assertEqual(sent, [b"0", b"1"])
+        self.assertFalse(queue.replaying)
+        self.assertFalse(queue.defer("t", b"direct"))
+
+    def test_open_reports_backlog(self):
+        # Test Case: Opening the queue counts the messages left by a previous run
+        queue = self.make_queue()
+        queue.put("t", b"0")
+        queue.close()
+        reopened = self.make_queue()
+        self.assertEqual(reopened.stats()["size"], 0)  # Not opened yet
+        reopened.open()
+        self.assertEqual(reopened.stats()["size"], 1)
+
+    def test_bound_drops_oldest(self):
+        # Test Case: Beyond max_messages, the oldest messages are dropped and counted
+        queue = self.make_queue(max_messages=2)
+        for i in range(5):
+            queue.put("t", str(i))
+        sent = []
+        queue.replay(lambda topic, payload, qos: sent.append(payload) or True)
+
+        self.assertEqual(sent, [b"3", b"4"])
+        self.assertEqual(queue.stats()["dropped"], 3)
+
+    def test_replay_stops(self):
+        # Test Case: A refused message stops the replay and stays queued with the rest
+        queue = self.make_queue()
+        for i in range(3):
+            queue.put("t", str(i))
+        sent = []
+
+        def publish(topic, payload, qos):
+            if payload == b"1":
+                return False
+            sent.append(payload)
+            return True
+
+        self.assertEqual(queue.replay(publish, batch_size=2), 1)
+        self.assertEqual(sent, [b"0"])
+        self.assertEqual(len(queue), 2)
+
+    def test_app_queues_while_disconnected(self):
+        # Test Case: The application queues publishes while disconnected and replays them on reconnect
+        broker = LocalBroker()
+        self.addCleanup(broker.stop)
+        received = []
+        subscriber = LocalClient(broker)
+        subscriber.on_message = lambda c, userdata, msg: received.append(msg.payload)
+        subscriber.connect()
+        subscriber.subscribe("queued/#")
+        client = LocalClient(broker)
+
+        with patch.object(app_module, "offline_queue", self.make_queue()), \
+                patch.object(app_module, "_mqtt_started", True):
+            app_module.publish(client, "queued/1", b"payload")
+            self.assertEqual(len(app_module.offline_queue), 1)
+
+            client.connect()
+            with patch.object(app_module, "start_offline_replay") as start_replay:
+                app_module.publish(client, "queued/2", b"live")  # Connected, but behind the backlog
+            start_replay.assert_called_once_with(client)
+            self.assertEqual(app_module.replay_offline_queue(client), 2)
+            self.assertEqual(len(app_module.offline_queue), 0)
+            app_module.publish(client, "queued/3", b"direct")
+
+        deadline = time.monotonic() + 2
+        while len(received) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(received, [b"payload", b"live", b"direct"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Output Batcher Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the micro-batching of published results.
+
+Key Features:
+1. Verifies batches are published when full, after the delay, and on close.
+2. Verifies results of different payload formats are batched separately.
+3. Verifies the API stores results received on the batch output topic.
+"""
+
+from unittest.mock import MagicMock
+import json
+import threading
+import unittest
+import codec
+import app as app_module
+from output_batcher import OutputBatcher, SIZE, TIME, CLOSE
+from config import MQTT_OUTPUT_BATCH_TOPIC
+
+RESULT = {"isEligible": True, "baseAmount": 60.0, "childrenAmount": 0.0, "supplementAmount": 60.0}
+
+
+class TestOutputBatcher(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+        self.observed = []
+        self.flushed = threading.Event()
+
+        def publish(topic, payload):
+            self.published.append((topic, payload))
+            self.flushed.set()
+
+        self.publish = publish
+
+    def make_batcher(self, **kwargs):
+        batcher = OutputBatcher(self.publish, MQTT_OUTPUT_BATCH_TOPIC,
+                                observe=lambda *args: self.observed.append(args), **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_size_flush(self):
+        # Test Case: A full batch is published at once, as one array with the ids
+        batcher = self.make_batcher(max_items=2, max_delay=60)
+        batcher.add("a", RESULT)
+        self.assertEqual(self.published, [])
+        batcher.add("b", RESULT)
+
+        self.assertEqual(len(self.published), 1)
+        topic, payload = self.published[0]
+        self.assertEqual(topic, MQTT_OUTPUT_BATCH_TOPIC)
+        self.assertEqual([record["id"] for record in json.loads(payload)], ["a", "b"])
+        self.assertEqual(self.observed[0][0], 2)
+        self.assertEqual(self.observed[0][2], SIZE)
+
+    def test_time_flush(self):
+        # Test Case: A partial batch is published once its oldest result waited max_delay
+        batcher = self.make_batcher(max_items=100, max_delay=0.01)
+        batcher.add("a", RESULT)
+        self.assertTrue(self.flushed.wait(5))
+        self.assertEqual(json.loads(self.published[0][1]), [dict(RESULT, id="a")])
+        self.assertEqual(self.observed[0][2], TIME)
+
+    def test_close_flushes_by_format(self):
+        # Test Case: Each payload format gets its own batch, published on close
+        batcher = self.make_batcher(max_items=100, max_delay=60)
+        batcher.add("a", RESULT)
+        if codec.MSGPACK in codec.available_formats():
+            batcher.add("b", RESULT, codec.MSGPACK)
+        batcher.close()
+
+        topics = sorted(topic for topic, _ in self.published)
+        expected = [MQTT_OUTPUT_BATCH_TOPIC]
+        if codec.MSGPACK in codec.available_formats():
+            expected.append(f"{MQTT_OUTPUT_BATCH_TOPIC}/msgpack")
+        self.assertEqual(topics, expected)
+        self.assertTrue(all(reason == CLOSE for _, _, reason in self.observed))
+        self.assertEqual(batcher.stats()["buffered"], 0)
+
+
+class TestBatchOutputMessage(unittest.TestCase):
+    def test_store_batch_output(self):
+        # Test Case: Results on the batch output topic are stored under their ids
+        msg = MagicMock()
+        msg.topic = MQTT_OUTPUT_BATCH_TOPIC
+        msg.payload = json.dumps([dict(RESULT, id="outbatch1"), dict(RESULT, id="outbatch2", supplementAmount=0.0)])
+
+        app_module.process_message(MagicMock(), msg)
+
+        self.assertEqual(app_module.results["outbatch1"], RESULT)
+        self.assertEqual(app_module.results["outbatch2"]["supplementAmount"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Profiling Hooks Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the sampled request profiler, the phase timings and the
+slow-request log, on their own and wired into the Flask application.
+
+Key Features:
+1. Verifies a disabled profiler captures nothing and returns a shared no-op phase.
+2. Verifies sampled requests are profiled and their hot functions aggregated.
+3. Verifies slow requests are logged with their phase breakdown.
+4. Verifies the profiling header, the MQTT worker phases and the `/debug/profile` endpoint.
+"""
+
+from unittest.mock import MagicMock, patch
+import json
+import unittest
+
+import app as app_module
+from config import MQTT_INPUT_TOPIC_BASE
+from profiling import RequestProfiler
+
+
+def busy():
+    return sum(range(1000))
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        # Test Case: Nothing is captured and phases are the same no-op object
+        profiler = RequestProfiler()
+        self.assertIsNone(profiler.begin("GET /"))
+        self.assertIs(profiler.phase("parse"), profiler.phase("store"))
+        self.assertEqual(profiler.report()["captured"], 0)
+
+    def test_sampling(self):
+        # Test Case: Only requests drawn below the ratio are profiled
+        draws = iter([0.1, 0.9])
+        profiler = RequestProfiler(sample_ratio=0.5, random=lambda: next(draws))
+        capture = profiler.begin("POST /submit")
+        busy()
+        profiler.end(capture)
+        self.assertIsNone(profiler.begin("POST /submit"))
+
+        report = profiler.report(sort="calls", limit=100)
+        self.assertEqual((report["captured"], report["profiled"]), (1, 1))
+        self.assertTrue(any("busy" in row["function"] for row in report["functions"]))
+        self.assertIn("busy", profiler.report_text())
+        profiler.reset()
+        self.assertEqual(profiler.report()["functions"], [])
+
+    def test_slow_requests(self):
+        # Test Case: Requests over the threshold are logged with their phases; fast ones are not
+        lines = []
+        profiler = RequestProfiler(slow_seconds=0.0, log=lines.append)
+        capture = profiler.begin("mqtt input")
+        with profiler.phase("calc"):
+            busy()
+        with profiler.phase("publish"):
+            pass
+        self.assertIsNone(profiler.begin("nested"))
+        profiler.end(capture)
+
+        report = profiler.report()
+        self.assertEqual((report["profiled"], report["slow"]), (0, 1))
+        self.assertEqual(list(report["slowRequests"][0]["phases"]), ["calc", "publish"])
+        self.assertEqual(report["phases"]["calc"]["count"], 1)
+        self.assertIn("Slow request mqtt input", lines[0])
+        self.assertIn("calc=", lines[0])
+
+        profiler.slow_seconds = 60.0
+        profiler.end(profiler.begin("fast"))
+        self.assertEqual(profiler.report()["slow"], 1)
+
+
+class TestProfilingEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = MagicMock()
+        self.lines = []
+        self.profiler = RequestProfiler(slow_seconds=0.0, log=self.lines.append)
+        for name, value in (("client", self.mock_client), ("profiler", self.profiler),
+                            ("PROFILE_HEADER", "X-Profile"), ("PROFILE_DEBUG_ENDPOINT", True)):
+            patcher = patch.object(app_module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app_module.deduplicator.clear()
+        self.addCleanup(app_module.deduplicator.clear)
+
+    def test_submit_phases_and_header(self):
+        # Test Case: /submit records its phases; the header also runs it under cProfile
+        record = {"id": "prof1", "numberOfChildren": 3, "familyComposition": "single",
+                  "familyUnitInPayForDecember": True}
+        self.app.post("/submit", json=record, headers={"X-Profile": "1"})
+
+        report = self.app.get("/debug/profile?limit=5").json
+        self.assertEqual((report["captured"], report["profiled"]), (1, 1))
+        self.assertEqual(set(report["slowRequests"][0]["phases"]), {"parse", "validate", "dedup", "publish"})
+        self.assertEqual(report["slowRequests"][0]["name"], "POST /submit")
+        self.assertEqual(len(report["functions"]), 5)
+        self.assertIn("function calls", self.app.get("/debug/profile?format=text").get_data(as_text=True))
+        self.assertEqual(self.app.get("/debug/profile?sort=bogus").status_code, 400)
+
+        self.app.delete("/debug/profile")
+        self.assertEqual(self.profiler.report()["captured"], 1)  # The GET that reported it
+
+    def test_mqtt_message_phases(self):
+        # Test Case: Worker-side parse, validate, calc, store and publish are timed per message
+        msg = MagicMock()
+        msg.topic = f"{MQTT_INPUT_TOPIC_BASE}/prof2"
+        msg.properties = None
+        msg.payload = json.dumps({"numberOfChildren": 1, "familyComposition": "couple",
+                                  "familyUnitInPayForDecember": True}).encode()
+        app_module.handle_message((self.mock_client, msg))
+
+        slow = self.profiler.report()["slowRequests"][0]
+        self.assertEqual(slow["name"], "mqtt input")
+        self.assertEqual(set(slow["phases"]), {"parse", "validate", "calc", "store", "publish"})
+
+    def test_endpoint_disabled(self):
+        # Test Case: /debug/profile is not served unless enabled
+        with patch.object(app_module, "PROFILE_DEBUG_ENDPOINT", False):
+            self.assertEqual(self.app.get("/debug/profile").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
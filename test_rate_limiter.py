@@ -0,0 +1,122 @@
+"""
+Admission Control Test Suite
+Author: Liliya
+----------------------------
+This test suite validates per-client rate limiting and the cap on submissions
+awaiting a result.
+
+Key Features:
+1. Verifies the token bucket admits a burst, refills over time and is bounded in clients.
+2. Verifies the result store counts pending placeholders, including after evictions and timeouts.
+3. Verifies `/submit` and `/submit/batch` answer 429 with a Retry-After header when rejected.
+"""
+
+from unittest.mock import patch
+import unittest
+import app as app_module
+from rate_limiter import TokenBucketLimiter
+from result_store import InMemoryResultStore
+from test_helpers import FakeClock, make_client, make_record
+
+RESULT = {"isEligible": True, "baseAmount": 60.0, "childrenAmount": 0.0, "supplementAmount": 60.0}
+
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = TokenBucketLimiter(rate=10, burst=5, max_clients=2, clock=self.clock)
+
+    def test_burst_then_refill(self):
+        # Test Case: A client spends its burst, then waits for tokens to refill
+        for _ in range(5):
+            self.assertEqual(self.limiter.acquire("a"), 0.0)
+        self.assertAlmostEqual(self.limiter.acquire("a"), 0.1)
+
+        self.clock.now = 0.1
+        self.assertEqual(self.limiter.acquire("a"), 0.0)
+        self.assertEqual(self.limiter.stats()["limited"], 1)
+
+    def test_clients_are_independent(self):
+        # Test Case: One client's flood does not limit another client
+        for _ in range(5):
+            self.limiter.acquire("a")
+        self.assertGreater(self.limiter.acquire("a"), 0)
+        self.assertEqual(self.limiter.acquire("b"), 0.0)
+
+    def test_large_cost(self):
+        # Test Case: A request larger than the burst is admitted on a full bucket and paid for afterwards
+        self.assertEqual(self.limiter.acquire("a", cost=25), 0.0)
+        self.assertAlmostEqual(self.limiter.acquire("a"), 2.1)
+
+    def test_bounded_clients(self):
+        # Test Case: The least recently seen clients are forgotten beyond max_clients
+        for client in ("a", "b", "c"):
+            self.limiter.acquire(client)
+        self.assertEqual(self.limiter.stats()["clients"], 2)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            TokenBucketLimiter(rate=0, burst=5)
+
+
+class TestPendingCount(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = InMemoryResultStore(max_entries=3, ttl_seconds=3600, pending_timeout=60, clock=self.clock)
+
+    def test_pending_until_result(self):
+        # Test Case: Placeholders are counted until their result is stored
+        self.store["a"] = {"status": "pending"}
+        self.store["b"] = {"status": "pending"}
+        self.assertEqual(self.store.pending_count(), 2)
+        self.store["a"] = RESULT
+        self.assertEqual(self.store.pending_count(), 1)
+        self.assertEqual(self.store.stats()["pending"], 1)
+
+    def test_eviction_and_timeout(self):
+        # Test Case: Evicted and timed-out placeholders are no longer counted
+        self.store["a"] = {"status": "pending"}
+        for key in ("b", "c", "d"):
+            self.store[key] = RESULT
+        self.assertEqual(self.store.pending_count(), 0)
+
+        self.store["e"] = {"status": "pending"}
+        self.clock.now = 61
+        self.assertEqual(self.store.pending_count(), 0)
+
+
+class TestSubmitAdmission(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = make_client()
+        app_module.client.publish = self.mock_client.publish
+        app_module.deduplicator.clear()
+
+    def test_rate_limited(self):
+        # Test Case: Submissions beyond the client's burst get 429 with Retry-After
+        limiter = TokenBucketLimiter(rate=0.5, burst=2)
+        with patch.object(app_module, "rate_limiter", limiter):
+            statuses = [
+                self.app.post('/submit', json=make_record(f"rate{i}", children=i)).status_code for i in range(3)
+            ]
+            response = self.app.post('/submit/batch', json=[make_record("rate3")])
+
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "2")
+        self.assertEqual(self.mock_client.publish.call_count, 2)
+
+    def test_pending_cap(self):
+        # Test Case: Submissions are rejected while too many results are pending
+        app_module.results["capped"] = {"status": "pending"}
+        self.addCleanup(app_module.results.set, "capped", RESULT)
+        with patch.object(app_module, "MAX_PENDING_RESULTS", app_module.results.pending_count()):
+            response = self.app.post('/submit', json=make_record("cap1"))
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], str(app_module.ADMISSION_RETRY_AFTER_SECONDS))
+        self.mock_client.publish.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Incremental Recompute Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the recalculation of only the records affected by a rule change.
+
+Key Features:
+1. Verifies rule diffs map to the partitions whose results can change.
+2. Verifies only affected partitions are read and only changed records produce deltas.
+3. Verifies the deltas match a full recalculation with the new rules.
+4. Verifies the command line indexes a JSONL file and writes the deltas.
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from records import decode_family
+from recompute import InputSet, affected_partitions, main, partition_of, recompute
+from rule_sets import parse_rule_set
+
+RULES = {
+    "version": "1",
+    "benefitYear": 2024,
+    "baseAmountSingleNoChildren": 60.0,
+    "baseAmountCoupleNoChildren": 120.0,
+    "baseAmountWithChildren": 120.0,
+    "childSupplement": 20.0,
+}
+
+RECORDS = [
+    {"id": f"{composition}-{children}-{eligible}", "familyComposition": composition,
+     "numberOfChildren": children, "familyUnitInPayForDecember": eligible}
+    for composition in ("single", "couple") for children in (0, 1, 3) for eligible in (True, False)
+]
+
+
+def rules(**changes):
+    return parse_rule_set(dict(RULES, **changes))
+
+
+class TestRecompute(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.input_set = InputSet(os.path.join(self.directory, "inputs.db"))
+        self.addCleanup(self.input_set.close)
+        self.input_set.add(decode_family(record) for record in RECORDS)
+
+    def test_affected_partitions(self):
+        # Test Case: Each constant affects only the eligible families it applies to
+        old = rules()
+        self.assertEqual(affected_partitions(old, rules(version="2")), [])
+        self.assertEqual(affected_partitions(old, rules(childSupplement=25.0)),
+                         [("couple", True, True), ("single", True, True)])
+        self.assertEqual(affected_partitions(old, rules(baseAmountSingleNoChildren=70.0)),
+                         [("single", False, True)])
+
+    def test_only_affected_records_are_read(self):
+        # Test Case: A child supplement change reads and changes only families with children
+        deltas = []
+        stats = recompute(self.input_set, rules(), rules(version="2", childSupplement=25.0), deltas.append)
+
+        self.assertEqual((stats["scanned"], stats["skipped"], stats["changed"]), (4, 8, 4))
+        self.assertEqual(sorted(delta["id"] for delta in deltas),
+                         ["couple-1-True", "couple-3-True", "single-1-True", "single-3-True"])
+        delta = next(delta for delta in deltas if delta["id"] == "single-3-True")
+        self.assertEqual(delta["childrenAmount"], 75.0)
+        self.assertEqual(delta["supplementAmountChange"], 15.0)
+        self.assertEqual((delta["ruleVersion"], delta["previousRuleVersion"]), ("2", "1"))
+
+    def test_deltas_match_full_recalculation(self):
+        # Test Case: Applying the deltas gives the same amounts as recalculating everything
+        old, new = rules(), rules(version="2", baseAmountWithChildren=130.0, baseAmountCoupleNoChildren=125.0)
+        deltas = {}
+        recompute(self.input_set, old, new, lambda delta: deltas.__setitem__(delta["id"], delta))
+
+        for record in RECORDS:
+            family = decode_family(record)
+            full = new.result(family.family_composition, family.number_of_children) \
+                if family.family_unit_in_pay else new.ineligible
+            current = old.result(family.family_composition, family.number_of_children) \
+                if family.family_unit_in_pay else old.ineligible
+            amount = deltas[family.id]["supplementAmount"] if family.id in deltas else current.supplement_amount
+            self.assertEqual(amount, full.supplement_amount, record)
+            self.assertEqual(family.id in deltas, partition_of(family) in affected_partitions(old, new))
+
+    def test_command_line(self):
+        # Test Case: Index a JSONL file, then write the deltas for a new rule-set file
+        source = os.path.join(self.directory, "in.jsonl")
+        with open(source, "w") as f:
+            for record in RECORDS[:4]:
+                f.write(json.dumps(record) + "\n")
+            f.write("{broken\n")
+        old_rules, new_rules = os.path.join(self.directory, "old.json"), os.path.join(self.directory, "new.json")
+        with open(old_rules, "w") as f:
+            json.dump(RULES, f)
+        with open(new_rules, "w") as f:
+            json.dump(dict(RULES, version="2", baseAmountSingleNoChildren=70.0), f)
+        database = os.path.join(self.directory, "cli.db")
+        output = os.path.join(self.directory, "deltas.jsonl")
+
+        self.assertEqual(main(["index", source, "--db", database]), 0)
+        self.assertEqual(main(["diff", "--db", database, "--old", old_rules, "--new", new_rules,
+                               "--output", output]), 0)
+        with open(output) as f:
+            deltas = [json.loads(line) for line in f]
+        self.assertEqual([delta["id"] for delta in deltas], ["single-0-True"])
+        self.assertEqual(deltas[0]["baseAmount"], 70.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Records Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the typed family/result records and the shared schema validator.
+
+Key Features:
+1. Verifies valid records decode in one pass and invalid ones report the first bad field.
+2. Verifies `calculate` matches `calculate_supplement` and shares immutable results.
+3. Verifies invalid MQTT inputs are stored as errors instead of staying pending.
+4. Verifies ids that are not non-empty strings, or are not a single MQTT topic level, are rejected
+   on /submit and MQTT.
+"""
+
+import itertools
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+
+import codec
+import app as app_module
+from app import process_message, process_record, results
+from config import MQTT_INPUT_BATCH_TOPIC
+from records import FamilyInput, SupplementResult, ValidationError, decode_family, is_topic_id
+from supplement_calculator import calculate, calculate_supplement
+from test_helpers import make_record
+
+
+class TestDecodeFamily(unittest.TestCase):
+    def test_valid_record(self):
+        family = decode_family(make_record("rec1", children=2))
+        self.assertEqual(family, FamilyInput("rec1", "couple", 2, True))
+        self.assertFalse(hasattr(family, "__dict__"))
+
+    def test_first_invalid_field_is_reported(self):
+        # Test Case: Errors match the messages returned by /submit
+        cases = [
+            (None, "Invalid record"),
+            (make_record("", children=2), "Topic ID is required"),
+            (make_record("rec1", composition="invalid", children=-1), "Invalid familyComposition"),
+            (make_record("rec1", children=-3), "Invalid numberOfChildren"),
+            (make_record("rec1", children="2"), "Invalid numberOfChildren"),
+            (make_record("rec1", eligible="yes"), "Invalid familyUnitInPayForDecember"),
+        ]
+        for data, message in cases:
+            with self.assertRaises(ValidationError) as context:
+                decode_family(data)
+            self.assertEqual(str(context.exception), message)
+
+    def test_id_must_be_one_topic_level(self):
+        # Test Case: Ids that would add topic levels or wildcards to the MQTT topics are rejected
+        for topic_id in ("a/b", "/", "a+", "#", "a\0b"):
+            with self.assertRaises(ValidationError) as context:
+                decode_family(make_record(topic_id))
+            self.assertEqual(str(context.exception), "Topic ID is required")
+        self.assertTrue(is_topic_id("rec-1_a.b"))
+
+    def test_id_optional(self):
+        family = decode_family(make_record(None, children=2), require_id=False)
+        self.assertIsNone(family.id)
+
+    def test_id_must_be_a_string(self):
+        # Test Case: Non-string ids are rejected at decode time, even when the id is optional
+        for topic_id in ({"a": 1}, ["x"], 5, True):
+            for require_id in (True, False):
+                with self.assertRaises(ValidationError):
+                    decode_family(make_record(topic_id), require_id=require_id)
+
+
+class TestCalculate(unittest.TestCase):
+    def test_matches_calculate_supplement(self):
+        for composition, children, eligible in itertools.product(["single", "couple"], [0, 1, 3, 50], [True, False]):
+            record = make_record("rec1", children, composition, eligible)
+            self.assertEqual(calculate(decode_family(record)).to_dict(), calculate_supplement(record))
+
+    def test_results_are_shared_and_immutable(self):
+        # Test Case: Table results are reused rather than allocated per request
+        family = decode_family(make_record("rec1", children=2))
+        self.assertIs(calculate(family), calculate(family))
+        with self.assertRaises(AttributeError):
+            calculate(family).base_amount = 0.0
+        self.assertIsInstance(calculate(family), SupplementResult)
+
+
+class TestInvalidMqttInput(unittest.TestCase):
+    def test_invalid_record_is_stored_as_error(self):
+        # Test Case: Invalid MQTT input is reported instead of staying pending
+        mock_client = MagicMock()
+        results["rec2"] = {"status": "pending"}
+        with self.assertRaises(ValidationError):
+            process_record(mock_client, "rec2", make_record("rec2", composition="invalid"), codec.JSON)
+        self.assertEqual(results["rec2"], {"status": "error", "error": "Invalid familyComposition"})
+        mock_client.publish.assert_not_called()
+
+    def test_batch_record_with_invalid_id_is_skipped(self):
+        # Test Case: A batched MQTT record whose id is not a string is skipped; the others are processed
+        mock_client = MagicMock()
+        msg = MagicMock()
+        msg.topic = MQTT_INPUT_BATCH_TOPIC
+        msg.properties = None
+        msg.payload = json.dumps([make_record(["rec3"]), make_record("rec4")]).encode()
+        process_message(mock_client, msg)
+        self.assertTrue(results["rec4"]["isEligible"])
+        self.assertEqual(mock_client.publish.call_count, 1)
+
+
+class TestInvalidSubmitId(unittest.TestCase):
+    def test_list_id_is_rejected(self):
+        # Test Case: /submit answers 400 instead of failing in the deduplication layer
+        mock_client = MagicMock()
+        with patch.object(app_module, "client", mock_client):
+            response = app_module.app.test_client().post("/submit", json=make_record(["rec5"]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"error": "Topic ID is required"})
+        mock_client.publish.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
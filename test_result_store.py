@@ -0,0 +1,195 @@
+"""
+Result Store Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the bounded, expiring result store used by the Flask API.
+
+Key Features:
+1. Verifies least recently used eviction once the store is full.
+2. Verifies expired entries are reported distinctly from missing ones.
+3. Verifies hit/miss/eviction counters.
+4. Verifies long-polling waits are woken when a result is stored.
+5. Verifies the SQLite store is shared between store instances and processes.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from app import app, results
+from result_store import InMemoryResultStore, SQLiteResultStore, create_result_store, EXPIRED, MISSING
+from test_helpers import FakeClock
+
+
+class TestInMemoryResultStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = InMemoryResultStore(max_entries=2, ttl_seconds=10, clock=self.clock)
+
+    def test_lru_eviction(self):
+        # Test Case: Least recently used entry is evicted when full
+        self.store["a"] = {"status": "pending"}
+        self.store["b"] = {"status": "pending"}
+        self.store.lookup("a")  # "b" is now the least recently used
+        self.store["c"] = {"status": "pending"}
+
+        self.assertIs(self.store.lookup("b"), MISSING)
+        self.assertIn("a", self.store)
+        self.assertIn("c", self.store)
+        self.assertEqual(self.store.stats()["evictions"], 1)
+
+    def test_expired_entry(self):
+        # Test Case: Entry past its time-to-live is reported as expired
+        self.store["a"] = {"isEligible": False}
+        self.clock.now = 10
+        self.assertIs(self.store.lookup("a"), EXPIRED)
+        self.assertIs(self.store.lookup("a"), EXPIRED)
+        self.assertIsNone(self.store.get("a"))
+        self.assertEqual(self.store.stats()["expirations"], 1)
+
+    def test_counters(self):
+        # Test Case: Hits and misses are counted
+        self.store["a"] = {"isEligible": True}
+        self.store.lookup("a")
+        self.store.lookup("missing")
+        stats = self.store.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 1, 1))
+
+
+class TestWaitForResult(unittest.TestCase):
+    def setUp(self):
+        self.store = InMemoryResultStore(max_entries=10, ttl_seconds=None)
+
+    def test_wait_woken_by_result(self):
+        # Test Case: Waiting threads are woken when the result is stored
+        self.store["a"] = {"status": "pending"}
+        timer = threading.Timer(0.05, self.store.set, ("a", {"isEligible": True}))
+        timer.start()
+        started = time.monotonic()
+        self.assertEqual(self.store.wait_for("a", 5), {"isEligible": True})
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.store.stats()["waiters"], 0)
+
+    def test_wait_not_woken_by_pending(self):
+        # Test Case: Storing a pending placeholder does not end the wait
+        threading.Timer(0.01, self.store.set, ("b", {"status": "pending"})).start()
+        self.assertEqual(self.store.wait_for("b", 0.1), {"status": "pending"})
+        self.assertEqual(self.store.stats()["waiters"], 0)
+
+    def test_wait_returns_completed_result_immediately(self):
+        # Test Case: Completed results are returned without waiting
+        self.store["c"] = {"isEligible": False}
+        self.assertEqual(self.store.wait_for("c", 5), {"isEligible": False})
+
+
+class TestSQLiteResultStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "results.db")
+        self.clock = FakeClock()
+        self.writer = SQLiteResultStore(self.path, max_entries=3, ttl_seconds=10, clock=self.clock,
+                                        prune_interval=0)
+        self.reader = SQLiteResultStore(self.path, max_entries=3, ttl_seconds=10, clock=self.clock)
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+        shutil.rmtree(self.directory)
+
+    def test_shared_after_flush(self):
+        # Test Case: Buffered writes are visible locally at once and to other stores after a flush
+        self.writer["a"] = {"supplementAmount": 60.0}
+        self.assertEqual(self.writer["a"], {"supplementAmount": 60.0})
+        self.writer.flush()
+        self.assertEqual(self.reader["a"], {"supplementAmount": 60.0})
+        self.assertEqual(self.writer.stats()["writes"], 1)
+
+    def test_batched_writes(self):
+        # Test Case: Writes buffered together are committed in one flush
+        for key in ("a", "b", "c"):
+            self.writer[key] = {"status": "pending"}
+        self.writer.flush()
+        self.assertEqual(self.writer.stats()["flushes"], 1)
+        self.assertEqual(self.reader.stats()["size"], 3)
+
+    def test_expiry_and_eviction(self):
+        # Test Case: Expired entries are reported as EXPIRED; old entries are evicted beyond max_entries
+        self.writer["old"] = {"status": "pending"}
+        self.writer.flush()
+        self.clock.now = 11
+        self.assertIs(self.reader.lookup("old"), EXPIRED)
+        for key in ("a", "b", "c"):
+            self.writer[key] = {"status": "pending"}
+            self.writer.flush()
+        self.assertIs(self.reader.lookup("old"), MISSING)
+        self.assertEqual(self.writer.stats()["evictions"], 1)
+
+    def test_wait_for_other_store(self):
+        # Test Case: A waiting store picks up a result written by another store
+        self.reader.poll_interval = 0.01
+        threading.Timer(0.05, lambda: self.writer.set("w", {"supplementAmount": 60.0})).start()
+        self.assertEqual(self.reader.wait_for("w", 5), {"supplementAmount": 60.0})
+
+    def test_wait_for_other_process(self):
+        # Test Case: A result stored by another process is seen by this one
+        script = (
+            "import sys; from result_store import SQLiteResultStore; "
+            "store = SQLiteResultStore(sys.argv[1]); store['p'] = {'supplementAmount': 60.0}; store.close()"
+        )
+        here = os.path.dirname(os.path.abspath(__file__))
+        subprocess.run([sys.executable, "-c", script, self.path], cwd=here, check=True)
+        store = SQLiteResultStore(self.path)
+        try:
+            self.assertEqual(store.wait_for("p", 5), {"supplementAmount": 60.0})
+        finally:
+            store.close()
+
+    def test_create_result_store(self):
+        self.assertIsInstance(create_result_store("memory"), InMemoryResultStore)
+        with self.assertRaises(ValueError):
+            create_result_store("nope")
+
+
+class TestResultEndpointExpiry(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    def test_result_expired(self):
+        # Test Case: Expired Result
+        # Ensures an expired result is reported distinctly from a pending one.
+        results["expired1"] = {"isEligible": True}
+        results._entries["expired1"].expires_at = 0
+        response = self.app.get('/result/expired1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"status": "expired"})
+
+
+class TestResultEndpointWait(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+
+    def test_result_wait(self):
+        # Test Case: Long-polling request returns once on_message stores the result
+        results["wait1"] = {"status": "pending"}
+        threading.Timer(0.05, results.set, ("wait1", {"isEligible": True})).start()
+        response = self.app.get('/result/wait1?wait=5')
+        self.assertEqual(response.json, {"isEligible": True})
+
+    def test_result_wait_timeout(self):
+        # Test Case: Pending Result after the wait expires
+        results["wait2"] = {"status": "pending"}
+        response = self.app.get('/result/wait2?wait=0.05')
+        self.assertEqual(response.json, {"status": "pending"})
+
+    def test_result_invalid_wait(self):
+        response = self.app.get('/result/wait3?wait=soon')
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
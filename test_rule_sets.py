@@ -0,0 +1,137 @@
+"""
+Rule Set Test Suite
+Author: Liliya
+----------------------------
+This test suite validates versioned rule-set files and the swap of the active rules.
+
+Key Features:
+1. Verifies rule-set files are validated, compiled and selected by benefit year.
+2. Verifies compiled rule sets are immutable and tag every result with their version.
+3. Verifies a reload swaps the rules atomically and an invalid file keeps the active rules.
+4. Verifies the `/rules` endpoints and that results memoized with old rules are forgotten.
+"""
+
+from unittest.mock import MagicMock
+import json
+import os
+import tempfile
+import unittest
+import app as app_module
+import supplement_calculator
+from rule_sets import RuleSetError, find_rule_set, load_rule_set, parse_rule_set
+from records import decode_family
+from supplement_calculator import calculate, current_rules, install_rules, reload_rules
+
+RULES_2025 = {
+    "version": "2025.1",
+    "benefitYear": 2025,
+    "baseAmountSingleNoChildren": 70.0,
+    "baseAmountCoupleNoChildren": 130.0,
+    "baseAmountWithChildren": 130.0,
+    "childSupplement": 25.0,
+}
+
+
+def make_family(topic_id="r1", children=2, composition="couple"):
+    return decode_family({
+        "id": topic_id, "numberOfChildren": children, "familyComposition": composition,
+        "familyUnitInPayForDecember": True,
+    })
+
+
+class TestRuleSets(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.rules = current_rules()
+        self.addCleanup(install_rules, self.rules)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data))
+        return path
+
+    def test_compiled_rule_set(self):
+        # Test Case: Results from the table and the formulas carry the version
+        rule_set = parse_rule_set(RULES_2025, max_children=2)
+        self.assertEqual(rule_set.result("couple", 2).supplement_amount, 180.0)
+        self.assertEqual(rule_set.result("couple", 5).supplement_amount, 255.0)
+        self.assertEqual(rule_set.result("single", 5).rule_version, "2025.1")
+        self.assertEqual(rule_set.to_dict(), RULES_2025)
+        with self.assertRaises(AttributeError):
+            rule_set.child_supplement = 0.0
+
+    def test_invalid_rule_set(self):
+        # Test Case: Missing or invalid fields are rejected
+        for field, value in (("version", ""), ("benefitYear", "2025"), ("childSupplement", -1),
+                             ("baseAmountWithChildren", True)):
+            with self.assertRaises(RuleSetError):
+                parse_rule_set(dict(RULES_2025, **{field: value}))
+        with self.assertRaises(RuleSetError):
+            load_rule_set(self.write("2026.json", "{broken"))
+
+    def test_find_by_benefit_year(self):
+        # Test Case: The latest year is selected unless a year is configured
+        self.write("2024.json", dict(RULES_2025, benefitYear=2024))
+        latest = self.write("2025.json", RULES_2025)
+        self.assertEqual(find_rule_set(self.directory), latest)
+        self.assertTrue(find_rule_set(self.directory, 2024).endswith("2024.json"))
+        with self.assertRaises(RuleSetError):
+            find_rule_set(self.directory, 2030)
+
+    def test_reload_swaps_rules(self):
+        # Test Case: A reload changes later results; a held rule set keeps its amounts
+        family = make_family()
+        before = calculate(family)
+        reload_rules(self.write("2025.json", RULES_2025))
+
+        self.assertEqual(calculate(family).to_dict()["ruleVersion"], "2025.1")
+        self.assertEqual(calculate(family).supplement_amount, 180.0)
+        self.assertEqual(calculate(family, self.rules), before)
+        self.assertEqual(supplement_calculator.calculate_supplement(family.to_dict())["supplementAmount"], 180.0)
+
+    def test_invalid_reload_keeps_rules(self):
+        # Test Case: An invalid file leaves the active rules unchanged
+        with self.assertRaises(RuleSetError):
+            reload_rules(self.write("2025.json", dict(RULES_2025, childSupplement="x")))
+        self.assertIs(current_rules(), self.rules)
+
+
+class TestRuleEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.app = app_module.app.test_client()
+        self.mock_client = MagicMock()
+        app_module.client.publish = self.mock_client.publish
+        app_module.deduplicator.clear()
+        self.rules = current_rules()
+        self.addCleanup(install_rules, self.rules)
+        self.addCleanup(app_module.deduplicator.clear)
+
+    def test_get_and_reload(self):
+        # Test Case: The active rules are served and reloaded from the configured file
+        self.assertEqual(self.app.get("/rules").json["version"], self.rules.version)
+        response = self.app.post("/rules/reload")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, supplement_calculator.load_configured_rules().to_dict())
+
+    def test_reload_forgets_memoized_results(self):
+        # Test Case: After a reload, known inputs are calculated again with the new rules
+        app_module.deduplicator.admit("rule1", make_family("rule1"))
+        app_module.process_record(self.mock_client, "rule1", make_family("rule1").to_dict())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "2025.json")
+            with open(path, "w") as f:
+                json.dump(RULES_2025, f)
+            app_module.reload_rule_set(path)
+
+        self.mock_client.publish.reset_mock()
+        self.app.post("/submit", json=make_family("rule2").to_dict())
+        self.assertEqual(self.mock_client.publish.call_count, 1)
+        self.assertIn("calculateWinterSupplementInput", self.mock_client.publish.call_args.args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Application Startup Test Suite
+Author: Liliya
+----------------------------
+This test suite validates that the Flask application can be imported and built without
+a reachable MQTT broker, and that the MQTT client is only started on request.
+
+Key Features:
+1. Imports `app` in a fresh interpreter with all network and file access failing.
+2. Verifies the MQTT client connects through `start_mqtt` and subscribes on connect.
+3. Verifies result messages on the output topic are stored without recalculation.
+"""
+
+from unittest.mock import MagicMock
+import json
+import subprocess
+import sys
+import unittest
+import app as app_module
+from config import MQTT_INPUT_TOPIC_BASE, MQTT_INPUT_BATCH_TOPIC, MQTT_OUTPUT_TOPIC_BASE
+
+OFFLINE_IMPORT = """
+import socket, threading
+
+def refuse(*args, **kwargs):
+    raise OSError("network access during import")
+
+socket.socket.connect = refuse
+socket.create_connection = refuse
+socket.getaddrinfo = refuse
+
+import builtins, io, os, sqlite3
+
+def no_file_access(*args, **kwargs):
+    raise OSError("file access during import")
+
+builtins.open = io.open = no_file_access
+os.listdir = os.scandir = no_file_access
+sqlite3.connect = no_file_access
+
+import supplement_calculator
+import app
+assert threading.active_count() == 1, threading.enumerate()
+assert supplement_calculator._rules is None
+response = app.app.test_client().get("/result/unknown")
+assert response.status_code == 200, response.status_code
+"""
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_without_broker(self):
+        # Test Case: Importing the app opens no connection or file and starts no thread
+        completed = subprocess.run([sys.executable, "-c", OFFLINE_IMPORT], capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_create_app_starts_mqtt_once(self):
+        # Test Case: The client connects asynchronously and only once
+        mock_client = MagicMock()
+        original_client = app_module.client
+        app_module.client = mock_client
+        try:
+            app_module.create_app(start_mqtt_client=True)
+            app_module.create_app(start_mqtt_client=True)
+        finally:
+            app_module.stop_mqtt()
+            app_module.client = original_client
+
+        mock_client.connect_async.assert_called_once()
+        mock_client.connect.assert_not_called()
+        mock_client.loop_start.assert_called_once()
+        mock_client.disconnect.assert_called_once()
+
+    def test_subscribe_on_connect(self):
+        # Test Case: Subscriptions are (re)made on every successful connection
+        mock_client = MagicMock()
+        app_module.on_connect(mock_client, None, {}, 0)
+        topics = [call.args[0] for call in mock_client.subscribe.call_args_list]
+        self.assertEqual(topics, [
+            f"{MQTT_INPUT_TOPIC_BASE}/#", f"{MQTT_INPUT_BATCH_TOPIC}/#", f"{MQTT_OUTPUT_TOPIC_BASE}/#",
+        ])
+
+    def test_output_message_is_stored(self):
+        # Test Case: A result on the output topic is stored, not recalculated or republished
+        mock_client = MagicMock()
+        msg = MagicMock()
+        msg.topic = f"{MQTT_OUTPUT_TOPIC_BASE}/startup1"
+        result = {"isEligible": True, "baseAmount": 60.0, "childrenAmount": 0.0, "supplementAmount": 60.0}
+        msg.payload = json.dumps(result)
+
+        app_module.process_message(mock_client, msg)
+
+        self.assertEqual(app_module.results["startup1"], result)
+        mock_client.publish.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Supplement Calculator Test Suite
+Author: Liliya
+----------------------------
+This test suite validates the calculation functions in `supplement_calculator`
+independently of the Flask API and MQTT integration.
+
+Key Features:
+1. Verifies the batch calculator matches the scalar calculator for every rule.
+2. Tests error handling for invalid family compositions in batch inputs.
+3. Verifies the precompiled rule table matches the formulas and can be rebuilt.
+"""
+
+import itertools
+import unittest
+
+import numpy as np
+
+import supplement_calculator
+from supplement_calculator import calculate_amounts, calculate_supplement, calculate_supplement_batch
+from supplement_calculator import rebuild_rule_table, install_rules, current_rules, RULE_TABLE_MAX_CHILDREN
+from rule_sets import parse_rule_set
+
+
+class TestCalculateSupplementBatch(unittest.TestCase):
+    def test_batch_matches_scalar(self):
+        # Test Case: Every combination of composition, children and eligibility
+        # Ensures the vectorized path returns exactly what the scalar function returns.
+        records = [
+            {"familyComposition": composition, "numberOfChildren": children, "familyUnitInPayForDecember": eligible}
+            for composition, children, eligible in itertools.product(
+                ["single", "couple"], [0, 1, 2, 3, 50], [True, False]
+            )
+        ]
+        columns = {
+            key: np.array([record[key] for record in records])
+            for key in ("familyComposition", "numberOfChildren", "familyUnitInPayForDecember")
+        }
+
+        batch = calculate_supplement_batch(columns)
+
+        for index, record in enumerate(records):
+            expected = calculate_supplement(record)
+            self.assertEqual(batch["ruleVersion"], expected.pop("ruleVersion"))
+            for key, value in expected.items():
+                self.assertEqual(batch[key][index], value, f"{key} mismatch for {record}")
+
+    def test_batch_accepts_lists(self):
+        # Test Case: Plain Python lists as columns
+        batch = calculate_supplement_batch({
+            "familyComposition": ["single", "couple"],
+            "numberOfChildren": [0, 2],
+            "familyUnitInPayForDecember": [True, True],
+        })
+        self.assertEqual(batch["supplementAmount"].tolist(), [60.0, 160.0])
+        self.assertEqual(batch["isEligible"].tolist(), [True, True])
+
+    def test_batch_invalid_family_composition(self):
+        # Test Case: Invalid Family Composition
+        # Mirrors the ValueError raised by the scalar function for eligible families without children.
+        with self.assertRaises(ValueError):
+            calculate_supplement_batch({
+                "familyComposition": ["single", "invalid"],
+                "numberOfChildren": [0, 0],
+                "familyUnitInPayForDecember": [True, True],
+            })
+
+
+class TestRuleTable(unittest.TestCase):
+    def setUp(self):
+        self.rules = current_rules()
+
+    def tearDown(self):
+        supplement_calculator.CHILD_SUPPLEMENT = 20.0
+        install_rules(self.rules)
+
+    def test_table_matches_formula(self):
+        # Test Case: Table entries and the formula fallback agree on either side of the limit
+        for composition in ("single", "couple"):
+            for children in range(RULE_TABLE_MAX_CHILDREN + 5):
+                result = calculate_supplement({
+                    "familyComposition": composition,
+                    "numberOfChildren": children,
+                    "familyUnitInPayForDecember": True,
+                })
+                base, children_amount, total = calculate_amounts(composition, children)
+                self.assertEqual(
+                    (result["baseAmount"], result["childrenAmount"], result["supplementAmount"]),
+                    (base, children_amount, total),
+                )
+
+    def test_rebuild_after_constant_change(self):
+        # Test Case: Rebuilding the built-in rules picks up changed constants in both paths
+        install_rules(supplement_calculator.builtin_rules())
+        supplement_calculator.CHILD_SUPPLEMENT = 25.0
+        rebuild_rule_table()
+        data = {"familyComposition": "couple", "numberOfChildren": 2, "familyUnitInPayForDecember": True}
+        self.assertEqual(calculate_supplement(data)["childrenAmount"], 50.0)
+        batch = calculate_supplement_batch({key: [value] for key, value in data.items()})
+        self.assertEqual(batch["childrenAmount"].tolist(), [50.0])
+
+    def test_rebuild_keeps_loaded_rules(self):
+        # Test Case: Rebuilding recompiles the active file rules instead of replacing them
+        rules = parse_rule_set(dict(self.rules.to_dict(), version="2030", benefitYear=2030, childSupplement=30.0))
+        install_rules(rules)
+        rebuild_rule_table(max_children=-1)
+        self.assertEqual(current_rules().to_dict(), rules.to_dict())
+        self.assertEqual(current_rules().table, {})
+        data = {"familyComposition": "single", "numberOfChildren": 2, "familyUnitInPayForDecember": True}
+        self.assertEqual(calculate_supplement(data)["childrenAmount"], 60.0)
+
+    def test_results_are_independent(self):
+        # Test Case: Callers can modify a result without affecting later results
+        data = {"familyComposition": "single", "numberOfChildren": 0, "familyUnitInPayForDecember": True}
+        calculate_supplement(data)["baseAmount"] = 0.0
+        self.assertEqual(calculate_supplement(data)["baseAmount"], 60.0)
+
+
+if __name__ == "__main__":
+    unittest.main()